@@ -1,5 +1,9 @@
+import pandas as pd
 import streamlit as st
 
+from kinematics import describe, line_move_times
+from line_jobs import JobManager, bounds_of, normalise_recipe, recipe_from_key
+
 # -- Seznam technologií (receptur) pro ukázku --
 technologies = [
     "Technologie 1 – Fe + moř",
@@ -38,158 +42,138 @@ default_values = {
     }
 }
 
-st.title("Konfigurace lakovací linky")
+# Výchozí hodnoty operace, kterou technologie nepoužívá
+default_operation = {
+    "used_in_tech": False,
+    "double_position": False,
+    "time_min": 100,
+    "time_opt": 150,
+    "time_max": 200,
+    "drip_time": 30,
+    "crossing_distance": 100,
+    "priority": 1
+}
 
-# ----------------------------------------------------------------------
-# 1) NASTAVENÍ MANIPULÁTORŮ
-# ----------------------------------------------------------------------
-with st.expander("Nastavení manipulátorů", expanded=True):
-    st.write("Zde můžeš upravit parametry manipulátorů.")
-
-    colA, colB, colC = st.columns(3)
-    with colA:
-        num_manipulators = st.number_input(
-            "Počet manipulátorů", 
-            min_value=1, 
-            value=default_manipulators["num_manipulators"], 
-            step=1
-        )
-        preejezd_rampa = st.number_input(
-            "Přejezd (rampa zpomalení) [mm]", 
-            value=default_manipulators["preejezd_rampa"]
-        )
-        draha_ponor_zdvih = st.number_input(
-            "Dráha ponoření/zdvihu [mm]", 
-            value=default_manipulators["draha_ponor_zdvih"]
-        )
-
-    with colB:
-        ponor_rychlost = st.number_input(
-            "Ponoření rychlost [mm/s]", 
-            value=default_manipulators["ponor_rychlost"]
-        )
-        zdvih_rychlost = st.number_input(
-            "Zdvih rychlost [mm/s]", 
-            value=default_manipulators["zdvih_rychlost"]
-        )
-        ponor_zpomaleni = st.number_input(
-            "Ponoření (zpomalení) [mm/s²]", 
-            value=default_manipulators["ponor_zpomaleni"]
-        )
-
-    with colC:
-        rychlost_pred_zalozenim = st.number_input(
-            "Rychlost před založením [mm/s]", 
-            value=default_manipulators["rychlost_pred_zalozenim"]
-        )
-        vyska_zastaveni_okapu = st.number_input(
-            "Výška zastavení okapu [mm]", 
-            value=default_manipulators["vyska_zastaveni_okapu"]
-        )
-        zdvih_zastaveni_okapu = st.number_input(
-            "Zastavení zdvihu v mezipozici pro okap [mm]", 
-            value=default_manipulators["zdvih_zastaveni_okapu"]
-        )
+# Popisky sloupců tabulky operací
+operation_columns = {
+    "operation_index": st.column_config.NumberColumn("Operace", disabled=True),
+    "used_in_tech": st.column_config.CheckboxColumn("Využita v technologii"),
+    "double_position": st.column_config.CheckboxColumn("Zdvojená pozice"),
+    "time_min": st.column_config.NumberColumn("Čas v lázni min [s]", min_value=0),
+    "time_opt": st.column_config.NumberColumn("Čas v lázni opt. [s]", min_value=0),
+    "time_max": st.column_config.NumberColumn("Čas v lázni max [s]", min_value=0),
+    "drip_time": st.column_config.NumberColumn("Čas okapu [s]", min_value=0),
+    "crossing_distance": st.column_config.NumberColumn("Přejezd z předchozí pozice [mm]", min_value=0),
+    "priority": st.column_config.NumberColumn("Priorita", step=1),
+}
 
-# ----------------------------------------------------------------------
-# 2) VÝBĚR TECHNOLOGIE (RECEPTURY)
-# ----------------------------------------------------------------------
-selected_tech = st.selectbox("Vyber technologii (recepturu):", technologies)
+def default_operations(tech):
+    """Tabulka 23 operací technologie s defaulty (neuvedené operace nevyužité)."""
+    rows = [{"operation_index": i, **default_operation, **default_values.get(tech, {}).get(i, {})}
+            for i in range(1, NUM_OPERATIONS + 1)]
+    return pd.DataFrame(rows, columns=list(operation_columns))
+
+# Drahé výpočty se spouští jen nad uloženou recepturou (normalizovaný JSON,
+# viz line_jobs): rychlé výsledky si pamatuje st.cache_data, optimalizace
+# a simulace běží na pozadí ve sdíleném fondu vláken
+@st.cache_resource
+def job_manager():
+    return JobManager()
+
+@st.cache_data
+def move_times_summary(recipe):
+    operations, manipulators, _ = recipe_from_key(recipe)
+    return describe(line_move_times(operations, manipulators))
 
+@st.cache_data
+def line_bounds(recipe):
+    return bounds_of(recipe)
+
+st.title("Konfigurace lakovací linky")
+
+# Vstupy jsou ve formuláři: úpravy se nepřepočítávají po každém stisku
+# klávesy, ale až po uložení receptury
+selected_tech = st.selectbox("Vyber technologii (recepturu):", technologies)
 st.write(f"Zvolená technologie: **{selected_tech}**")
 
-# ----------------------------------------------------------------------
-# 3) PARAMETRY 23 OPERACÍ (pro vybranou technologii)
-# ----------------------------------------------------------------------
-st.subheader("Parametry jednotlivých operací")
-
-operations_data = []
-
-for i in range(1, NUM_OPERATIONS + 1):
-    # Načteme defaulty, pokud existují
-    if (selected_tech in default_values) and (i in default_values[selected_tech]):
-        dv = default_values[selected_tech][i]
-    else:
-        dv = {
-            "used_in_tech": False,
-            "double_position": False,
-            "time_min": 100,
-            "time_opt": 150,
-            "time_max": 200,
-            "drip_time": 30,
-            "crossing_distance": 100,
-            "priority": 1
-        }
-
-    # Každou operaci dáme do expanderu pro přehlednost
-    with st.expander(f"Operace {i}", expanded=(i == 1)):
-        # Tři sloupce pro logické rozdělení parametrů
-        col1, col2, col3 = st.columns(3)
-
-        with col1:
-            used_in_tech = st.checkbox(
-                f"Je využita v dané technologii? (Operace {i})",
-                value=dv["used_in_tech"],
-                key=f"used_in_tech_{i}"
+with st.form("receptura"):
+    # ----------------------------------------------------------------------
+    # 1) NASTAVENÍ MANIPULÁTORŮ
+    # ----------------------------------------------------------------------
+    with st.expander("Nastavení manipulátorů", expanded=True):
+        st.write("Zde můžeš upravit parametry manipulátorů.")
+
+        colA, colB, colC = st.columns(3)
+        with colA:
+            num_manipulators = st.number_input(
+                "Počet manipulátorů",
+                min_value=1,
+                value=default_manipulators["num_manipulators"],
+                step=1
             )
-            double_position = st.checkbox(
-                f"Zdvojená pozice? (Operace {i})",
-                value=dv["double_position"],
-                key=f"double_position_{i}"
+            preejezd_rampa = st.number_input(
+                "Přejezd (rampa zpomalení) [mm]",
+                value=default_manipulators["preejezd_rampa"]
             )
-            priority = st.number_input(
-                f"Priorita (Operace {i})",
-                value=dv["priority"],
-                step=1,
-                key=f"priority_{i}"
+            draha_ponor_zdvih = st.number_input(
+                "Dráha ponoření/zdvihu [mm]",
+                value=default_manipulators["draha_ponor_zdvih"]
             )
 
-        with col2:
-            time_min = st.number_input(
-                f"Čas v lázni (min) (Operace {i})",
-                value=dv["time_min"],
-                key=f"time_min_{i}"
+        with colB:
+            ponor_rychlost = st.number_input(
+                "Ponoření rychlost [mm/s]",
+                value=default_manipulators["ponor_rychlost"]
             )
-            time_opt = st.number_input(
-                f"Čas v lázni (optimální) (Operace {i})",
-                value=dv["time_opt"],
-                key=f"time_opt_{i}"
+            zdvih_rychlost = st.number_input(
+                "Zdvih rychlost [mm/s]",
+                value=default_manipulators["zdvih_rychlost"]
             )
-            time_max = st.number_input(
-                f"Čas v lázni (max) (Operace {i})",
-                value=dv["time_max"],
-                key=f"time_max_{i}"
+            ponor_zpomaleni = st.number_input(
+                "Ponoření (zpomalení) [mm/s²]",
+                value=default_manipulators["ponor_zpomaleni"]
             )
 
-        with col3:
-            drip_time = st.number_input(
-                f"Čas okapu (Operace {i})",
-                value=dv["drip_time"],
-                key=f"drip_time_{i}"
+        with colC:
+            rychlost_pred_zalozenim = st.number_input(
+                "Rychlost před založením [mm/s]",
+                value=default_manipulators["rychlost_pred_zalozenim"]
+            )
+            vyska_zastaveni_okapu = st.number_input(
+                "Výška zastavení okapu [mm]",
+                value=default_manipulators["vyska_zastaveni_okapu"]
             )
-            crossing_distance = st.number_input(
-                f"Přejezd z předcházející pozice [mm] (Operace {i})",
-                value=dv["crossing_distance"],
-                key=f"crossing_distance_{i}"
+            zdvih_zastaveni_okapu = st.number_input(
+                "Zastavení zdvihu v mezipozici pro okap [mm]",
+                value=default_manipulators["zdvih_zastaveni_okapu"]
             )
 
-        operations_data.append({
-            "operation_index": i,
-            "used_in_tech": used_in_tech,
-            "double_position": double_position,
-            "time_min": time_min,
-            "time_opt": time_opt,
-            "time_max": time_max,
-            "drip_time": drip_time,
-            "crossing_distance": crossing_distance,
-            "priority": priority
-        })
+    # ----------------------------------------------------------------------
+    # 2) PARAMETRY 23 OPERACÍ (pro vybranou technologii)
+    # ----------------------------------------------------------------------
+    st.subheader("Parametry jednotlivých operací")
+    # Jedna tabulka místo 23 expanderů po 8 polích; klíč podle technologie,
+    # aby se po změně technologie načetly její defaulty
+    operations_table = st.data_editor(
+        default_operations(selected_tech),
+        column_config=operation_columns,
+        hide_index=True,
+        num_rows="fixed",
+        key=f"operations_{selected_tech}"
+    )
 
-# ----------------------------------------------------------------------
-# 4) TLAČÍTKO PRO ULOŽENÍ / ZOBRAZENÍ
-# ----------------------------------------------------------------------
-if st.button("Uložit / Zobrazit recepturu"):
-    st.write("### Parametry manipulátorů")
+    colD, colE = st.columns(2)
+    with colD:
+        num_racks = st.number_input("Počet rámů v dávce", min_value=1, value=4, step=1)
+    with colE:
+        max_time = st.number_input("Časový limit optimalizace [s]", min_value=1, value=30, step=5)
+
+    # ----------------------------------------------------------------------
+    # 3) TLAČÍTKO PRO ULOŽENÍ / ZOBRAZENÍ
+    # ----------------------------------------------------------------------
+    submitted = st.form_submit_button("Uložit / Zobrazit recepturu")
+
+if submitted:
     manipulator_data = {
         "num_manipulators": num_manipulators,
         "preejezd_rampa": preejezd_rampa,
@@ -201,7 +185,99 @@ if st.button("Uložit / Zobrazit recepturu"):
         "vyska_zastaveni_okapu": vyska_zastaveni_okapu,
         "zdvih_zastaveni_okapu": zdvih_zastaveni_okapu
     }
-    st.json(manipulator_data)
+    operations_data = operations_table.to_dict("records")
+    try:
+        st.session_state["recipe"] = normalise_recipe(operations_data, manipulator_data, num_racks)
+        st.session_state["max_time"] = int(max_time)
+    except ValueError as error:
+        # Vymazaná buňka tabulky: receptura se neuloží, platí předchozí
+        st.error(f"Recepturu nelze uložit, vyplňte prázdná pole ({error})")
+
+recipe = st.session_state.get("recipe")
+if recipe is None:
+    st.stop()
 
+# ----------------------------------------------------------------------
+# 4) ULOŽENÁ RECEPTURA, RYCHLÉ ODHADY
+# ----------------------------------------------------------------------
+operations_data, manipulator_data, num_racks = recipe_from_key(recipe)
+with st.expander("Uložená receptura"):
+    st.write("### Parametry manipulátorů")
+    st.json(manipulator_data)
     st.write("### Výsledné parametry operací:")
     st.json(operations_data)
+
+# Matice časů převozů se počítá jednou pro danou sadu parametrů (cache podle hashe)
+with st.expander("Časy převozů z kinematiky manipulátorů"):
+    st.json(move_times_summary(recipe))
+
+# Analytické meze (throughput.py) jsou hned, bez simulace i optimalizace
+bounds = line_bounds(recipe)
+col1, col2, col3 = st.columns(3)
+col1.metric("Takt nejméně [s]", f"{bounds['cycle_lb']:.0f}")
+col2.metric("Propustnost nejvýš [rámů/h]", f"{bounds['throughput_ub']:.1f}")
+col3.metric("Úzké místo", bounds["bottleneck"])
+
+# ----------------------------------------------------------------------
+# 5) OPTIMALIZACE A SIMULACE NA POZADÍ
+# ----------------------------------------------------------------------
+jobs = job_manager()
+colF, colG = st.columns(2)
+if colF.button("Spustit optimalizaci"):
+    st.session_state["solve_job"] = jobs.solve(recipe, max_time=st.session_state["max_time"])
+if colG.button("Spustit simulaci"):
+    st.session_state["simulate_job"] = jobs.simulate(recipe)
+
+def job_caption(job):
+    status = {"queued": "čeká", "running": "běží", "done": "hotovo", "failed": "chyba"}[job.status]
+    return f"{status}, {job.elapsed:.1f} s"
+
+def active_jobs():
+    """Úlohy uložené receptury, které ještě čekají nebo běží."""
+    return [job for job in (st.session_state.get("solve_job"), st.session_state.get("simulate_job"))
+            if job is not None and job.key == recipe and job.status in ("queued", "running")]
+
+def job_progress(polling):
+    solve_job = st.session_state.get("solve_job")
+    if solve_job is not None and solve_job.key == recipe:
+        st.write("### Optimalizace rozvrhu")
+        st.caption(job_caption(solve_job))
+        best = solve_job.best
+        if best is not None:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Nejlepší takt [s]", best["makespan"])
+            # S okny ponoření je cíl vážený takt plus penalizace, ne takt v sekundách
+            col2.metric("Cíl (dolní mez)", f"{best['objective']} ({best['bound']})")
+            col3.metric("Mezera k optimu", f"{100 * best['gap']:.1f} %")
+            st.line_chart(pd.DataFrame(solve_job.incumbents), x="elapsed", y="makespan")
+        if solve_job.status == "done":
+            result = solve_job.result()
+            entry = result["entry"]
+            source = "z cache" if result["cached"] else entry.status
+            st.success(f"Takt linky: {entry.makespan} s ({source})")
+            st.dataframe(result["table"], hide_index=True)
+        elif solve_job.status == "failed":
+            st.error(f"Optimalizace selhala: {solve_job.error!r}")
+
+    simulate_job = st.session_state.get("simulate_job")
+    if simulate_job is not None and simulate_job.key == recipe:
+        st.write("### Simulace linky")
+        st.caption(job_caption(simulate_job))
+        if simulate_job.status == "done":
+            result = simulate_job.result()
+            if not result["kpis"]["completed"]:
+                st.error(f"Simulace uvázla: dokončeno jen {result['kpis']['finished_racks']} rámů")
+            st.metric("Makespan simulace [s]", f"{result['kpis']['makespan']:.0f}")
+            st.write(f"Úzké místo: **{result['bottleneck']}**")
+            st.dataframe(pd.DataFrame(result["breakdown"]), hide_index=True)
+        elif simulate_job.status == "failed":
+            st.error(f"Simulace selhala: {simulate_job.error!r}")
+
+    # Poslední úloha doběhla: celý skript znovu, fragment pak přestane obnovovat
+    if polling and not active_jobs():
+        st.rerun()
+
+# Fragment se obnovuje sám každou sekundu jen, dokud některá úloha běží;
+# zbytek skriptu se znovu nespouští
+polling = bool(active_jobs())
+st.fragment(job_progress, run_every=1.0 if polling else None)(polling)
@@ -0,0 +1,250 @@
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from ortools.sat.python import cp_model
+
+import optimalni_pohyby_manipulatoru as hoist
+from sim_ani import LineConfig, LineSimulation
+
+# ----- Benchmarks for the Line Simulator and the CP-SAT Scheduler -----
+# Each case is a dict of parameters; running it returns a dict of metrics.
+# Results are keyed by case name so they can be saved as a JSON baseline and
+# compared against a later run, failing on regressions above a threshold.
+#
+#   python benchmark.py --save                 # record benchmark_baseline.json
+#   python benchmark.py                        # compare, exit 1 on regression
+#   pytest benchmark.py --benchmark-only       # same cases under pytest-benchmark
+
+SIM_CASES = [
+    {'name': 'sim_3x6', 'num_stations': 3, 'num_racks': 6, 'num_manipulators': 3},
+    {'name': 'sim_3x100', 'num_stations': 3, 'num_racks': 100, 'num_manipulators': 3},
+    {'name': 'sim_3x1000', 'num_stations': 3, 'num_racks': 1000, 'num_manipulators': 3},
+    {'name': 'sim_12x1000', 'num_stations': 12, 'num_racks': 1000, 'num_manipulators': 4},
+    {'name': 'sim_23x1000', 'num_stations': 23, 'num_racks': 1000, 'num_manipulators': 5},
+]
+
+CPSAT_CASES = [
+    {'name': 'cpsat_4m_4b_2h', 'num_materials': 4, 'num_baths': 4, 'num_manipulators': 2},
+    {'name': 'cpsat_6m_4b_2h', 'num_materials': 6, 'num_baths': 4, 'num_manipulators': 2},
+    {'name': 'cpsat_8m_6b_3h', 'num_materials': 8, 'num_baths': 6, 'num_manipulators': 3},
+    {'name': 'cpsat_12m_8b_3h', 'num_materials': 12, 'num_baths': 8, 'num_manipulators': 3},
+    {'name': 'cpsat_16m_8b_3h', 'num_materials': 16, 'num_baths': 8, 'num_manipulators': 3},
+    # Same instances with the strengthened model, for the time-to-optimal speedup
+    {'name': 'cpsat_12m_8b_3h_strong', 'num_materials': 12, 'num_baths': 8, 'num_manipulators': 3, 'strengthen': True},
+    {'name': 'cpsat_16m_8b_3h_strong', 'num_materials': 16, 'num_baths': 8, 'num_manipulators': 3, 'strengthen': True},
+    # Cyclic mode: one period with `degree` racks, independent of the batch size
+    {'name': 'cpsat_cyclic_k2_8b_3h', 'num_materials': 2, 'num_baths': 8, 'num_manipulators': 3, 'degree': 2},
+]
+
+QUICK_CASES = ('sim_3x6', 'sim_3x100', 'cpsat_4m_4b_2h')
+
+# Lower is better for these metrics, higher for events_per_sec
+LOWER_IS_BETTER = ('wall_time', 'peak_memory', 'solve_time', 'time_to_first', 'gap')
+HIGHER_IS_BETTER = ('events_per_sec',)
+
+CPSAT_TIME_LIMIT = 20.0
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+DEFAULT_THRESHOLD = 0.2
+
+# ----- Simulator -----
+
+def synthetic_line(num_stations, num_racks, num_manipulators):
+    """A line of num_stations evenly spaced baths, built the way app.py data is."""
+    durations = [60, 90, 120, 150]
+    operations = [{'operation_index': i, 'used_in_tech': True, 'double_position': i % 8 == 0,
+                   'time_min': 0, 'time_opt': durations[i % len(durations)], 'time_max': 0,
+                   'drip_time': 30, 'crossing_distance': 1000, 'priority': 1}
+                  for i in range(1, num_stations + 1)]
+    manipulators = {'num_manipulators': num_manipulators, 'draha_ponor_zdvih': 1000,
+                    'ponor_rychlost': 100, 'zdvih_rychlost': 100}
+    return LineConfig.from_app(operations, manipulators, num_racks=num_racks)
+
+def bench_simulator(num_stations, num_racks, num_manipulators, **_):
+    """Events/sec and wall time of one recorded run, and its peak traced memory."""
+    config = synthetic_line(num_stations, num_racks, num_manipulators)
+
+    sim = LineSimulation(config)
+    for _ in sim.stream():
+        pass
+    result = sim.result()
+    if result.finished_count != num_racks:
+        raise RuntimeError(f"only {result.finished_count} of {num_racks} racks finished")
+
+    # Memory is measured in a second run: tracing slows the interpreter down
+    tracemalloc.start()
+    LineSimulation(config).run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'events': sim.event_count,
+        'wall_time': sim.wall_time,
+        'events_per_sec': sim.event_count / sim.wall_time if sim.wall_time else 0.0,
+        'peak_memory': peak,
+        'makespan': result.makespan,
+    }
+
+# ----- CP-SAT -----
+
+def bench_cpsat(num_materials, num_baths, num_manipulators, degree=None, strengthen=False,
+                time_limit=CPSAT_TIME_LIMIT, num_workers=8, seed=0, **_):
+    """
+    Solve time, time to first feasible solution and remaining optimality gap
+    of the batch model (optionally strengthened), or of the cyclic model when
+    `degree` is given.
+    """
+    started = time.perf_counter()
+    if degree:
+        model, _, _ = hoist.build_cyclic_model(num_baths, num_manipulators, hoist.move_time, degree=degree)
+    else:
+        model, _, _ = hoist.build_model(num_baths, num_materials, num_manipulators, hoist.move_time,
+                                        strengthen=strengthen)
+    build_time = time.perf_counter() - started
+
+    status, solver, callback = hoist.solve_anytime(model, max_time=time_limit, num_workers=num_workers, seed=seed)
+    if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        raise RuntimeError(f"no solution: {solver.StatusName(status)}")
+
+    objective = solver.ObjectiveValue()
+    bound = solver.BestObjectiveBound()
+    return {
+        'build_time': build_time,
+        'solve_time': solver.WallTime(),
+        'time_to_first': callback.time_to_first,
+        'solutions': len(callback.incumbents),
+        'objective': objective,
+        'bound': bound,
+        'gap': (objective - bound) / objective if objective else 0.0,
+        'optimal': status == cp_model.OPTIMAL,
+    }
+
+# ----- Running and Comparing -----
+
+def run_benchmarks(suite='all', quick=False, progress=None):
+    """Run the selected cases and return {case name: metrics}."""
+    cases = []
+    if suite in ('all', 'sim'):
+        cases += [(case, bench_simulator) for case in SIM_CASES]
+    if suite in ('all', 'cpsat'):
+        cases += [(case, bench_cpsat) for case in CPSAT_CASES]
+    if quick:
+        cases = [(case, bench) for case, bench in cases if case['name'] in QUICK_CASES]
+
+    results = {}
+    for case, bench in cases:
+        if progress:
+            progress(case['name'])
+        results[case['name']] = {'params': case, **bench(**case)}
+    return results
+
+def environment():
+    return {'python': sys.version.split()[0], 'platform': platform.platform(), 'cpus': os.cpu_count()}
+
+def save_baseline(results, path):
+    with open(path, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent=2)
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Regressions of `results` against `baseline`: one (case, metric, old, new)
+    per metric that got worse by more than `threshold` (relative). Cases or
+    metrics missing from either side are skipped.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        old = baseline.get(name)
+        if old is None:
+            continue
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            new_value, old_value = metrics.get(metric), old.get(metric)
+            if new_value is None or old_value is None:
+                continue
+            if metric == 'gap':
+                # Gaps are already relative; compare them absolutely
+                worse = new_value - old_value > threshold
+            elif metric in LOWER_IS_BETTER:
+                worse = old_value > 0 and new_value > old_value * (1 + threshold)
+            else:
+                worse = new_value < old_value * (1 - threshold)
+            if worse:
+                regressions.append((name, metric, old_value, new_value))
+    return regressions
+
+def format_results(results):
+    lines = []
+    for name, metrics in results.items():
+        values = ', '.join(f'{key}={value:.4g}' if isinstance(value, float) else f'{key}={value}'
+                           for key, value in metrics.items() if key != 'params')
+        lines.append(f'{name}: {values}')
+    return '\n'.join(lines)
+
+# ----- pytest-benchmark Entry Points -----
+# `pytest benchmark.py --benchmark-only` times every case; combine with
+# --benchmark-autosave / --benchmark-compare-fail=mean:20% for regressions.
+# pytest-benchmark provides the `benchmark` fixture; without it the entry
+# points are skipped.
+
+try:
+    import pytest
+except ImportError:  # the CLI works without pytest
+    pytest = None
+
+if pytest is not None:
+    needs_plugin = pytest.mark.skipif(importlib.util.find_spec('pytest_benchmark') is None,
+                                      reason='needs pytest-benchmark')
+
+    @needs_plugin
+    @pytest.mark.parametrize('case', SIM_CASES, ids=[case['name'] for case in SIM_CASES])
+    def test_simulator(benchmark, case):
+        config = synthetic_line(case['num_stations'], case['num_racks'], case['num_manipulators'])
+        result = benchmark(lambda: LineSimulation(config).run())
+        assert result.finished_count == case['num_racks']
+
+    @needs_plugin
+    @pytest.mark.parametrize('case', CPSAT_CASES, ids=[case['name'] for case in CPSAT_CASES])
+    def test_cpsat(benchmark, case):
+        metrics = benchmark.pedantic(bench_cpsat, kwargs=case, rounds=1, iterations=1)
+        benchmark.extra_info.update({key: metrics[key] for key in ('time_to_first', 'objective', 'gap')})
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the line simulator and the CP-SAT scheduler.")
+    parser.add_argument('--suite', choices=('all', 'sim', 'cpsat'), default='all')
+    parser.add_argument('--quick', action='store_true', help="only the smallest cases")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="JSON baseline to compare with / save to")
+    parser.add_argument('--save', action='store_true', help="store the results as the new baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative slowdown before failing (default 0.2)")
+    parser.add_argument('--out', default=None, help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.suite, args.quick, progress=lambda name: print(f"running {name}...", flush=True))
+    print(format_results(results))
+    if args.out:
+        save_baseline(results, args.out)
+    if args.save:
+        save_baseline(results, args.baseline)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save to create one")
+        return 0
+
+    regressions = compare(results, load_baseline(args.baseline), args.threshold)
+    for name, metric, old, new in regressions:
+        print(f"REGRESSION {name} {metric}: {old:.4g} -> {new:.4g}")
+    if not regressions:
+        print("No regressions")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
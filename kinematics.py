@@ -0,0 +1,194 @@
+import hashlib
+import json
+from dataclasses import asdict, dataclass
+
+import numpy as np
+
+# ----- Manipulator Kinematics and Move-Time Matrix -----
+# One transfer of a rack from station i to station j is
+#
+#   lift (with the drip stop above station i) + traverse |x_j - x_i| + lower
+#
+# built from the configurator's manipulator data (app.py):
+#
+#   draha_ponor_zdvih        stroke of lowering / lifting [mm]
+#   zdvih_rychlost           lifting speed [mm/s]
+#   ponor_rychlost           lowering speed [mm/s]
+#   ponor_zpomaleni          deceleration at the end of lowering [mm/s²]
+#   rychlost_pred_zalozenim  speed when the rack is set down [mm/s]
+#   preejezd_rampa           acceleration / deceleration distance of the traverse [mm]
+#
+# The traverse follows a trapezoidal velocity profile (a triangular one when
+# the move is shorter than both ramps). The drip stop heights
+# (vyska_zastaveni_okapu, zdvih_zastaveni_okapu) only place the stop on the
+# stroke and do not change the times. The traverse speed is not collected by
+# the configurator, DEFAULT_TRAVEL_SPEED is assumed unless given.
+#
+# The full station-to-station matrix is computed once per parameter set with
+# NumPy and cached by a hash of the parameters; the CP-SAT model takes the
+# consecutive transfers (MoveTimes.transfer_times) and the simulator the
+# traverse times (LineConfig.from_app(..., kinematics=...)).
+
+DEFAULT_TRAVEL_SPEED = 500  # [mm/s]
+DEFAULT_EXIT_DISTANCE = 1000  # distance from the last bath to the exit stack [mm]
+
+# Cached matrices by parameter hash; the configurator only has a few line variants
+MAX_CACHED = 64
+_cache = {}
+
+@dataclass(frozen=True)
+class Kinematics:
+    """Motion parameters of one manipulator, lengths in mm and times in s."""
+    stroke: float
+    lift_speed: float
+    lower_speed: float
+    lower_deceleration: float = 0
+    placement_speed: float = 0
+    travel_speed: float = DEFAULT_TRAVEL_SPEED
+    travel_ramp: float = 0
+
+    @classmethod
+    def from_app(cls, manipulator_data, travel_speed=DEFAULT_TRAVEL_SPEED):
+        """Kinematics from the configurator's `manipulator_data` (app.py)."""
+        return cls(stroke=manipulator_data['draha_ponor_zdvih'],
+                   lift_speed=manipulator_data['zdvih_rychlost'],
+                   lower_speed=manipulator_data['ponor_rychlost'],
+                   lower_deceleration=manipulator_data.get('ponor_zpomaleni', 0),
+                   placement_speed=manipulator_data.get('rychlost_pred_zalozenim', 0),
+                   travel_speed=travel_speed,
+                   travel_ramp=manipulator_data.get('preejezd_rampa', 0))
+
+    def lift_time(self):
+        return self.stroke / self.lift_speed
+
+    def lower_time(self):
+        """Lowering at lower_speed, then decelerating to placement_speed at the bottom."""
+        v, v_end, a = self.lower_speed, min(self.placement_speed, self.lower_speed), self.lower_deceleration
+        if a <= 0 or v_end <= 0 or v_end == v:
+            return self.stroke / v
+        braking = (v * v - v_end * v_end) / (2 * a)
+        if braking >= self.stroke:
+            # Too short to reach full speed: the whole stroke is the braking phase
+            v_start = np.sqrt(v_end * v_end + 2 * a * self.stroke)
+            return float((v_start - v_end) / a)
+        return (self.stroke - braking) / v + (v - v_end) / a
+
+    def travel_time(self, distance):
+        """Traverse time over `distance` (scalar or array) on a trapezoidal profile."""
+        d = np.abs(np.asarray(distance, dtype=float))
+        v, r = self.travel_speed, self.travel_ramp
+        if r <= 0:
+            return d / v
+        # Accelerating over r at a = v² / 2r takes 2r / v; shorter moves never reach v
+        full = d / v + 2 * r / v
+        triangular = 2 * np.sqrt(2 * r * d) / v
+        return np.where(d >= 2 * r, full, triangular)
+
+    def ramp_fraction(self, distance):
+        """Share of the traverse time spent accelerating (MotionSegment.ramp)."""
+        d = np.abs(np.asarray(distance, dtype=float))
+        if self.travel_ramp <= 0:
+            return np.zeros_like(d)
+        duration = self.travel_time(d)
+        accelerating = np.minimum(2 * self.travel_ramp, np.sqrt(2 * self.travel_ramp * d)) / self.travel_speed
+        return np.divide(accelerating, duration, out=np.zeros_like(d), where=duration > 0)
+
+@dataclass
+class MoveTimes:
+    """
+    Station-to-station move times of a line. Stations are in process order
+    (entry, used operations, exit); `matrix[i, j]` is a full transfer from i
+    to j, `travel[i, j]` the traverse alone.
+    """
+    names: list
+    positions: np.ndarray
+    drip_times: np.ndarray
+    kinematics: Kinematics
+    matrix: np.ndarray
+    travel: np.ndarray
+    key: str
+
+    def transfer_times(self):
+        """Transfers along the route (station k to k + 1) in whole seconds, rounded up."""
+        route = np.diagonal(self.matrix, offset=1)
+        return [int(t) for t in np.ceil(route - 1e-9)]
+
+    def transfer_matrix(self):
+        """Full transfers between all station pairs in whole seconds, rounded up (mixed recipes)."""
+        return np.ceil(self.matrix - 1e-9).astype(int).tolist()
+
+    def index(self, name):
+        return self.names.index(name)
+
+def station_layout(operations_data, exit_distance=DEFAULT_EXIT_DISTANCE, used_only=True):
+    """
+    (names, positions, drip times) of the entry, the operations used in the
+    technology (every operation with used_only=False, e.g. for several
+    recipes on one line) and the exit; every operation sits
+    `crossing_distance` mm after the previous one, as in LineConfig.from_app.
+    """
+    names, positions, drips = ['entry'], [0.0], [0.0]
+    pos = 0.0
+    for op in sorted(operations_data, key=lambda op: op['operation_index']):
+        pos += op['crossing_distance']
+        if op['used_in_tech'] or not used_only:
+            names.append(f"op{op['operation_index']}")
+            positions.append(pos)
+            drips.append(op['drip_time'])
+    names.append('exit')
+    positions.append(pos + exit_distance)
+    drips.append(0.0)
+    return names, np.array(positions), np.array(drips, dtype=float)
+
+def move_time_matrix(positions, drip_times, kinematics):
+    """(matrix, travel): all station pairs at once, lift with drip + traverse + lower."""
+    positions = np.asarray(positions, dtype=float)
+    travel = kinematics.travel_time(positions[None, :] - positions[:, None])
+    matrix = (kinematics.lift_time() + np.asarray(drip_times, dtype=float))[:, None] + travel \
+        + kinematics.lower_time()
+    return matrix, travel
+
+def parameter_hash(operations_data, manipulator_data, **options):
+    """Stable hash of everything the move times depend on."""
+    fields = ('operation_index', 'used_in_tech', 'drip_time', 'crossing_distance')
+    key = {
+        'operations': sorted([{f: op[f] for f in fields} for op in operations_data],
+                             key=lambda op: op['operation_index']),
+        'manipulators': manipulator_data,
+        'options': options,
+    }
+    text = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+def line_move_times(operations_data, manipulator_data, travel_speed=DEFAULT_TRAVEL_SPEED,
+                    exit_distance=DEFAULT_EXIT_DISTANCE, used_only=True):
+    """MoveTimes of the line described by app.py data, computed once per parameter set."""
+    key = parameter_hash(operations_data, manipulator_data, travel_speed=travel_speed, exit_distance=exit_distance,
+                         used_only=used_only)
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+    kinematics = Kinematics.from_app(manipulator_data, travel_speed)
+    names, positions, drips = station_layout(operations_data, exit_distance, used_only)
+    matrix, travel = move_time_matrix(positions, drips, kinematics)
+    for array in (positions, drips, matrix, travel):
+        array.setflags(write=False)  # shared between callers through the cache
+    move_times = MoveTimes(names, positions, drips, kinematics, matrix, travel, key)
+    if len(_cache) >= MAX_CACHED:
+        _cache.pop(next(iter(_cache)))
+    _cache[key] = move_times
+    return move_times
+
+def clear_cache():
+    _cache.clear()
+
+def describe(move_times):
+    """Kinematic parameters and route transfer times as a dict (e.g. for st.json)."""
+    route = np.diagonal(move_times.matrix, offset=1)
+    return {
+        'kinematics': asdict(move_times.kinematics),
+        'lift_time': move_times.kinematics.lift_time(),
+        'lower_time': move_times.kinematics.lower_time(),
+        'transfers': {f'{a} -> {b}': round(float(t), 2)
+                      for a, b, t in zip(move_times.names, move_times.names[1:], route)},
+    }
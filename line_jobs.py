@@ -0,0 +1,179 @@
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import optimalni_pohyby_manipulatoru as hoist
+from schedule_cache import cached_schedule, default_cache
+from sim_ani import LineConfig, simulate
+from throughput import estimate_lines
+
+# ----- Background Solve and Simulate Jobs -----
+# The configurator (app.py) must not block on the optimizer or the simulator.
+# A recipe (the configurator's operations_data and manipulator_data plus the
+# batch size) is normalised to a canonical JSON key, and every expensive step
+# runs as a Job in a shared thread pool:
+#
+#   jobs = JobManager()
+#   key = normalise_recipe(operations_data, manipulator_data, num_racks=6)
+#   job = jobs.solve(key, max_time=30)
+#   job.status, job.best, job.result()   # poll from the UI, never wait
+#
+# CP-SAT releases the GIL while it searches, so solver threads run next to
+# the UI; each improved schedule lands in job.incumbents as it is found.
+# Jobs are keyed by (kind, recipe, options): submitting the same recipe again
+# returns the running or finished job, and solved schedules also go to the
+# persistent schedule cache (schedule_cache.py), so other sessions and later
+# runs get them without solving.
+
+DEFAULT_WORKERS = 2
+MAX_FINISHED_JOBS = 32  # finished jobs kept for sessions that still poll them
+
+# Only these fields reach the models; priority is not used by either
+OPERATION_FIELDS = {
+    'operation_index': int, 'used_in_tech': bool, 'double_position': bool, 'time_min': float,
+    'time_opt': float, 'time_max': float, 'drip_time': float, 'crossing_distance': float,
+}
+
+def _empty(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+def normalise_recipe(operations_data, manipulator_data, num_racks):
+    """
+    Canonical JSON of a recipe: known fields only, fixed types, operations in
+    order. Raises ValueError naming every empty field (a cell cleared in the
+    configurator's table arrives as None or NaN).
+    """
+    missing = [f"operation {op.get('operation_index', '?')}: {name}"
+               for op in operations_data for name in OPERATION_FIELDS if _empty(op.get(name))]
+    missing += [name for name, value in manipulator_data.items() if _empty(value)]
+    if missing:
+        raise ValueError(f"Empty fields in the recipe: {', '.join(missing)}")
+    operations = sorted(({name: cast(op[name]) for name, cast in OPERATION_FIELDS.items()}
+                         for op in operations_data), key=lambda op: op['operation_index'])
+    manipulators = {name: (int(value) if name == 'num_manipulators' else float(value))
+                    for name, value in manipulator_data.items()}
+    return json.dumps({'operations': operations, 'manipulators': manipulators, 'num_racks': int(num_racks)},
+                      sort_keys=True)
+
+def recipe_from_key(key):
+    """(operations_data, manipulator_data, num_racks) of a normalised recipe."""
+    recipe = json.loads(key)
+    return recipe['operations'], recipe['manipulators'], recipe['num_racks']
+
+def line_of(key):
+    """Simulator line of a normalised recipe."""
+    operations, manipulators, num_racks = recipe_from_key(key)
+    return LineConfig.from_app(operations, manipulators, num_racks=num_racks)
+
+def bounds_of(key):
+    """Analytic bounds (throughput.estimate_lines) of a normalised recipe as a dict."""
+    return estimate_lines([line_of(key)]).to_frame().iloc[0].to_dict()
+
+@dataclass
+class Job:
+    """One background solve or simulation; the worker fills in the timestamps and incumbents."""
+    kind: str
+    key: str
+    options: dict
+    submitted: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    incumbents: list = field(default_factory=list)  # improved schedules without the schedule itself
+    future: object = None
+
+    @property
+    def status(self):
+        if self.future is None or self.started is None:
+            return 'queued'
+        if not self.future.done():
+            return 'running'
+        return 'failed' if self.future.exception() is not None else 'done'
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def best(self):
+        return self.incumbents[-1] if self.incumbents else None
+
+    @property
+    def error(self):
+        return self.future.exception() if self.status == 'failed' else None
+
+    def result(self):
+        """The worker's result once done, otherwise None (never blocks)."""
+        return self.future.result() if self.status == 'done' else None
+
+class JobManager:
+    """
+    Thread pool of solve and simulate jobs shared by all sessions of the app
+    (e.g. through st.cache_resource). `cache` is the ScheduleCache for solved
+    schedules (the process-wide one by default).
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, cache=None, solver_workers=None):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='line-job')
+        self.cache = cache
+        self.solver_workers = solver_workers
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def _submit(self, kind, key, work, **options):
+        ident = (kind, key, json.dumps(options, sort_keys=True))
+        with self.lock:
+            job = self.jobs.get(ident)
+            if job is not None and job.status != 'failed':
+                return job
+            job = Job(kind, key, options)
+            self.jobs[ident] = job
+            self._forget_finished()
+
+        def run():
+            job.started = time.time()
+            try:
+                return work(job, **options)
+            finally:
+                job.finished = time.time()
+
+        job.future = self.pool.submit(run)
+        return job
+
+    def _forget_finished(self):
+        finished = [ident for ident, job in self.jobs.items() if job.finished is not None]
+        for ident in sorted(finished, key=lambda ident: self.jobs[ident].finished)[:-MAX_FINISHED_JOBS or None]:
+            del self.jobs[ident]
+
+    def solve(self, key, max_time=30, flexible=True):
+        """Job scheduling the recipe's batch with CP-SAT (through the schedule cache)."""
+        return self._submit('solve', key, self._solve, max_time=max_time, flexible=flexible)
+
+    def simulate(self, key):
+        """Job simulating the recipe's line with its batch of racks."""
+        return self._submit('simulate', key, self._simulate)
+
+    def _solve(self, job, max_time, flexible):
+        operations, manipulators, num_racks = recipe_from_key(job.key)
+        config = hoist.SchedulerConfig.from_app(operations, manipulators, num_racks, flexible=flexible)
+
+        def sink(incumbent):
+            job.incumbents.append({name: value for name, value in incumbent.items() if name != 'schedule'})
+
+        cache = self.cache if self.cache is not None else default_cache()
+        entry = cached_schedule(config, cache, max_time=max_time, num_workers=self.solver_workers, sink=sink)
+        if entry is None:
+            raise RuntimeError(f"No collision-free schedule found within {max_time} s")
+        return {'entry': entry, 'cached': not job.incumbents and entry.status != 'HEURISTIC',
+                'table': hoist.solution_table(entry.schedule, config.num_baths, config.move_time)}
+
+    def _simulate(self, job):
+        result = simulate(line_of(job.key))
+        return {'kpis': result.kpis(), 'breakdown': result.breakdown(), 'bottleneck': result.bottleneck()}
+
+    def shutdown(self, wait=False):
+        self.pool.shutdown(wait=wait, cancel_futures=True)
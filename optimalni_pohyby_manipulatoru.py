@@ -1,12 +1,20 @@
+import argparse
+import bisect
+import heapq
+import itertools
+import math
+import random
+import time
+from dataclasses import dataclass, field, replace
 
 from ortools.sat.python import cp_model
 import pandas as pd
 
-# Parametry
+# Parametry (výchozí hodnoty; build_model/solve_schedule je berou jako argumenty)
 num_baths = 4
 num_materials = 4
 num_manipulators = 2
-move_time = 10  # čas pohybu manipulátoru (s)
+move_time = 10  # čas pohybu manipulátoru (s); všude lze předat i seznam časů jednotlivých převozů
 
 # Délka ponoření v jednotlivých lázních
 bath_durations = {
@@ -16,118 +24,1537 @@ bath_durations = {
     4: 30
 }
 
-stations = list(range(num_baths + 2))  # 0 = vstup, 1–4 = lázně, 5 = výstup
-transfers = [(i, i + 1) for i in range(len(stations) - 1)]
+def default_bath_durations(num_baths):
+    """Délky ponoření pro num_baths lázní; výchozí hodnoty se opakují dokola."""
+    base = list(bath_durations.values())
+    return {b: base[(b - 1) % len(base)] for b in range(1, num_baths + 1)}
 
-model = cp_model.CpModel()
-horizon = sum(bath_durations.values()) * 2 * num_materials
-task_vars = {}
+def transfer_times(move_time, num_baths):
+    """
+    Časy převozů po trase (vstup → lázeň 1, ..., lázeň num_baths → výstup).
+    move_time je jeden čas pro všechny převozy, nebo jejich seznam, např.
+    MoveTimes.transfer_times() z modulu kinematics.
+    """
+    if isinstance(move_time, (int, float)):
+        return [int(move_time)] * (num_baths + 1)
+    moves = [int(t) for t in move_time]
+    if len(moves) != num_baths + 1:
+        raise ValueError(f"Očekáváno {num_baths + 1} časů převozů, zadáno {len(moves)}")
+    return moves
 
-# Vygeneruj úkoly: pro každý materiál, převoz mezi stanicemi
-for material_id in range(num_materials):
-    for step, (from_station, to_station) in enumerate(transfers):
-        suffix = f"_{material_id}_{step}"
-        transport_start = model.NewIntVar(0, horizon, "trans_start" + suffix)
-        transport_end = model.NewIntVar(0, horizon, "trans_end" + suffix)
-        transport_interval = {}
+def line_parameters(operations_data, manipulator_data, **options):
+    """
+    (num_baths, num_manipulators, časy převozů, bath_durations) linky z dat
+    konfigurátoru (app.py); časy převozů z kinematiky manipulátoru.
+    """
+    from kinematics import line_move_times
 
-        for m in range(num_manipulators):
-            bool_var = model.NewBoolVar(f"trans_m{m}_{suffix}")
-            interval = model.NewOptionalIntervalVar(transport_start, move_time, transport_end, bool_var, f"trans_int_m{m}_{suffix}")
-            transport_interval[m] = (bool_var, interval)
-
-        task_vars[(material_id, step)] = {
-            "transport_start": transport_start,
-            "transport_end": transport_end,
-            "from": from_station,
-            "to": to_station,
-            "assigned_transport": transport_interval
-        }
+    used = [op for op in sorted(operations_data, key=lambda op: op['operation_index']) if op['used_in_tech']]
+    durations = {b: int(op['time_opt']) for b, op in enumerate(used, start=1)}
+    moves = line_move_times(operations_data, manipulator_data, **options).transfer_times()
+    return len(used), manipulator_data['num_manipulators'], moves, durations
+
+def line_windows(operations_data):
+    """
+    (dwell_windows, bath_capacity) linky z dat konfigurátoru: okno ponoření
+    (time_min, time_max) každé použité operace rozšířené tak, aby obsahovalo
+    time_opt, a kapacita 2 u dvoupozičních lázní (double_position).
+    """
+    used = [op for op in sorted(operations_data, key=lambda op: op['operation_index']) if op['used_in_tech']]
+    windows, capacity = {}, {}
+    for b, op in enumerate(used, start=1):
+        opt = int(op['time_opt'])
+        windows[b] = (min(int(op.get('time_min', opt)), opt), max(int(op.get('time_max', opt)), opt))
+        if op.get('double_position'):
+            capacity[b] = 2
+    return windows, capacity
+
+def line_estimate(windows, moves, capacity, num_manipulators=num_manipulators, out_of_service=(),
+                  num_materials=num_materials):
+    """
+    throughput.Estimate linky modelu build_model: okna ponoření {lázeň: (min, max)},
+    časy převozů a kapacity lázní; manipulátory mimo provoz se nepočítají.
+    """
+    from throughput import estimate
+
+    baths = sorted(windows)
+    in_service = max(1, num_manipulators - len({m for m in out_of_service if 1 <= m <= num_manipulators}))
+    return estimate([windows[b][0] for b in baths], moves, capacity=[capacity.get(b, 1) for b in baths],
+                    num_manipulators=in_service, num_racks=num_materials)
+
+# Pružné ponoření: cíl je DWELL_MAKESPAN_WEIGHT * makespan + dwell_penalty *
+# součet odchylek ponoření od time_opt (s), takže 100 s odchylek všech rámů
+# vyváží 1 s taktu při výchozí penalizaci.
+DWELL_MAKESPAN_WEIGHT = 100
+DWELL_PENALTY = 1
+
+def build_model(num_baths=num_baths, num_materials=num_materials, num_manipulators=num_manipulators,
+                move_time=move_time, bath_durations=None, out_of_service=(),
+                first_material=0, release=0, fixed_intervals=None, strengthen=False,
+                dwell_windows=None, bath_capacity=None, dwell_penalty=DWELL_PENALTY, rail=None):
+    """
+    Sestaví CP-SAT model rozvrhu manipulátorů. Vrací (model, task_vars, makespan);
+    task_vars[(materiál, krok)] obsahuje proměnné převozu a ponoření.
+    Manipulátory v out_of_service (číslované od 1) nedostanou žádný převoz.
+    move_time je čas převozu, nebo seznam časů převozů (viz transfer_times).
+
+    Pro okno klouzavého horizontu se materiály číslují od first_material,
+    žádný převoz nezačne před časem release a fixed_intervals
+    {('manipulator', m) | ('bath', lázeň): [(začátek, konec), ...]} jsou úseky
+    už obsazené zmrazenými rámy.
+
+    strengthen=True přidá zesilující omezení (viz strengthen_model): těsnější
+    horizont, pořadí rámů a meze proměnných (DEFAULT_STRENGTHENING); lze
+    předat i výčet částí ze STRENGTHENING_PARTS.
+
+    dwell_windows {lázeň: (min, max)} zapne pružné ponoření: rám leží v lázni
+    od dovezení až do odvezení, doba ponoření je proměnná v okně (lázně bez
+    okna mají min = max = bath_durations) a každá sekunda odchylky od
+    bath_durations (time_opt) stojí dwell_penalty, viz DWELL_MAKESPAN_WEIGHT.
+    Bez oken se ponoření drží přesně bath_durations. bath_capacity {lázeň: 2}
+    označí dvoupoziční lázně (kumulativní omezení místo NoOverlap).
+
+    rail (Rail) zapne antikolizi na společné kolejnici (viz add_rail_constraints).
+    """
+    if bath_durations is None:
+        bath_durations = default_bath_durations(num_baths)
+    windowed = dwell_windows is not None
+    windows = {b: tuple(dwell_windows.get(b, (d, d))) if windowed else (d, d) for b, d in bath_durations.items()}
+    capacity = {b: (bath_capacity or {}).get(b, 1) for b in bath_durations}
 
-# Pro každou lázeň vytvoř úkol ponoření (leží v ní bath_duration)
-bath_tasks = []
-for material_id in range(num_materials):
-    for step, (from_station, to_station) in enumerate(transfers):
-        if to_station in bath_durations:
+    stations = list(range(num_baths + 2))  # 0 = vstup, 1..num_baths = lázně, poslední = výstup
+    transfers = [(i, i + 1) for i in range(len(stations) - 1)]
+    moves = transfer_times(move_time, num_baths)
+
+    model = cp_model.CpModel()
+    # Horizont začíná až po posledním pevném intervalu zmrazených rámů
+    busy_until = max([release] + [end for intervals in (fixed_intervals or {}).values() for _, end in intervals])
+    # Sériový rozvrh (rámy jeden po druhém, ponoření time_opt bez penalizace) je
+    # přípustný, optimum tedy není delší; s okny nestačí sériový rozvrh
+    # s nejkratším ponořením, vážený cíl by ho mohl přesáhnout. Zdola makespan
+    # omezují lázně a práce rozdělená mezi manipulátory v provozu (modul throughput).
+    bounds = line_estimate(windows, moves, capacity, num_manipulators, out_of_service, num_materials)
+    horizon = busy_until + num_materials * (sum(bath_durations.values()) + sum(moves))
+    if rail is not None:
+        # Na kolejnici potřebuje i sériový rozvrh prázdné přejezdy a uhýbání
+        horizon = busy_until + (sum(high for _, high in windows.values()) * 2 + sum(moves)) * num_materials
+    materials = range(first_material, first_material + num_materials)
+    task_vars = {}
+
+    # Vygeneruj úkoly: pro každý materiál, převoz mezi stanicemi
+    for material_id in materials:
+        for step, (from_station, to_station) in enumerate(transfers):
             suffix = f"_{material_id}_{step}"
-            bath_start = model.NewIntVar(0, horizon, "bath_start" + suffix)
-            bath_dur = bath_durations[to_station]
-            bath_end = model.NewIntVar(0, horizon, "bath_end" + suffix)
-            bath_interval = model.NewIntervalVar(bath_start, bath_dur, bath_end, "bath_interval" + suffix)
-
-            task_vars[(material_id, step)]["bath_start"] = bath_start
-            task_vars[(material_id, step)]["bath_end"] = bath_end
-            task_vars[(material_id, step)]["bath_interval"] = bath_interval
-            task_vars[(material_id, step)]["bath_station"] = to_station
-            bath_tasks.append((bath_interval, to_station))
-
-# Omezení: návaznost transport → koupel → další transport
-for material_id in range(num_materials):
-    for step in range(len(transfers)):
-        # návaznost: transport před lázní musí končit před koupelí
-        if "bath_start" in task_vars[(material_id, step)]:
-            model.Add(task_vars[(material_id, step)]["bath_start"] >= task_vars[(material_id, step)]["transport_end"])
-
-        # návaznost: další transport začíná až po koupeli
-        if step + 1 < len(transfers):
-            if "bath_end" in task_vars[(material_id, step)]:
-                model.Add(task_vars[(material_id, step + 1)]["transport_start"] >= task_vars[(material_id, step)]["bath_end"])
+            transport_start = model.NewIntVar(release, horizon, "trans_start" + suffix)
+            transport_end = model.NewIntVar(release, horizon, "trans_end" + suffix)
+            transport_interval = {}
+
+            for m in range(num_manipulators):
+                bool_var = model.NewBoolVar(f"trans_m{m}_{suffix}")
+                interval = model.NewOptionalIntervalVar(transport_start, moves[step], transport_end, bool_var, f"trans_int_m{m}_{suffix}")
+                transport_interval[m] = (bool_var, interval)
+                if m + 1 in out_of_service:
+                    model.Add(bool_var == 0)
+
+            task_vars[(material_id, step)] = {
+                "transport_start": transport_start,
+                "transport_end": transport_end,
+                "from": from_station,
+                "to": to_station,
+                "assigned_transport": transport_interval
+            }
+
+    # Pro každou lázeň vytvoř úkol ponoření (leží v ní bath_duration)
+    bath_tasks = []
+    for material_id in materials:
+        for step, (from_station, to_station) in enumerate(transfers):
+            if to_station in bath_durations:
+                suffix = f"_{material_id}_{step}"
+                if windowed:
+                    # Ponoření od dovezení do odvezení, délka v okně lázně
+                    bath_start = task_vars[(material_id, step)]["transport_end"]
+                    bath_dur = model.NewIntVar(*windows[to_station], "dwell" + suffix)
+                    bath_end = task_vars[(material_id, step + 1)]["transport_start"]
+                    task_vars[(material_id, step)]["dwell"] = bath_dur
+                else:
+                    bath_start = model.NewIntVar(release, horizon, "bath_start" + suffix)
+                    bath_dur = bath_durations[to_station]
+                    bath_end = model.NewIntVar(release, horizon, "bath_end" + suffix)
+                bath_interval = model.NewIntervalVar(bath_start, bath_dur, bath_end, "bath_interval" + suffix)
+
+                task_vars[(material_id, step)]["bath_start"] = bath_start
+                task_vars[(material_id, step)]["bath_end"] = bath_end
+                task_vars[(material_id, step)]["bath_interval"] = bath_interval
+                task_vars[(material_id, step)]["bath_station"] = to_station
+                bath_tasks.append((bath_interval, to_station))
+
+    # Omezení: návaznost transport → koupel → další transport
+    for material_id in materials:
+        for step in range(len(transfers)):
+            # návaznost: transport před lázní musí končit před koupelí
+            if "bath_start" in task_vars[(material_id, step)]:
+                model.Add(task_vars[(material_id, step)]["bath_start"] >= task_vars[(material_id, step)]["transport_end"])
+
+            # návaznost: další transport začíná až po koupeli
+            if step + 1 < len(transfers):
+                if "bath_end" in task_vars[(material_id, step)]:
+                    model.Add(task_vars[(material_id, step + 1)]["transport_start"] >= task_vars[(material_id, step)]["bath_end"])
+                else:
+                    model.Add(task_vars[(material_id, step + 1)]["transport_start"] >= task_vars[(material_id, step)]["transport_end"])
+
+    def fixed(resource):
+        """Pevné intervaly zmrazených rámů na daném zdroji."""
+        return [model.NewFixedSizeIntervalVar(start, end - start, f"fixed_{resource[0]}{resource[1]}_{i}")
+                for i, (start, end) in enumerate((fixed_intervals or {}).get(resource, ()))]
+
+    # Omezení: každá koupel (lázeň) – max 1 rám současně, dvoupoziční lázeň 2 rámy
+    for bath_station in bath_durations:
+        bath_intervals = fixed(('bath', bath_station))
+        for bt, st in bath_tasks:
+            if st == bath_station:
+                bath_intervals.append(bt)
+        if capacity[bath_station] > 1:
+            model.AddCumulative(bath_intervals, [1] * len(bath_intervals), capacity[bath_station])
+        else:
+            model.AddNoOverlap(bath_intervals)
+
+    # Omezení: každý transport přiřazen právě jednomu manipulátoru
+    for key, task in task_vars.items():
+        bools = [b for b, _ in task["assigned_transport"].values()]
+        model.AddExactlyOne(bools)
+
+    # Manipulátorové kolize (NoOverlap)
+    for m in range(num_manipulators):
+        intervals = fixed(('manipulator', m))
+        for task in task_vars.values():
+            if m in task["assigned_transport"]:
+                intervals.append(task["assigned_transport"][m][1])
+        model.AddNoOverlap(intervals)
+    if rail is not None:
+        add_rail_constraints(model, task_vars, num_manipulators, rail)
+
+    # Cíl: minimalizace taktu linky
+    last_ends = [task_vars[(material_id, len(transfers) - 1)]["transport_end"] for material_id in materials]
+    makespan = model.NewIntVar(release + math.ceil(bounds.makespan_lb[0] - 1e-9), horizon, "makespan")
+    model.AddMaxEquality(makespan, last_ends)
+    deviations = []
+    for key, task in task_vars.items() if windowed and dwell_penalty else ():
+        if "dwell" in task:
+            opt = bath_durations[task["bath_station"]]
+            low, high = windows[task["bath_station"]]
+            if low < high:
+                deviation = model.NewIntVar(0, max(opt - low, high - opt), f"dwell_dev_{key[0]}_{key[1]}")
+                model.AddAbsEquality(deviation, task["dwell"] - opt)
+                deviations.append(deviation)
+    if deviations:
+        model.Minimize(DWELL_MAKESPAN_WEIGHT * makespan + dwell_penalty * sum(deviations))
+    else:
+        model.Minimize(makespan)
+    if strengthen:
+        strengthen_model(model, task_vars, makespan, materials, bath_durations, move_time, num_manipulators,
+                         out_of_service, release, horizon,
+                         identical_manipulators=not fixed_intervals and rail is None,
+                         parts=DEFAULT_STRENGTHENING if strengthen is True else strengthen,
+                         dwell_windows=windows, bath_capacity=capacity)
+    return model, task_vars, makespan
+
+# ----- Zesílení modelu -----
+# Rámy jsou totožné, takže každý rozvrh lze přeznačit tak, aby rámy procházely
+# každým krokem v pořadí vstupu (výměna zbytků tras dvou rámů, které se
+# předběhly, zůstane přípustná). Totožné manipulátory lze přečíslovat podle
+# prvního použití. Z pořadí rámů pak plynou meze začátků převozů: rám j
+# nemůže do lázně b dřív, než jí projdou rámy před ním (j * ponoření b).
+
+STRENGTHENING_PARTS = ('order', 'bounds', 'symmetry', 'redundant')
+# Měřeno na 8-10 lázních, 16-20 rámech a 3-4 manipulátorech (8 vláken): pořadí
+# s mezemi zkrátí čas do optima 2-8x, symetrie manipulátorů nepomáhá a
+# redundantní omezení řešení zpomalují, proto nejsou ve výchozím výběru.
+DEFAULT_STRENGTHENING = ('order', 'bounds')
+
+def strengthen_model(model, task_vars, makespan, materials, bath_durations, move_time, num_manipulators,
+                     out_of_service=(), release=0, horizon=None, identical_manipulators=True,
+                     parts=DEFAULT_STRENGTHENING, dwell_windows=None, bath_capacity=None):
+    """
+    Přidá do modelu build_model vybrané části zesílení: pořadí rámů ('order'),
+    meze začátků převozů a makespanu ('bounds'; předpokládají pořadí rámů),
+    symetrie manipulátorů ('symmetry') a redundantní omezení ('redundant').
+    S okny ponoření se počítá s nejkratším ponořením; dvoupoziční lázně
+    rámy za sebou neřadí, v mezích pro pořadí rámů se proto nepočítají.
+    """
+    materials = list(materials)
+    num_transfers = len(bath_durations) + 1
+    windows = dwell_windows or {}
+    capacity = bath_capacity or {}
+    # Nejkratší ponoření po kroku a ponoření, které musí rámy projít jeden po druhém
+    dwell = [windows.get(step + 1, (bath_durations.get(step + 1, 0),))[0] for step in range(num_transfers)]
+    serial = [0 if capacity.get(step + 1, 1) > 1 else d for step, d in enumerate(dwell)]
+    moves = transfer_times(move_time, num_transfers - 1)
+
+    # Nejkratší doba od vstupu do začátku kroku (head) a od začátku kroku do konce (tail)
+    head = [0] * num_transfers
+    for step in range(1, num_transfers):
+        head[step] = head[step - 1] + moves[step - 1] + dwell[step - 1]
+    tail = [0] * num_transfers
+    tail[-1] = moves[-1]
+    for step in range(num_transfers - 2, -1, -1):
+        tail[step] = moves[step] + dwell[step] + tail[step + 1]
+
+    n = len(materials)
+    for j, material_id in enumerate(materials if 'bounds' in parts else ()):
+        for step in range(num_transfers):
+            start = task_vars[(material_id, step)]["transport_start"]
+            # Rámy před ním musí projít všemi lázněmi před krokem, rámy po něm všemi za ním
+            before = max(serial[:step], default=0)
+            after = max(serial[step:num_transfers - 1], default=0)
+            model.Add(start >= release + head[step] + j * before)
+            if horizon is not None:
+                model.Add(start <= horizon - tail[step] - (n - 1 - j) * after)
+
+    # Pořadí rámů v každém kroku a redundantní návaznost v lázních
+    for prev, material_id in zip(materials, materials[1:]) if 'order' in parts else ():
+        for step in range(num_transfers):
+            task, prev_task = task_vars[(material_id, step)], task_vars[(prev, step)]
+            model.Add(task["transport_start"] >= prev_task["transport_start"])
+            if "bath_start" in task and 'redundant' in parts and capacity.get(task["bath_station"], 1) == 1:
+                model.Add(task["bath_start"] >= prev_task["bath_end"])
+
+    # Dolní mez makespanu: nejdelší lázeň projdou všechny rámy za sebou, převozy se dělí mezi manipulátory
+    in_service = [m for m in range(num_manipulators) if m + 1 not in out_of_service]
+    if 'bounds' in parts:
+        model.Add(makespan >= release + head[-1] + moves[-1] + (n - 1) * max(serial))
+        model.Add(makespan * len(in_service) >= release * len(in_service) + n * sum(moves))
+
+    # Redundantní kumulativní omezení: současně nejvýš tolik převozů, kolik je manipulátorů v provozu
+    if 'redundant' in parts:
+        intervals = [model.NewIntervalVar(task["transport_start"], moves[key[1]], task["transport_end"],
+                                          f"trans_cum_{key[0]}_{key[1]}") for key, task in task_vars.items()]
+        model.AddCumulative(intervals, [1] * len(intervals), len(in_service))
+
+    # Symetrie manipulátorů: manipulátor smí převzít úkol, jen když předchozí už nějaký měl
+    if 'symmetry' in parts and identical_manipulators and len(in_service) > 1:
+        keys = sorted(task_vars)
+        used_before = {m: None for m in in_service}  # byl manipulátor použit v dřívějším úkolu
+        for t, key in enumerate(keys):
+            assigned = {m: task_vars[key]["assigned_transport"][m][0] for m in in_service}
+            for prev_m, m in zip(in_service, in_service[1:]):
+                if used_before[prev_m] is None:
+                    model.Add(assigned[m] == 0)
+                else:
+                    model.AddImplication(assigned[m], used_before[prev_m])
+            for m in in_service:
+                used = model.NewBoolVar(f"used_m{m}_{t}")
+                previous = [used_before[m]] if used_before[m] is not None else []
+                model.AddBoolOr(previous + [assigned[m]]).OnlyEnforceIf(used)
+                model.AddBoolAnd([assigned[m].Not()] + [p.Not() for p in previous]).OnlyEnforceIf(used.Not())
+                used_before[m] = used
+
+# ----- Jedna kolejnice (antikolize) -----
+# Manipulátory jezdí po jedné kolejnici a nemohou se předjet: manipulátor m
+# je vždy vlevo od m + 1 (pevné pořadí zón) nejméně o bezpečnou vzdálenost.
+# Manipulátor proto dosáhne jen na úsek, kde se vlevo i vpravo vejdou ostatní,
+# a převozy mimo něj nedostane. Každý převoz zabírá úsek kolejnice mezi
+# stanicemi odkud a kam; dva převozy, jejichž úseky se pro dané pořadí
+# manipulátorů nevejdou vedle sebe, se musí vystřídat v čase a mezi nimi
+# stihnout prázdné přejezdy: manipulátor prvního převozu uhne z úseku
+# druhého a manipulátor druhého dojede z okraje uvolněného úseku ke startu
+# (oddělení intervalů po dvojicích). Dva převozy téhož manipulátoru dělí
+# prázdný přejezd z cíle prvního na start druhého. Nečinný manipulátor uhne,
+# kam je potřeba (v simulátoru ho soused odsune, viz sim_ani.PlanReplay).
+
+@dataclass(frozen=True)
+class Rail:
+    """Polohy stanic na kolejnici, bezpečná vzdálenost manipulátorů a doba prázdného přejezdu."""
+    positions: tuple
+    safety_distance: float = 0
+    speed: float = 1.0       # poloha za sekundu, když není zadána kinematika
+    kinematics: object = None  # kinematics.Kinematics pro přejezd s rozjezdem a brzděním
+    homes: tuple = None      # výchozí polohy manipulátorů zleva doprava v čase 0
+
+    @staticmethod
+    def spread_homes(positions, num_manipulators, safety_distance=0):
+        """Výchozí polohy rozložené po stanicích: manipulátor m u stanice m * počet stanic / num_manipulators."""
+        homes = []
+        for m in range(num_manipulators):
+            home = positions[m * len(positions) // num_manipulators]
+            homes.append(max(home, homes[-1] + safety_distance) if homes else home)
+        return tuple(homes)
+
+    @classmethod
+    def from_moves(cls, move_time, num_baths, num_manipulators=num_manipulators, safety_distance=0):
+        """Kolejnice, na které převoz trvá tolik, kolik je vzdálenost stanic (jako sim_ani.line_for_plan)."""
+        positions = tuple(itertools.accumulate(transfer_times(move_time, num_baths), initial=0))
+        return cls(positions, safety_distance, homes=cls.spread_homes(positions, num_manipulators, safety_distance))
+
+    @classmethod
+    def from_app(cls, operations_data, manipulator_data, safety_distance=0, **options):
+        """Kolejnice z dat konfigurátoru; polohy v mm, přejezd z kinematiky manipulátoru."""
+        from kinematics import line_move_times
+
+        move_times = line_move_times(operations_data, manipulator_data, **options)
+        positions = tuple(move_times.positions.tolist())
+        homes = cls.spread_homes(positions, manipulator_data['num_manipulators'], safety_distance)
+        return cls(positions, safety_distance, kinematics=move_times.kinematics, homes=homes)
+
+    def empty_time(self, distance):
+        """Prázdný přejezd o `distance` v celých sekundách, zaokrouhleno nahoru."""
+        if distance <= 0:
+            return 0
+        seconds = self.kinematics.travel_time(distance) if self.kinematics is not None else distance / self.speed
+        return math.ceil(float(seconds) - 1e-9)
+
+def add_rail_constraints(model, task_vars, num_manipulators, rail):
+    """
+    Přidá do modelu build_model (nebo build_mixed_model) antikolizní omezení
+    společné kolejnice `rail`; task_vars[klíč]["manipulator_index"] je pak
+    pořadí přiřazeného manipulátoru na kolejnici (od 0).
+    """
+    pos, d = rail.positions, rail.safety_distance
+    lo, hi = min(pos), max(pos)
+    span = {}
+    for key, task in task_vars.items():
+        left, right = sorted((pos[task["from"]], pos[task["to"]]))
+        span[key] = (left, right)
+        index = model.NewIntVar(0, num_manipulators - 1, f"manip_index_{key[0]}_{key[1]}")
+        model.Add(index == sum(m * b for m, (b, _) in task["assigned_transport"].items()))
+        task["manipulator_index"] = index
+        # Zóna manipulátoru: vlevo m sousedů, vpravo num_manipulators - 1 - m
+        for m, (bool_var, _) in task["assigned_transport"].items():
+            if left < lo + m * d or right > hi - (num_manipulators - 1 - m) * d:
+                model.Add(bool_var == 0)
+            elif rail.homes is not None:
+                # Z výchozí polohy musí manipulátor nejdřív dojet ke startu převozu
+                approach = rail.empty_time(abs(pos[task["from"]] - rail.homes[m]))
+                model.Add(task["transport_start"] >= approach).OnlyEnforceIf(bool_var)
+
+    def separated(i, j, lits, gap_ij, gap_ji):
+        """Při lits převoz i skončí o gap_ij před začátkem j, nebo j o gap_ji před i."""
+        ti, tj = task_vars[i], task_vars[j]
+        if i[0] == j[0]:
+            # Převozy téhož rámu jdou po sobě podle kroku
+            first, second, gap = (ti, tj, gap_ij) if i[1] < j[1] else (tj, ti, gap_ji)
+            model.Add(second["transport_start"] >= first["transport_end"] + gap).OnlyEnforceIf(lits)
+            return
+        before = model.NewBoolVar(f"rail_before_{i[0]}_{i[1]}_{j[0]}_{j[1]}")
+        model.Add(tj["transport_start"] >= ti["transport_end"] + gap_ij).OnlyEnforceIf(lits + [before])
+        model.Add(ti["transport_start"] >= tj["transport_end"] + gap_ji).OnlyEnforceIf(lits + [before.Not()])
+
+    # Pořadí manipulátorů dvou převozů: delta = index j - index i. Literál delta >= k
+    # (resp. <= -k) vynutí odstup k bezpečných vzdáleností, protože mezi nimi je
+    # k - 1 dalších manipulátorů; mezery rostou s k, stačí je tedy vázat na tyto literály.
+    reach = range(1, num_manipulators if d > 0 else min(num_manipulators, 2))
+    for i, j in itertools.combinations(task_vars, 2):
+        ti, tj = task_vars[i], task_vars[j]
+        (li, ri), (lj, rj) = span[i], span[j]
+        suffix = f"{i[0]}_{i[1]}_{j[0]}_{j[1]}"
+        delta = model.NewIntVar(-(num_manipulators - 1), num_manipulators - 1, "rail_delta_" + suffix)
+        model.Add(delta == tj["manipulator_index"] - ti["manipulator_index"])
+
+        def order_literal(condition, name):
+            lit = model.NewBoolVar(f"rail_{name}_{suffix}")
+            model.Add(condition).OnlyEnforceIf(lit)
+            return lit
+
+        # Týž manipulátor: prázdný přejezd z cíle jednoho převozu na start druhého
+        same = order_literal(delta == 0, "eq")
+        model.Add(delta != 0).OnlyEnforceIf(same.Not())
+        separated(i, j, [same], rail.empty_time(abs(pos[tj["from"]] - pos[ti["to"]])),
+                  rail.empty_time(abs(pos[ti["from"]] - pos[tj["to"]])))
+        for k in reach:
+            # i o k manipulátorů vlevo: úseky se nevejdou vedle sebe; mezi převozy jeden
+            # manipulátor uhne z úseku druhého a druhý dojede z okraje uvolněného úseku ke startu
+            gap = k * d
+            if ri + gap > lj:
+                left_of = order_literal(delta >= k, f"ge{k}")
+                model.Add(delta < k).OnlyEnforceIf(left_of.Not())
+                separated(i, j, [left_of],
+                          max(rail.empty_time(pos[ti["to"]] - (lj - gap)), rail.empty_time(ri + gap - pos[tj["from"]])),
+                          max(rail.empty_time(ri + gap - pos[tj["to"]]), rail.empty_time(pos[ti["from"]] - (lj - gap))))
+            if rj + gap > li:
+                right_of = order_literal(delta <= -k, f"le{k}")
+                model.Add(delta > -k).OnlyEnforceIf(right_of.Not())
+                separated(i, j, [right_of],
+                          max(rail.empty_time(rj + gap - pos[ti["to"]]), rail.empty_time(pos[tj["from"]] - (li - gap))),
+                          max(rail.empty_time(pos[tj["to"]] - (li - gap)), rail.empty_time(rj + gap - pos[ti["from"]])))
+
+# ----- Cyklický (periodický) rozvrh -----
+# Místo dávky num_materials rámů se optimalizuje jedna perioda opakujícího se
+# vzoru: v každé periodě vstoupí `degree` rámů (K-stupňový cyklus) a rám k + K
+# má stejný rozvrh jako rám k, jen posunutý o periodu. Časy převozů rámu se
+# měří od začátku jeho periody a mohou přesahovat do dalších period; lázně a
+# manipulátory sdílené napříč cykly se hlídají modulo perioda (čas =
+# q * perioda + zbytek, NoOverlap na zdvojené ose [0, 2 * perioda)).
+# Velikost modelu nezávisí na počtu rámů za směnu.
+
+def build_cyclic_model(num_baths=num_baths, num_manipulators=num_manipulators, move_time=move_time,
+                       bath_durations=None, degree=1):
+    """
+    Sestaví cyklický model s minimalizací periody. Vrací (model, task_vars,
+    period); task_vars[(rám vzoru, krok)] obsahuje začátek převozu,
+    přiřazení manipulátoru a u lázní dobu obsazení.
+    """
+    if bath_durations is None:
+        bath_durations = default_bath_durations(num_baths)
+    num_transfers = num_baths + 1
+    moves = transfer_times(move_time, num_baths)
+
+    # Meze periody: dolní z kapacity lázní a vytížení manipulátorů, horní ze sériového zpracování
+    flow = sum(bath_durations.values()) + sum(moves)
+    period_lb = max(max(degree * d for d in bath_durations.values()),
+                    math.ceil(degree * sum(moves) / num_manipulators))
+    period_ub = degree * flow
+    max_flow = 2 * period_ub  # nejpozdější začátek převozu rámu od začátku jeho periody
+    max_q = max_flow // period_lb + 1
+
+    model = cp_model.CpModel()
+    period = model.NewIntVar(period_lb, period_ub, "perioda")
+
+    def modulo(expr, name):
+        """Zbytek času `expr` po dělení periodou."""
+        q = model.NewIntVar(0, max_q, "q_" + name)
+        r = model.NewIntVar(0, period_ub - 1, "r_" + name)
+        q_period = model.NewIntVar(0, max_flow + max(moves), "qp_" + name)
+        model.AddMultiplicationEquality(q_period, [q, period])
+        model.Add(expr == q_period + r)
+        model.Add(r < period)
+        return r
+
+    def cyclic_intervals(start_mod, size, name, presence=None):
+        """Interval se začátkem start_mod a jeho kopie o periodu později."""
+        intervals = []
+        for copy in range(2):
+            start = model.NewIntVar(0, 2 * period_ub, f"{name}_s{copy}")
+            end = model.NewIntVar(0, 3 * period_ub, f"{name}_e{copy}")
+            model.Add(start == start_mod + copy * period)
+            if presence is None:
+                intervals.append(model.NewIntervalVar(start, size, end, f"{name}_{copy}"))
             else:
-                model.Add(task_vars[(material_id, step + 1)]["transport_start"] >= task_vars[(material_id, step)]["transport_end"])
-
-# Omezení: každá koupel (lázeň) – max 1 rám současně
-for bath_station in bath_durations:
-    bath_intervals = []
-    for bt, st in bath_tasks:
-        if st == bath_station:
-            bath_intervals.append(bt)
-    model.AddNoOverlap(bath_intervals)
-
-# Omezení: každý transport přiřazen právě jednomu manipulátoru
-for key, task in task_vars.items():
-    bools = [b for b, _ in task["assigned_transport"].values()]
-    model.AddExactlyOne(bools)
-
-# Manipulátorové kolize (NoOverlap)
-for m in range(num_manipulators):
-    intervals = []
-    for task in task_vars.values():
-        if m in task["assigned_transport"]:
-            intervals.append(task["assigned_transport"][m][1])
-    model.AddNoOverlap(intervals)
-
-# Cíl: minimalizace taktu linky
-last_ends = [task_vars[(material_id, len(transfers) - 1)]["transport_end"] for material_id in range(num_materials)]
-makespan = model.NewIntVar(0, horizon, "makespan")
-model.AddMaxEquality(makespan, last_ends)
-model.Minimize(makespan)
-
-# Solve
-solver = cp_model.CpSolver()
-status = solver.Solve(model)
-
-# Výstup
-if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+                intervals.append(model.NewOptionalIntervalVar(start, size, end, presence, f"{name}_{copy}"))
+        return intervals
+
+    task_vars = {}
+    manip_intervals = {m: [] for m in range(num_manipulators)}
+    bath_intervals = {b: [] for b in bath_durations}
+    for k in range(degree):
+        for step in range(num_transfers):
+            suffix = f"_{k}_{step}"
+            start = model.NewIntVar(0, max_flow, "trans_start" + suffix)
+            start_mod = modulo(start, "trans" + suffix)
+            assigned = {}
+            for m in range(num_manipulators):
+                bool_var = model.NewBoolVar(f"trans_m{m}{suffix}")
+                manip_intervals[m] += cyclic_intervals(start_mod, moves[step], f"trans_int_m{m}{suffix}", bool_var)
+                assigned[m] = bool_var
+            model.AddExactlyOne(assigned.values())
+            task_vars[(k, step)] = {"transport_start": start, "transport_start_mod": start_mod,
+                                    "from": step, "to": step + 1, "assigned": assigned}
+
+        # Rám vstupuje během své periody, rámy vzoru v pořadí
+        model.Add(task_vars[(k, 0)]["transport_start"] < period)
+        if k == 0:
+            model.Add(task_vars[(k, 0)]["transport_start"] == 0)
+        else:
+            model.Add(task_vars[(k, 0)]["transport_start"] >= task_vars[(k - 1, 0)]["transport_start"])
+
+        # Lázeň je obsazená od dokončení převozu do ní do začátku převozu z ní
+        for bath_station, dwell in bath_durations.items():
+            suffix = f"_{k}_{bath_station}"
+            arrival = task_vars[(k, bath_station - 1)]["transport_start"] + moves[bath_station - 1]
+            occupancy = model.NewIntVar(dwell, period_ub, "bath_occ" + suffix)
+            model.Add(occupancy == task_vars[(k, bath_station)]["transport_start"] - arrival)
+            model.Add(occupancy <= period)
+            arrival_mod = modulo(arrival, "bath" + suffix)
+            bath_intervals[bath_station] += cyclic_intervals(arrival_mod, occupancy, "bath_interval" + suffix)
+            task_vars[(k, bath_station)]["bath_occupancy"] = occupancy
+
+    for intervals in manip_intervals.values():
+        model.AddNoOverlap(intervals)
+    for intervals in bath_intervals.values():
+        model.AddNoOverlap(intervals)
+
+    # Cíl: minimální perioda, při shodě co nejkratší průběžná doba rámů vzoru
+    flow_times = [task_vars[(k, num_transfers - 1)]["transport_start"] for k in range(degree)]
+    model.Minimize(period * (degree * max_flow + 1) + sum(flow_times))
+    return model, task_vars, period
+
+def cyclic_schedule_table(solver, task_vars, period, num_baths=num_baths, move_time=move_time):
+    """Tabulka převozů jednoho rámu vzoru: časy od začátku jeho periody i modulo perioda."""
+    moves = transfer_times(move_time, num_baths)
+    result = []
+    for (k, step), task in task_vars.items():
+        start = solver.Value(task["transport_start"])
+        manip_used = next(m + 1 for m, b in task["assigned"].items() if solver.BooleanValue(b))
+        result.append({
+            "Materiál": k + 1,
+            "Krok": step_label(task["from"], task["to"], num_baths),
+            "Začátek (s)": start,
+            "Konec (s)": start + moves[step],
+            "V periodě (s)": solver.Value(task["transport_start_mod"]),
+            "Manipulátor": manip_used
+        })
+    return pd.DataFrame(result).sort_values(by=["V periodě (s)", "Materiál"])
+
+def unroll_cyclic(solver, task_vars, period, num_racks, num_baths=num_baths, move_time=move_time):
+    """Rozvine cyklický rozvrh na num_racks rámů (rám n = rám vzoru n % K v cyklu n // K)."""
+    degree = 1 + max(k for k, _ in task_vars)
+    moves = transfer_times(move_time, num_baths)
+    period_value = solver.Value(period)
+    result = []
+    for rack in range(num_racks):
+        cycle, k = divmod(rack, degree)
+        for step in range(num_baths + 1):
+            task = task_vars[(k, step)]
+            start = cycle * period_value + solver.Value(task["transport_start"])
+            result.append({
+                "Materiál": rack + 1,
+                "Krok": step_label(task["from"], task["to"], num_baths),
+                "Začátek (s)": start,
+                "Konec (s)": start + moves[step],
+                "Manipulátor": next(m + 1 for m, b in task["assigned"].items() if solver.BooleanValue(b))
+            })
+    return pd.DataFrame(result).sort_values(by=["Začátek (s)", "Materiál"])
+
+def make_solver(max_time=None, num_workers=None, seed=None, deterministic=False):
+    """
+    CpSolver s volitelným časovým limitem (s), počtem vláken a semínkem.
+    deterministic=True dá při stejném modelu a semínku vždy stejný výsledek:
+    vlákna se prostřídají deterministicky (interleave_search) a limit se měří
+    v deterministickém čase řešiče místo reálného.
+    """
+    solver = cp_model.CpSolver()
+    if max_time is not None:
+        if deterministic:
+            solver.parameters.max_deterministic_time = max_time
+        else:
+            solver.parameters.max_time_in_seconds = max_time
+    if num_workers is not None:
+        solver.parameters.num_workers = num_workers
+    if seed is not None:
+        solver.parameters.random_seed = seed
+    if deterministic:
+        solver.parameters.interleave_search = True
+    return solver
+
+def step_label(from_station, to_station, num_baths=num_baths):
+    from_label = "Vstup" if from_station == 0 else f"Lázeň {from_station}" if from_station <= num_baths else "Výstup"
+    to_label = "Výstup" if to_station == num_baths + 1 else f"Lázeň {to_station}"
+    return f"{from_label} → {to_label}"
+
+def schedule_table(solver, task_vars, num_baths=num_baths):
+    """Tabulka převozů (materiál, krok, začátek, konec, manipulátor) z vyřešeného modelu."""
     result = []
     for (material_id, step), task in task_vars.items():
         start = solver.Value(task["transport_start"])
         end = solver.Value(task["transport_end"])
-        from_label = "Vstup" if task["from"] == 0 else f"Lázeň {task['from']}" if task["from"] <= num_baths else "Výstup"
-        to_label = "Výstup" if task["to"] == num_baths + 1 else f"Lázeň {task['to']}"
         manip_used = None
         for m, (b, _) in task["assigned_transport"].items():
             if solver.BooleanValue(b):
                 manip_used = m + 1
         result.append({
             "Materiál": material_id + 1,
-            "Krok": f"{from_label} → {to_label}",
+            "Krok": step_label(task["from"], task["to"], num_baths),
             "Začátek (s)": start,
             "Konec (s)": end,
             "Manipulátor": manip_used
         })
+    return pd.DataFrame(result).sort_values(by=["Začátek (s)", "Materiál"])
+
+# ----- Průběžná řešení (anytime) -----
+# Řešič hlásí každé zlepšené řešení callbackem; rozvrh s makespanem, dolní
+# mezí, mezerou k optimu a uplynulým časem se předá odběrateli (sink), např.
+# HMI, ještě než je dokázána optimalita. S časovým limitem tak provoz dostane
+# použitelný plán v pevné latenci a dál jen lepší.
+
+def solution_schedule(solver, task_vars):
+    """Rozvrh {(materiál, krok): (začátek, manipulátor od 0)} z řešiče nebo callbacku."""
+    schedule = {}
+    for key, task in task_vars.items():
+        manip = next(m for m, (b, _) in task["assigned_transport"].items() if solver.BooleanValue(b))
+        schedule[key] = (solver.Value(task["transport_start"]), manip)
+    return schedule
+
+class IncumbentCallback(cp_model.CpSolverSolutionCallback):
+    """
+    Předá každé zlepšené řešení do sink(incumbent), incumbent je slovník
+    s klíči index, makespan, objective, bound, gap, elapsed (s) a schedule
+    (jen když je zadáno task_vars modelu build_model). Historie je
+    v `incumbents`. Bez proměnné makespan je makespanem hodnota cíle; mez
+    a mezera se vždy vztahují k cíli (s okny ponoření zahrnuje i penalizaci).
+    """
+
+    def __init__(self, task_vars=None, sink=None, makespan=None):
+        super().__init__()
+        self.task_vars = task_vars
+        self.sink = sink
+        self.makespan = makespan
+        self.incumbents = []
+
+    def on_solution_callback(self):
+        objective = self.ObjectiveValue()
+        bound = self.BestObjectiveBound()
+        incumbent = {
+            "index": len(self.incumbents),
+            "makespan": self.Value(self.makespan) if self.makespan is not None else int(objective),
+            "objective": int(objective),
+            "bound": int(bound),
+            "gap": (objective - bound) / objective if objective else 0.0,
+            "elapsed": self.WallTime(),
+            "schedule": solution_schedule(self, self.task_vars) if self.task_vars is not None else None,
+        }
+        self.incumbents.append(incumbent)
+        if self.sink is not None:
+            self.sink(incumbent)
+
+    @property
+    def best(self):
+        return self.incumbents[-1] if self.incumbents else None
+
+    @property
+    def time_to_first(self):
+        return self.incumbents[0]["elapsed"] if self.incumbents else None
+
+def solve_anytime(model, task_vars=None, sink=None, max_time=None, num_workers=None, seed=None,
+                  deterministic=False, stop_gap=None, solver=None, makespan=None):
+    """
+    Vyřeší model s průběžným hlášením řešení (viz IncumbentCallback).
+    Vrací (status, solver, callback); nejlepší nalezený rozvrh je
+    callback.best, i když čas vypršel před důkazem optimality. S stop_gap
+    se řešení ukončí, jakmile relativní mezera k dolní mezi klesne na tuto
+    hodnotu (např. 0.02). makespan je proměnná taktu z build_model, když cíl
+    obsahuje i penalizaci ponoření.
+    """
+    if solver is None:
+        solver = make_solver(max_time, num_workers, seed, deterministic)
+    if stop_gap is not None:
+        solver.parameters.relative_gap_limit = stop_gap
+    callback = IncumbentCallback(task_vars, sink, makespan)
+    status = solver.Solve(model, callback)
+    return status, solver, callback
+
+def print_incumbent(incumbent):
+    """Sink pro příkazovou řádku: jeden řádek na zlepšené řešení."""
+    if incumbent["objective"] != incumbent["makespan"]:
+        print(f"[{incumbent['elapsed']:7.2f} s] takt {incumbent['makespan']} s, cíl {incumbent['objective']}, "
+              f"dolní mez cíle {incumbent['bound']}, mezera {100 * incumbent['gap']:.1f} %", flush=True)
+        return
+    print(f"[{incumbent['elapsed']:7.2f} s] takt {incumbent['makespan']} s, "
+          f"dolní mez {incumbent['bound']} s, mezera {100 * incumbent['gap']:.1f} %", flush=True)
+
+# ----- Rychlá heuristika (list scheduling + lokální prohledávání) -----
+# Stejná struktura úloh jako v build_model: převozy po move_time, ponoření
+# hned po dovezení do lázně (lázeň nejvýš 1 rám), každý převoz jeden
+# manipulátor. Dekodér bere převozy v pořadí seznamu a každý vloží na
+# nejdřívější čas, kdy je volný některý manipulátor i cílová lázeň (i do
+# mezer mezi už naplánovanými). Počáteční seznam tvoří dispečerské pravidlo,
+# lokální prohledávání pak prohazuje sousední převozy různých rámů a drží
+# nejlepší rozvrh. Rozvrh je vždy přípustný, takže slouží jako záloha, když
+# CP-SAT řešení nenajde, i jako nápověda (add_schedule_hints).
+# Okna ponoření a dvoupoziční lázně heuristika nezná: ponoření drží přesně
+# bath_durations, pro pružný model je tedy jen výchozí nápovědou.
+
+DISPATCH_RULES = ('fifo', 'mwr', 'lwr')  # pořadí vstupu, nejvíc / nejméně zbývající práce
+
+def _is_free(busy, start, duration):
+    """Je seřazený seznam obsazení busy [(začátek, konec)] volný na [start, start + duration)?"""
+    i = bisect.bisect_right(busy, (start, math.inf))
+    if i and busy[i - 1][1] > start:
+        return False
+    return i == len(busy) or busy[i][0] >= start + duration
+
+def _conflict_end(busy, start, duration):
+    """Konec prvního obsazení, které koliduje s [start, start + duration)."""
+    i = bisect.bisect_right(busy, (start, math.inf))
+    if i and busy[i - 1][1] > start:
+        return busy[i - 1][1]
+    return busy[i][1]
+
+class _ListDecoder:
+    """Stav obsazení manipulátorů a lázní při postupném vkládání převozů."""
+
+    def __init__(self, num_baths, num_manipulators, move_time, bath_durations, out_of_service=()):
+        self.num_baths = num_baths
+        self.moves = transfer_times(move_time, num_baths)
+        self.dwell = [bath_durations.get(step + 1, 0) for step in range(num_baths + 1)]  # ponoření po kroku
+        self.manipulators = [m for m in range(num_manipulators) if m + 1 not in out_of_service]
+        self.manip_busy = {m: [] for m in self.manipulators}
+        self.bath_busy = {b: [] for b in range(1, num_baths + 1)}
+        self.schedule = {}
+        self.ready = {}  # rám -> nejdřívější začátek dalšího převozu
+        self.last_entry = 0  # rámy vstupují nejdřív se vstupem předchozího, hledání nezačíná od nuly
+        self.entries = 0
+        self.exits = []  # seřazené začátky převozů do výstupu
+
+    def earliest(self, material_id, step):
+        """Nejdřívější (začátek, manipulátor) dalšího převozu rámu; převoz se nezapisuje."""
+        move = self.moves[step]
+        t = self.ready.get(material_id, self.last_entry)
+        if step == 0 and self.num_baths <= self.entries < len(self.exits) + self.num_baths:
+            # V lince je nejvýš num_baths rámů: vstup až po uvolnění místa
+            t = max(t, self.exits[self.entries - self.num_baths])
+        bath = self.bath_busy.get(step + 1)
+        dwell = self.dwell[step]
+        while True:
+            free = [m for m in self.manipulators if _is_free(self.manip_busy[m], t, move)]
+            bath_ok = bath is None or _is_free(bath, t + move, dwell)
+            if free and bath_ok:
+                # Obsazení jen přibývá, nalezený začátek je dolní mez i pro příští dotaz
+                if material_id in self.ready:
+                    self.ready[material_id] = t
+                # Manipulátor s nejkratší prodlevou před převozem (nejtěsnější mezera)
+                def idle_before(m):
+                    busy = self.manip_busy[m]
+                    i = bisect.bisect_right(busy, (t, math.inf))
+                    return t - busy[i - 1][1] if i else t
+                return t, min(free, key=idle_before)
+            next_t = t
+            if not free:
+                next_t = min(_conflict_end(self.manip_busy[m], t, move) for m in self.manipulators)
+            if not bath_ok:
+                next_t = max(next_t, _conflict_end(bath, t + move, dwell) - move)
+            t = max(next_t, t + 1)
+
+    def place(self, material_id, step, start=None, manip=None):
+        if start is None:
+            start, manip = self.earliest(material_id, step)
+        end = start + self.moves[step]
+        bisect.insort(self.manip_busy[manip], (start, end))
+        if step + 1 in self.bath_busy:
+            bisect.insort(self.bath_busy[step + 1], (end, end + self.dwell[step]))
+        self.schedule[(material_id, step)] = (start, manip)
+        self.ready[material_id] = end + self.dwell[step]
+        if step == 0:
+            self.last_entry = max(self.last_entry, start)
+            self.entries += 1
+        if step == self.num_baths:
+            bisect.insort(self.exits, start)
+        return start, manip
+
+    def makespan(self):
+        return max((start + self.moves[step] for (_, step), (start, _) in self.schedule.items()
+                    if step == self.num_baths), default=0)
+
+def greedy_schedule(num_materials, num_baths=num_baths, num_manipulators=num_manipulators, move_time=move_time,
+                    bath_durations=None, rule='fifo', out_of_service=()):
+    """
+    Dispečerský list scheduling: vždy se naplánuje převoz s nejdřívějším
+    možným začátkem, při shodě podle pravidla `rule` z DISPATCH_RULES. Rámy
+    vstupují v pořadí. Vrací (rozvrh, makespan, pořadí převozů).
+    """
+    if bath_durations is None:
+        bath_durations = default_bath_durations(num_baths)
+    decoder = _ListDecoder(num_baths, num_manipulators, move_time, bath_durations, out_of_service)
+    remaining = [decoder.moves[step] + decoder.dwell[step] for step in range(num_baths + 1)]
+    for step in range(num_baths - 1, -1, -1):
+        remaining[step] += remaining[step + 1]
+    tie_break = {
+        'fifo': lambda material_id, step: material_id,
+        'mwr': lambda material_id, step: -remaining[step],
+        'lwr': lambda material_id, step: remaining[step],
+    }[rule]
+
+    def entry(material_id, step):
+        start, manip = decoder.earliest(material_id, step)
+        return (start, tie_break(material_id, step), material_id), step, manip
+
+    # Kandidáti jsou další převozy rámů v lince a vstup dalšího rámu. Vkládáním
+    # se nejdřívější začátky jen posouvají dál, takže uložený klíč je dolní mez
+    # a přepočítává se jen kandidát na vrcholu haldy (líné vyhodnocení). V lince
+    # je nejvýš num_baths rámů, další vstoupí až po výstupu některého z nich.
+    candidates = [entry(0, 0)] if num_materials else []
+    next_material = 1
+    in_line = 0
+    sequence = []
+    while candidates:
+        key, step, _ = heapq.heappop(candidates)
+        material_id = key[2]
+        fresh = entry(material_id, step)
+        if candidates and fresh[0] > candidates[0][0]:
+            heapq.heappush(candidates, fresh)
+            continue
+        decoder.place(material_id, step, fresh[0][0], fresh[2])
+        sequence.append((material_id, step))
+        if step == 0:
+            in_line += 1
+        if step < num_baths:
+            heapq.heappush(candidates, entry(material_id, step + 1))
+        else:
+            in_line -= 1
+        if step in (0, num_baths) and in_line < num_baths and next_material < num_materials:
+            heapq.heappush(candidates, entry(next_material, 0))
+            next_material += 1
+    return decoder.schedule, decoder.makespan(), sequence
+
+def decode_sequence(sequence, num_baths=num_baths, num_manipulators=num_manipulators, move_time=move_time,
+                    bath_durations=None, out_of_service=()):
+    """Rozvrh z pořadí převozů (každý vložen na nejdřívější možný čas). Vrací (rozvrh, makespan)."""
+    if bath_durations is None:
+        bath_durations = default_bath_durations(num_baths)
+    decoder = _ListDecoder(num_baths, num_manipulators, move_time, bath_durations, out_of_service)
+    for material_id, step in sequence:
+        decoder.place(material_id, step)
+    return decoder.schedule, decoder.makespan()
+
+def improve_schedule(sequence, num_baths=num_baths, num_manipulators=num_manipulators, move_time=move_time,
+                     bath_durations=None, out_of_service=(), time_limit=0.05, seed=0):
+    """
+    Lokální prohledávání nad pořadím převozů: prohodí sousední převozy dvou
+    různých rámů, rozvrh dekóduje znovu a změnu ponechá, když se makespan
+    nezhorší. Běží time_limit sekund. Vrací (rozvrh, makespan, pořadí).
+    """
+    rng = random.Random(seed)
+    sequence = list(sequence)
+    args = (num_baths, num_manipulators, move_time, bath_durations, out_of_service)
+    best_schedule, best = decode_sequence(sequence, *args)
+    deadline = time.perf_counter() + time_limit
+    while len(sequence) > 1 and time.perf_counter() < deadline:
+        i = rng.randrange(len(sequence) - 1)
+        if sequence[i][0] == sequence[i + 1][0]:
+            continue
+        sequence[i], sequence[i + 1] = sequence[i + 1], sequence[i]
+        schedule, makespan_value = decode_sequence(sequence, *args)
+        if makespan_value <= best:
+            best_schedule, best = schedule, makespan_value
+        else:
+            sequence[i], sequence[i + 1] = sequence[i + 1], sequence[i]
+    return best_schedule, best, sequence
+
+def heuristic_schedule(num_materials, num_baths=num_baths, num_manipulators=num_manipulators, move_time=move_time,
+                       bath_durations=None, out_of_service=(), time_limit=0.05, seed=0):
+    """Nejlepší z dispečerských pravidel, vylepšený lokálním prohledáváním. Vrací (rozvrh, makespan)."""
+    line = (num_baths, num_manipulators, move_time, bath_durations)
+    results = [greedy_schedule(num_materials, *line, rule=rule, out_of_service=out_of_service)
+               for rule in DISPATCH_RULES]
+    _, _, sequence = min(results, key=lambda result: result[1])
+    schedule, makespan_value, _ = improve_schedule(sequence, *line, out_of_service=out_of_service,
+                                                   time_limit=time_limit, seed=seed)
+    return schedule, makespan_value
+
+def validate_schedule(schedule, num_baths=num_baths, move_time=move_time, bath_durations=None):
+    """
+    Seznam porušení (návaznost, ponoření, kolize manipulátorů a lázní);
+    prázdný pro přípustný rozvrh. Ponoření se bere hned po dovezení, jak je
+    plánuje heuristika (CP-SAT model dovoluje i pozdější začátek ponoření).
+    """
+    if bath_durations is None:
+        bath_durations = default_bath_durations(num_baths)
+    moves = transfer_times(move_time, num_baths)
+    problems = []
+    for (material_id, step), (start, _) in schedule.items():
+        if step and (material_id, step - 1) in schedule:
+            earliest = schedule[(material_id, step - 1)][0] + moves[step - 1] + bath_durations.get(step, 0)
+            if start < earliest:
+                problems.append(f"Materiál {material_id + 1}, krok {step}: začátek {start} < {earliest}")
+    by_manip, by_bath = {}, {}
+    for (material_id, step), (start, manip) in schedule.items():
+        end = start + moves[step]
+        by_manip.setdefault(manip, []).append((start, end, material_id))
+        if step + 1 in bath_durations:
+            by_bath.setdefault(step + 1, []).append((end, end + bath_durations[step + 1], material_id))
+    for label, groups in (("Manipulátor", by_manip), ("Lázeň", by_bath)):
+        for resource, intervals in groups.items():
+            intervals.sort()
+            for (s1, e1, a), (s2, e2, b) in zip(intervals, intervals[1:]):
+                if s2 < e1:
+                    problems.append(f"{label} {resource if label == 'Lázeň' else resource + 1}: "
+                                    f"materiály {a + 1} a {b + 1} se překrývají")
+    return problems
+
+def add_schedule_hints(model, task_vars, schedule, out_of_service=()):
+    """Předá rozvrh {(materiál, krok): (začátek, manipulátor)} modelu build_model jako nápovědu."""
+    for key, (start, manip) in schedule.items():
+        task = task_vars.get(key)
+        # Převozy manipulátoru, který vypadl, se nechají řešiči celé
+        if task is None or manip + 1 in out_of_service:
+            continue
+        model.AddHint(task["transport_start"], start)
+        for m, (bool_var, _) in task["assigned_transport"].items():
+            model.AddHint(bool_var, m == manip)
+
+# ----- Opakované plánování s nápovědou z předchozího řešení -----
+
+@dataclass
+class SchedulerConfig:
+    """Parametry linky pro LineScheduler; chybějící délky ponoření se doplní výchozími."""
+    num_baths: int = num_baths
+    num_materials: int = num_materials
+    num_manipulators: int = num_manipulators
+    move_time: object = move_time  # čas převozu, nebo n-tice časů jednotlivých převozů
+    bath_durations: dict = field(default_factory=dict)
+    out_of_service: tuple = ()  # čísla manipulátorů (od 1) mimo provoz
+    strengthen: bool = False    # zesílení modelu (viz strengthen_model)
+    dwell_windows: dict = None  # {lázeň: (min, max)} zapne pružné ponoření (viz build_model)
+    bath_capacity: dict = field(default_factory=dict)  # {lázeň: 2} u dvoupozičních lázní
+    dwell_penalty: int = DWELL_PENALTY
+    rail: Rail = None  # antikolize na společné kolejnici (viz add_rail_constraints)
+
+    @classmethod
+    def from_app(cls, operations_data, manipulator_data, num_materials=num_materials, flexible=True, **options):
+        """
+        Konfigurace z dat konfigurátoru (app.py), časy převozů z kinematiky
+        (viz line_parameters, obsahují i okapání). S flexible=True se
+        ponoření pohybuje v oknech time_min..time_max (viz line_windows).
+        """
+        baths, manipulators, moves, durations = line_parameters(operations_data, manipulator_data, **options)
+        windows, capacity = line_windows(operations_data)
+        return cls(baths, num_materials, manipulators, tuple(moves), durations,
+                   dwell_windows=windows if flexible else None, bath_capacity=capacity)
+
+    def durations(self):
+        durations = default_bath_durations(self.num_baths)
+        durations.update({b: d for b, d in self.bath_durations.items() if b in durations})
+        return durations
+
+class LineScheduler:
+    """
+    Drží model, řešič a poslední rozvrh. Po změně parametrů (update) se model
+    sestaví znovu a předchozí rozvrh se předá řešiči jako nápověda (AddHint):
+    převozy, které v novém modelu existují, dostanou svůj dřívější začátek a
+    manipulátor, nové materiály rozvrh posledního materiálu posunutý o jeho
+    odstup od předposledního. Převozy manipulátoru, který vypadl z provozu,
+    nápovědu nedostanou. Zlepšená řešení se průběžně předávají do sink
+    (viz IncumbentCallback).
+    """
+
+    def __init__(self, config=None, max_time=None, num_workers=None, seed=None, deterministic=False, sink=None):
+        self.config = config or SchedulerConfig()
+        self.max_time = max_time
+        self.num_workers = num_workers
+        self.seed = seed
+        self.deterministic = deterministic
+        self.sink = sink
+        self.incumbents = []
+        self.solution = None  # (materiál, krok) -> (začátek, manipulátor od 0)
+        self.status = None
+        self.solve_time = None
+        self.fallback = None  # makespan heuristického rozvrhu, když CP-SAT řešení nenašel
+        self.build()
+
+    def build(self):
+        cfg = self.config
+        self.model, self.task_vars, self.makespan_var = build_model(
+            cfg.num_baths, cfg.num_materials, cfg.num_manipulators, cfg.move_time,
+            cfg.durations(), cfg.out_of_service, strengthen=cfg.strengthen, dwell_windows=cfg.dwell_windows,
+            bath_capacity=cfg.bath_capacity, dwell_penalty=cfg.dwell_penalty, rail=cfg.rail)
+        self.solver = make_solver(self.max_time, self.num_workers, self.seed, self.deterministic)
+
+    def _hint_values(self):
+        """Předchozí rozvrh rozšířený na materiály, které v něm nebyly."""
+        hints = dict(self.solution)
+        materials = sorted({material for material, _ in self.solution})
+        if not materials:
+            return hints
+        last = materials[-1]
+        shift = 0
+        if len(materials) > 1:
+            shift = self.solution[(last, 0)][0] - self.solution[(materials[-2], 0)][0]
+        shift = max(shift, max(transfer_times(self.config.move_time, self.config.num_baths)))
+        for material_id, step in self.task_vars:
+            if (material_id, step) not in hints and (last, step) in self.solution:
+                start, manip = self.solution[(last, step)]
+                hints[(material_id, step)] = (start + (material_id - last) * shift, manip)
+        return hints
+
+    def add_hints(self):
+        self.model.ClearHints()
+        if self.solution:
+            hints = self._hint_values()
+        elif self.config.rail is None:
+            # Bez předchozího plánu poslouží jako nápověda heuristický rozvrh
+            hints = self.heuristic()[0]
+        else:
+            # Heuristika kolejnici nezná, její rozvrh by vedl ke srážkám
+            return
+        add_schedule_hints(self.model, self.task_vars, hints, self.config.out_of_service)
+
+    def heuristic(self):
+        cfg = self.config
+        return heuristic_schedule(cfg.num_materials, cfg.num_baths, cfg.num_manipulators, cfg.move_time,
+                                  cfg.durations(), cfg.out_of_service)
+
+    def solve(self, use_hint=True):
+        """Vyřeší aktuální model (s nápovědou, je-li k dispozici) a vrátí status."""
+        if use_hint:
+            self.add_hints()
+        started = time.perf_counter()
+        self.status, _, callback = solve_anytime(self.model, self.task_vars, self.sink, solver=self.solver,
+                                                 makespan=self.makespan_var)
+        self.solve_time = time.perf_counter() - started
+        self.incumbents = callback.incumbents
+        if self.feasible:
+            self.solution = solution_schedule(self.solver, self.task_vars)
+            self.fallback = None
+        elif self.config.rail is None:
+            # Bez řešení v časovém limitu se použije přípustný heuristický rozvrh
+            self.solution, self.fallback = self.heuristic()
+        else:
+            # Na kolejnici heuristika přípustný rozvrh nedává: bez rozvrhu
+            self.solution, self.fallback = None, None
+        return self.status
+
+    def update(self, use_hint=True, **changes):
+        """Změní parametry (např. num_materials=5), sestaví model znovu a přeplánuje."""
+        self.config = replace(self.config, **changes)
+        self.build()
+        return self.solve(use_hint)
+
+    def set_dwell(self, bath, seconds, use_hint=True):
+        return self.update(use_hint, bath_durations={**self.config.bath_durations, bath: seconds})
+
+    def set_out_of_service(self, manipulators, use_hint=True):
+        return self.update(use_hint, out_of_service=tuple(manipulators))
+
+    @property
+    def feasible(self):
+        return self.status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+
+    @property
+    def makespan(self):
+        return self.solver.Value(self.makespan_var) if self.feasible else self.fallback
+
+    def table(self):
+        if self.solution is None:
+            return None
+        if self.fallback is not None:
+            return solution_table(self.solution, self.config.num_baths, self.config.move_time)
+        return schedule_table(self.solver, self.task_vars, self.config.num_baths)
+
+# ----- Klouzavý horizont pro velké dávky -----
+# Monolitický model roste s počtem rámů a doba řešení exploduje. Tady se řeší
+# okna po `window` rámech: z každého vyřešeného okna se zmrazí prvních
+# `freeze` rámů, jejich převozy a ponoření se dalšímu oknu předají jako pevné
+# intervaly na manipulátorech a lázních (okrajové podmínky) a okno se posune.
+# Intervaly, které skončily před začátkem okna, se zahazují, takže velikost
+# modelu i čas na okno zůstávají omezené.
+
+def rolling_horizon(num_materials, window=6, freeze=3, num_baths=num_baths, num_manipulators=num_manipulators,
+                    move_time=move_time, bath_durations=None, max_time=10.0, num_workers=None, seed=None,
+                    progress=None, strengthen=False):
+    """
+    Rozvrh num_materials rámů klouzavým horizontem; max_time (s) je limit na
+    jedno okno. Okno minimalizuje svůj makespan. Vrací (rozvrh, makespan), rozvrh = {(materiál, krok):
+    (začátek, manipulátor od 0)}, nebo (None, None), když okno nemá řešení.
+    """
+    if bath_durations is None:
+        bath_durations = default_bath_durations(num_baths)
+    freeze = max(1, min(freeze, window))
+    moves = transfer_times(move_time, num_baths)
+    last_step = num_baths  # převoz do výstupu
+    schedule = {}
+    fixed = {}
+    previous = {}
+    release = 0
+    first = 0
+    while first < num_materials:
+        size = min(window, num_materials - first)
+        model, task_vars, makespan = build_model(num_baths, size, num_manipulators, move_time, bath_durations,
+                                                 first_material=first, release=release, fixed_intervals=fixed,
+                                                 strengthen=strengthen)
+        # Nápověda z předchozího okna pro rámy, které v něm nebyly zmrazeny
+        add_schedule_hints(model, task_vars, previous)
+
+        solver = make_solver(max_time, num_workers, seed)
+        status = solver.Solve(model)
+        if status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            return None, None
+
+        previous = {}
+        frozen_last = first + (size if first + size >= num_materials else freeze)
+        for (material_id, step), task in task_vars.items():
+            start = solver.Value(task["transport_start"])
+            manip = next(m for m, (b, _) in task["assigned_transport"].items() if solver.BooleanValue(b))
+            if material_id >= frozen_last:
+                previous[(material_id, step)] = (start, manip)
+                continue
+            schedule[(material_id, step)] = (start, manip)
+            fixed.setdefault(('manipulator', manip), []).append((start, start + moves[step]))
+            if "bath_interval" in task:
+                fixed.setdefault(('bath', task["bath_station"]), []).append(
+                    (solver.Value(task["bath_start"]), solver.Value(task["bath_end"])))
+
+        # Další okno začíná vstupem posledního zmrazeného rámu; starší intervaly už nic neomezují
+        release = schedule[(frozen_last - 1, 0)][0]
+        fixed = {resource: [(s, e) for s, e in intervals if e > release] for resource, intervals in fixed.items()}
+        first = frozen_last
+        if progress:
+            progress(first, num_materials)
+
+    makespan_value = max(start + moves[step] for (_, step), (start, _) in schedule.items() if step == last_step)
+    return schedule, makespan_value
+
+def solution_table(schedule, num_baths=num_baths, move_time=move_time):
+    """Tabulka převozů z rozvrhu {(materiál, krok): (začátek, manipulátor od 0)}."""
+    moves = transfer_times(move_time, num_baths)
+    result = []
+    for (material_id, step), (start, manip) in schedule.items():
+        result.append({
+            "Materiál": material_id + 1,
+            "Krok": step_label(step, step + 1, num_baths),
+            "Začátek (s)": start,
+            "Konec (s)": start + moves[step],
+            "Manipulátor": manip + 1
+        })
+    return pd.DataFrame(result).sort_values(by=["Začátek (s)", "Materiál"])
+
+def export_plan(schedule, path=None, num_baths=num_baths, move_time=move_time, bath_durations=None,
+                num_manipulators=num_manipulators, **meta):
+    """
+    Rozvrh jako plán ve sloupcovém formátu schedule_plan.Plan (materiál,
+    krok, manipulátor, začátek, konec), který simulátor umí přehrát
+    (sim_ani.replay). S path se plán uloží (.npz nebo .csv).
+    """
+    from schedule_plan import Plan
+
+    if bath_durations is None:
+        bath_durations = default_bath_durations(num_baths)
+    plan = Plan.from_schedule(schedule, num_baths, transfer_times(move_time, num_baths),
+                              bath_durations=[bath_durations[b] for b in range(1, num_baths + 1)],
+                              num_manipulators=num_manipulators, **meta)
+    if path:
+        plan.save(path)
+    return plan
+
+def compare_rolling(material_counts=(4, 6, 8, 10), window=6, freeze=3, max_time=30, num_workers=None, **line):
+    """Makespan a čas klouzavého horizontu proti monolitickému modelu na malých dávkách."""
+    line.setdefault('num_baths', num_baths)
+    line.setdefault('num_manipulators', num_manipulators)
+    line.setdefault('move_time', move_time)
+    rows = []
+    for n in material_counts:
+        started = time.perf_counter()
+        model, _, makespan = build_model(line['num_baths'], n, line['num_manipulators'], line['move_time'],
+                                         line.get('bath_durations'))
+        solver = make_solver(max_time, num_workers)
+        status = solver.Solve(model)
+        mono_time = time.perf_counter() - started
+        mono = solver.Value(makespan) if status in (cp_model.OPTIMAL, cp_model.FEASIBLE) else None
+
+        started = time.perf_counter()
+        _, rolling = rolling_horizon(n, window, freeze, max_time=max_time, num_workers=num_workers, **line)
+        rolling_time = time.perf_counter() - started
+        rows.append({
+            "Materiálů": n,
+            "Monolitický (s)": mono,
+            "Optimální": status == cp_model.OPTIMAL,
+            "Čas monolit (s)": round(mono_time, 2),
+            "Klouzavý (s)": rolling,
+            "Čas klouzavý (s)": round(rolling_time, 2),
+            "Rozdíl (%)": round(100 * (rolling - mono) / mono, 1) if mono and rolling else None,
+        })
+    return pd.DataFrame(rows)
+
+# ----- Smíšené receptury -----
+# Rámy různých technologií na jedné lince: každý rám projde jen lázněmi své
+# receptury s jejími okny ponoření. Stanice linky jsou 0 = vstup,
+# 1..num_stations = operace v pořadí na lince, num_stations + 1 = výstup;
+# převoz mezi libovolnými dvěma stanicemi trvá podle matice převozů
+# (MoveTimes.transfer_matrix) nebo jednotně move_time. Lázně a manipulátory
+# sdílejí všechny rámy a prokládání receptur volí řešič, linku tedy mezi
+# technologiemi není třeba vyprazdňovat. Ponoření se modeluje jako v pružném
+# build_model: od dovezení do odvezení, odchylky od time_opt se penalizují.
+
+@dataclass
+class Recipe:
+    """Technologie: lázně (čísla stanic) v pořadí průchodu, time_opt a okna ponoření."""
+    name: str
+    baths: tuple
+    durations: dict
+    dwell_windows: dict = field(default_factory=dict)  # {lázeň: (min, max)}, jinak přesně time_opt
+
+    @classmethod
+    def from_app(cls, name, operations_data, flexible=True):
+        """Receptura z dat konfigurátoru jedné technologie; stanice = pořadí operace na lince."""
+        durations, windows = {}, {}
+        for station, op in enumerate(sorted(operations_data, key=lambda op: op['operation_index']), start=1):
+            if op['used_in_tech']:
+                opt = int(op['time_opt'])
+                durations[station] = opt
+                windows[station] = (min(int(op.get('time_min', opt)), opt), max(int(op.get('time_max', opt)), opt))
+        return cls(name, tuple(durations), durations, windows if flexible else {})
+
+    def window(self, bath):
+        opt = self.durations[bath]
+        return tuple(self.dwell_windows.get(bath, (opt, opt)))
+
+def station_transfer_times(move_time, num_stations):
+    """Matice převozů mezi stanicemi 0..num_stations + 1; move_time je jeden čas, nebo matice."""
+    if isinstance(move_time, (int, float)):
+        return [[int(move_time)] * (num_stations + 2) for _ in range(num_stations + 2)]
+    matrix = [[int(t) for t in row] for row in move_time]
+    if len(matrix) != num_stations + 2:
+        raise ValueError(f"Očekávána matice převozů {num_stations + 2} × {num_stations + 2}, zadáno {len(matrix)} řádků")
+    return matrix
+
+def mixed_line_from_app(technologies, manipulator_data, flexible=True, **options):
+    """
+    (receptury, num_stations, num_manipulators, matice převozů, bath_capacity)
+    pro technologie {název: operations_data} z konfigurátoru. Rozmístění
+    stanic a okapání se berou z první technologie, dvoupoziční jsou lázně
+    označené v kterékoli z nich.
+    """
+    from kinematics import line_move_times
+
+    layout = next(iter(technologies.values()))
+    recipes = {name: Recipe.from_app(name, ops, flexible) for name, ops in technologies.items()}
+    matrix = line_move_times(layout, manipulator_data, used_only=False, **options).transfer_matrix()
+    capacity = {}
+    for ops in technologies.values():
+        for station, op in enumerate(sorted(ops, key=lambda op: op['operation_index']), start=1):
+            if op.get('double_position'):
+                capacity[station] = 2
+    return recipes, len(layout), manipulator_data['num_manipulators'], matrix, capacity
+
+def build_mixed_model(jobs, recipes=None, num_stations=num_baths, num_manipulators=num_manipulators,
+                      move_time=move_time, bath_capacity=None, out_of_service=(), dwell_penalty=DWELL_PENALTY,
+                      rail=None):
+    """
+    Sestaví model pro seznam rámů `jobs` (názvy receptur z `recipes`, nebo
+    Recipe) na lince s num_stations stanicemi. Vrací (model, task_vars,
+    makespan); task_vars[(rám, krok)] má klíče jako v build_model a navíc
+    "recipe" a "move" (čas převozu). rail zapne antikolizi na kolejnici
+    (polohy všech stanic linky, viz Rail.from_app s used_only=False).
+    """
+    matrix = station_transfer_times(move_time, num_stations)
+    jobs = [recipes[job] if isinstance(job, str) else job for job in jobs]
+    for recipe in jobs:
+        if not all(1 <= bath <= num_stations for bath in recipe.baths):
+            raise ValueError(f"Receptura {recipe.name} používá lázeň mimo stanice 1..{num_stations}")
+    routes = [(0,) + tuple(recipe.baths) + (num_stations + 1,) for recipe in jobs]
+
+    # Sériový rozvrh s ponořením time_opt je přípustný a bez penalizace, optimum tedy není delší
+    horizon = sum(sum(recipe.durations.values()) + sum(matrix[a][b] for a, b in zip(route, route[1:]))
+                  for recipe, route in zip(jobs, routes))
+    if rail is not None:
+        # Na kolejnici potřebuje sériový rozvrh navíc prázdné přejezdy: před
+        # každým převozem uhnutí předchozího manipulátoru a příjezd ke startu
+        # (první převoz z výchozí polohy), každý nejvýš přes celou kolejnici
+        points = tuple(rail.positions) + tuple(rail.homes or ())
+        empty = 2 * rail.empty_time(max(points) - min(points))
+        horizon += sum(len(route) - 1 for route in routes) * empty
+    model = cp_model.CpModel()
+    task_vars = {}
+    manip_intervals = {m: [] for m in range(num_manipulators)}
+    bath_intervals = {}
+    deviations = []
+    for material_id, (recipe, route) in enumerate(zip(jobs, routes)):
+        for step, (from_station, to_station) in enumerate(zip(route, route[1:])):
+            suffix = f"_{material_id}_{step}"
+            move = matrix[from_station][to_station]
+            transport_start = model.NewIntVar(0, horizon, "trans_start" + suffix)
+            transport_end = model.NewIntVar(0, horizon, "trans_end" + suffix)
+            transport_interval = {}
+            for m in range(num_manipulators):
+                bool_var = model.NewBoolVar(f"trans_m{m}_{suffix}")
+                interval = model.NewOptionalIntervalVar(transport_start, move, transport_end, bool_var,
+                                                        f"trans_int_m{m}_{suffix}")
+                transport_interval[m] = (bool_var, interval)
+                manip_intervals[m].append(interval)
+                if m + 1 in out_of_service:
+                    model.Add(bool_var == 0)
+            model.AddExactlyOne(b for b, _ in transport_interval.values())
+            task_vars[(material_id, step)] = {
+                "transport_start": transport_start,
+                "transport_end": transport_end,
+                "from": from_station,
+                "to": to_station,
+                "assigned_transport": transport_interval,
+                "recipe": recipe.name,
+                "move": move,
+            }
+
+        # Ponoření od dovezení do odvezení, délka v okně receptury
+        for step, bath in enumerate(recipe.baths):
+            task = task_vars[(material_id, step)]
+            low, high = recipe.window(bath)
+            dwell = model.NewIntVar(low, high, f"dwell_{material_id}_{step}")
+            interval = model.NewIntervalVar(task["transport_end"], dwell, task_vars[(material_id, step + 1)]["transport_start"],
+                                            f"bath_interval_{material_id}_{step}")
+            task.update(bath_start=task["transport_end"], bath_end=task_vars[(material_id, step + 1)]["transport_start"],
+                        bath_interval=interval, bath_station=bath, dwell=dwell)
+            bath_intervals.setdefault(bath, []).append(interval)
+            opt = recipe.durations[bath]
+            if dwell_penalty and low < high:
+                deviation = model.NewIntVar(0, max(opt - low, high - opt), f"dwell_dev_{material_id}_{step}")
+                model.AddAbsEquality(deviation, dwell - opt)
+                deviations.append(deviation)
+
+    capacity = bath_capacity or {}
+    for bath, intervals in bath_intervals.items():
+        if capacity.get(bath, 1) > 1:
+            model.AddCumulative(intervals, [1] * len(intervals), capacity[bath])
+        else:
+            model.AddNoOverlap(intervals)
+    for intervals in manip_intervals.values():
+        model.AddNoOverlap(intervals)
+    if rail is not None:
+        add_rail_constraints(model, task_vars, num_manipulators, rail)
+
+    # Rámy stejné receptury jsou zaměnitelné: každým krokem projdou v pořadí seznamu
+    previous = {}
+    for material_id, recipe in enumerate(jobs):
+        if recipe.name in previous:
+            for step in range(len(recipe.baths) + 1):
+                model.Add(task_vars[(material_id, step)]["transport_start"]
+                          >= task_vars[(previous[recipe.name], step)]["transport_start"])
+        previous[recipe.name] = material_id
+
+    makespan = model.NewIntVar(0, horizon, "makespan")
+    model.AddMaxEquality(makespan, [task_vars[(material_id, len(recipe.baths))]["transport_end"]
+                                    for material_id, recipe in enumerate(jobs)])
+    if deviations:
+        model.Minimize(DWELL_MAKESPAN_WEIGHT * makespan + dwell_penalty * sum(deviations))
+    else:
+        model.Minimize(makespan)
+    return model, task_vars, makespan
+
+def mixed_schedule_table(solver, task_vars, num_stations=num_baths):
+    """Tabulka převozů smíšeného rozvrhu s recepturou rámu a délkou ponoření po převozu."""
+    result = []
+    for (material_id, step), task in task_vars.items():
+        manip_used = next(m + 1 for m, (b, _) in task["assigned_transport"].items() if solver.BooleanValue(b))
+        result.append({
+            "Materiál": material_id + 1,
+            "Receptura": task["recipe"],
+            "Krok": step_label(task["from"], task["to"], num_stations),
+            "Začátek (s)": solver.Value(task["transport_start"]),
+            "Konec (s)": solver.Value(task["transport_end"]),
+            "Ponoření (s)": solver.Value(task["dwell"]) if "dwell" in task else None,
+            "Manipulátor": manip_used
+        })
+    return pd.DataFrame(result).sort_values(by=["Začátek (s)", "Materiál"])
+
+# Ukázkové receptury na výchozí lince: úplná a zkrácená bez lázní 2 a 4
+MIXED_RECIPES = {
+    "A": Recipe("A", (1, 2, 3, 4), dict(bath_durations), {2: (40, 55), 3: (50, 70)}),
+    "B": Recipe("B", (1, 3), {1: 15, 3: 45}, {3: (40, 60)}),
+}
+
+def main_mixed(jobs, max_time=None, num_workers=None, progress=False):
+    """Ukázka smíšené dávky na výchozí lince: receptury MIXED_RECIPES, rámy podle jobs."""
+    model, task_vars, makespan = build_mixed_model(jobs, MIXED_RECIPES, num_baths, num_manipulators, move_time)
+    status, solver, _ = solve_anytime(model, task_vars, print_incumbent if progress else None, max_time, num_workers,
+                                      makespan=makespan)
+    if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+        print(mixed_schedule_table(solver, task_vars, num_baths).to_string(index=False))
+        print(f"\n✅ Takt smíšené dávky ({len(jobs)} rámů): {solver.Value(makespan)} sekund")
+    else:
+        print("❌ Řešení nebylo nalezeno.")
+
+def main_cyclic(degree):
+    model, task_vars, period = build_cyclic_model(num_baths, num_manipulators, move_time, bath_durations, degree)
+    solver = make_solver()
+    status = solver.Solve(model)
+
+    if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+        df = cyclic_schedule_table(solver, task_vars, period, num_baths)
+        print(df.to_string(index=False))
+        value = solver.Value(period)
+        print(f"\n✅ Minimální perioda: {value} sekund pro {degree} rám(y), takt {value / degree:.1f} s na rám")
+    else:
+        print("❌ Řešení nebylo nalezeno.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Optimální pohyby manipulátorů (CP-SAT).")
+    parser.add_argument('--cyclic', type=int, metavar='K', default=None,
+                        help="cyklický rozvrh s K rámy na periodu místo dávky num_materials rámů")
+    parser.add_argument('--rolling', type=int, metavar='N', default=None,
+                        help="rozvrh N rámů klouzavým horizontem")
+    parser.add_argument('--window', type=int, default=6, help="počet rámů v okně klouzavého horizontu")
+    parser.add_argument('--freeze', type=int, default=3, help="počet rámů zmrazených z každého okna")
+    parser.add_argument('--strengthen', action='store_true', help="zesílit model (pořadí rámů, těsné meze)")
+    parser.add_argument('--heuristic', action='store_true',
+                        help="jen rychlý heuristický rozvrh (list scheduling + lokální prohledávání)")
+    parser.add_argument('--mixed', metavar='RECEPTURY', default=None,
+                        help="smíšená dávka receptur MIXED_RECIPES, jeden znak na rám (např. ABAB)")
+    parser.add_argument('--rail', metavar='VZDÁLENOST', type=float, nargs='?', const=0.0, default=None,
+                        help="antikolize na společné kolejnici s bezpečnou vzdáleností (poloha = čas převozu)")
+    parser.add_argument('--compare', action='store_true',
+                        help="porovnat klouzavý horizont s monolitickým modelem na malých dávkách")
+    parser.add_argument('--time-limit', type=float, default=None,
+                        help="časový limit řešiče (s); vrátí nejlepší dosud nalezený rozvrh")
+    parser.add_argument('--workers', type=int, default=None, help="počet vláken řešiče")
+    parser.add_argument('--seed', type=int, default=None, help="semínko řešiče")
+    parser.add_argument('--deterministic', action='store_true',
+                        help="opakovatelné řešení (limit v deterministickém čase řešiče)")
+    parser.add_argument('--progress', action='store_true', help="vypisovat každé zlepšené řešení")
+    parser.add_argument('--plan', metavar='SOUBOR', default=None,
+                        help="uložit rozvrh jako plán pro přehrání v simulátoru (.npz nebo .csv)")
+    parser.add_argument('--cache', metavar='SOUBOR', nargs='?', const='', default=None,
+                        help="použít sdílenou cache rozvrhů (SQLite, výchozí soubor viz schedule_cache)")
+    args = parser.parse_args()
+    if args.compare:
+        print(compare_rolling(window=args.window, freeze=args.freeze).to_string(index=False))
+        return
+    if args.rolling:
+        schedule, makespan_value = rolling_horizon(args.rolling, args.window, args.freeze, num_baths,
+                                                   num_manipulators, move_time, bath_durations,
+                                                   strengthen=args.strengthen)
+        if schedule is None:
+            print("❌ Řešení nebylo nalezeno.")
+            return
+        print(solution_table(schedule, num_baths, move_time).to_string(index=False))
+        print(f"\n✅ Takt linky pro {args.rolling} rámů: {makespan_value} sekund")
+        if args.plan:
+            export_plan(schedule, args.plan, makespan=makespan_value, source='rolling')
+        return
+    if args.mixed:
+        main_mixed(list(args.mixed), args.time_limit, args.workers, args.progress)
+        return
+    if args.cyclic:
+        main_cyclic(args.cyclic)
+        return
+    if args.cache is not None:
+        from schedule_cache import DEFAULT_CACHE_PATH, ScheduleCache, cached_schedule
+
+        cache = ScheduleCache(args.cache or DEFAULT_CACHE_PATH)
+        config = SchedulerConfig(num_baths, num_materials, num_manipulators, move_time, bath_durations,
+                                 strengthen=args.strengthen)
+        entry = cached_schedule(config, cache, max_time=args.time_limit, num_workers=args.workers,
+                                seed=args.seed, deterministic=args.deterministic)
+        print(solution_table(entry.schedule, num_baths, move_time).to_string(index=False))
+        source = "z cache" if cache.hits['miss'] == 0 else "vyřešeno a uloženo"
+        print(f"\n✅ Takt linky: {entry.makespan} sekund ({entry.status}, {source})")
+        if args.plan:
+            export_plan(entry.schedule, args.plan, makespan=entry.makespan, status=entry.status)
+        return
+    if args.heuristic:
+        schedule, makespan_value = heuristic_schedule(num_materials, num_baths, num_manipulators, move_time,
+                                                      bath_durations)
+        print(solution_table(schedule, num_baths, move_time).to_string(index=False))
+        print(f"\n✅ Takt linky (heuristika): {makespan_value} sekund")
+        if args.plan:
+            export_plan(schedule, args.plan, makespan=makespan_value, source='heuristic')
+        return
+
+    rail = Rail.from_moves(move_time, num_baths, num_manipulators, args.rail) if args.rail is not None else None
+    model, task_vars, makespan = build_model(num_baths, num_materials, num_manipulators, move_time, bath_durations,
+                                             strengthen=args.strengthen, rail=rail)
+
+    # Solve, s heuristickým rozvrhem jako nápovědou; heuristika kolejnici
+    # nezná, s --rail by nápověda i náhradní rozvrh mohly vést ke srážkám
+    schedule, makespan_value = None, None
+    if rail is None:
+        schedule, makespan_value = heuristic_schedule(num_materials, num_baths, num_manipulators, move_time,
+                                                      bath_durations)
+        add_schedule_hints(model, task_vars, schedule)
+    status, solver, _ = solve_anytime(model, task_vars, print_incumbent if args.progress else None,
+                                      args.time_limit, args.workers, args.seed, args.deterministic)
+
+    # Výstup
+    if status in [cp_model.OPTIMAL, cp_model.FEASIBLE]:
+        df = schedule_table(solver, task_vars, num_baths)
+        print(df.to_string(index=False))
+        label = "Minimální takt linky" if status == cp_model.OPTIMAL else "Takt linky (limit vypršel)"
+        schedule, makespan_value = solution_schedule(solver, task_vars), solver.Value(makespan)
+        print(f"\n✅ {label}: {makespan_value} sekund")
+    elif rail is not None:
+        print("❌ Řešení bez srážek na kolejnici nebylo nalezeno, zkuste delší --time-limit.")
+        return
+    else:
+        print("❌ Řešení nebylo nalezeno, použije se heuristický rozvrh.")
+        print(solution_table(schedule, num_baths, move_time).to_string(index=False))
+        print(f"\n✅ Takt linky (heuristika): {makespan_value} sekund")
+    if args.plan:
+        export_plan(schedule, args.plan, makespan=makespan_value, status=solver.StatusName(status),
+                    safety_distance=rail.safety_distance if rail else None, homes=rail.homes if rail else None)
 
-    df = pd.DataFrame(result).sort_values(by=["Začátek (s)", "Materiál"])
-    print(df.to_string(index=False))
-    print(f"\n✅ Minimální takt linky: {solver.Value(makespan)} sekund")
-else:
-    print("❌ Řešení nebylo nalezeno.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+
+import optimalni_pohyby_manipulatoru as hoist
+
+# ----- Persistent Schedule Cache -----
+# Solved schedules are stored under a hash of the normalised line
+# configuration (bath durations and dwell windows, bath capacities, transfer
+# times, manipulator and material counts, manipulators out of service, rail
+# layout, model strengthening), so the same recipe and manipulator settings are optimised
+# only once. Lookups go through an in-memory LRU first and then an SQLite file
+# that the Streamlit app and batch jobs share; the file is trimmed to
+# `max_bytes` by evicting the least recently used schedules.
+#
+#   cache = ScheduleCache()
+#   entry = cached_schedule(SchedulerConfig(num_materials=6), cache, max_time=10)
+#   entry.schedule, entry.makespan, entry.status
+
+# The file can be moved for all processes at once through the environment
+DEFAULT_CACHE_PATH = os.environ.get('HOIST_SCHEDULE_CACHE', 'schedule_cache.sqlite')
+DEFAULT_MEMORY_SIZE = 256             # schedules kept in memory per process
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # size of the schedule payloads on disk
+
+@dataclass
+class CacheEntry:
+    """A solved schedule {(material, step): (start, manipulator)} with its objective and solver status."""
+    schedule: dict
+    makespan: int
+    status: str
+    solve_time: float = 0.0
+
+    @property
+    def optimal(self):
+        return self.status == 'OPTIMAL'
+
+def normalise_config(config):
+    """The SchedulerConfig fields a schedule depends on, in canonical form."""
+    return {
+        'num_baths': config.num_baths,
+        'num_materials': config.num_materials,
+        'num_manipulators': config.num_manipulators,
+        'transfer_times': hoist.transfer_times(config.move_time, config.num_baths),
+        'bath_durations': [config.durations()[b] for b in range(1, config.num_baths + 1)],
+        'out_of_service': sorted(config.out_of_service),
+        'strengthen': sorted(config.strengthen) if isinstance(config.strengthen, (list, tuple)) else bool(config.strengthen),
+        'dwell_windows': (None if config.dwell_windows is None else
+                          [list(config.dwell_windows.get(b, ())) for b in range(1, config.num_baths + 1)]),
+        'bath_capacity': [config.bath_capacity.get(b, 1) for b in range(1, config.num_baths + 1)],
+        'dwell_penalty': config.dwell_penalty if config.dwell_windows is not None else None,
+        'rail': asdict(config.rail) if config.rail is not None else None,
+    }
+
+def config_key(config):
+    """Content address of a configuration."""
+    text = json.dumps(normalise_config(config), sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def _encode(schedule):
+    return json.dumps([[m, s, start, manip] for (m, s), (start, manip) in sorted(schedule.items())])
+
+def _decode(payload):
+    return {(m, s): (start, manip) for m, s, start, manip in json.loads(payload)}
+
+class ScheduleCache:
+    """
+    Two-tier schedule cache: an LRU of `memory_size` entries in front of an
+    SQLite file at `path` (None keeps everything in memory). Safe to use from
+    several threads; several processes share the file through SQLite locking.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, memory_size=DEFAULT_MEMORY_SIZE, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.memory_size = memory_size
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.hits = {'memory': 0, 'disk': 0, 'miss': 0}
+        self.lock = threading.Lock()
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS schedules ('
+                            'key TEXT PRIMARY KEY, makespan INTEGER, status TEXT, solve_time REAL, '
+                            'payload TEXT, size INTEGER, accessed REAL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS schedules_accessed ON schedules (accessed)')
+            self.db.commit()
+
+    def _remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """The entry stored under `key`, or None."""
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                self.memory.move_to_end(key)
+                self.hits['memory'] += 1
+                return entry
+            if self.db is None:
+                self.hits['miss'] += 1
+                return None
+            row = self.db.execute('SELECT makespan, status, solve_time, payload FROM schedules WHERE key = ?',
+                                  (key,)).fetchone()
+            if row is None:
+                self.hits['miss'] += 1
+                return None
+            self.db.execute('UPDATE schedules SET accessed = ? WHERE key = ?', (time.time(), key))
+            self.db.commit()
+            makespan, status, solve_time, payload = row
+            entry = CacheEntry(_decode(payload), makespan, status, solve_time)
+            self._remember(key, entry)
+            self.hits['disk'] += 1
+            return entry
+
+    def put(self, key, entry):
+        with self.lock:
+            self._remember(key, entry)
+            if self.db is None:
+                return
+            payload = _encode(entry.schedule)
+            self.db.execute('INSERT OR REPLACE INTO schedules VALUES (?, ?, ?, ?, ?, ?, ?)',
+                            (key, entry.makespan, entry.status, entry.solve_time, payload, len(payload),
+                             time.time()))
+            self._evict()
+            self.db.commit()
+
+    def _evict(self):
+        """Drop least recently used schedules from the file until it fits max_bytes."""
+        total = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM schedules').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self.db.execute('SELECT key, size FROM schedules ORDER BY accessed').fetchall()
+        evicted = []
+        for key, size in rows[:-1]:  # the newest schedule always stays
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.db.executemany('DELETE FROM schedules WHERE key = ?', evicted)
+
+    def disk_usage(self):
+        """(schedules, payload bytes) in the file."""
+        if self.db is None:
+            return 0, 0
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM schedules').fetchone()
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute('DELETE FROM schedules')
+                self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+def cached_schedule(config, cache=None, require_optimal=False, **solver_options):
+    """
+    Schedule of `config` from the cache, solved with LineScheduler (and
+    stored) on a miss. Feasible but unproven schedules are reused unless
+    `require_optimal`; heuristic fallbacks are returned but not stored. With
+    a rail there is no fallback (the heuristic ignores it), so a miss that
+    CP-SAT does not solve in time returns None.
+    solver_options go to LineScheduler (max_time, num_workers, seed, ...).
+    """
+    cache = cache if cache is not None else default_cache()
+    key = config_key(config)
+    entry = cache.get(key)
+    if entry is not None and (entry.optimal or not require_optimal):
+        return entry
+    scheduler = hoist.LineScheduler(config, **solver_options)
+    scheduler.solve()
+    if scheduler.feasible:
+        entry = CacheEntry(scheduler.solution, scheduler.makespan, scheduler.solver.StatusName(scheduler.status),
+                           scheduler.solve_time)
+        cache.put(key, entry)
+        return entry
+    if scheduler.solution is None:
+        return None
+    return CacheEntry(scheduler.solution, scheduler.makespan, 'HEURISTIC', scheduler.solve_time)
+
+_default_cache = None
+
+def default_cache():
+    """Process-wide cache on DEFAULT_CACHE_PATH."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ScheduleCache()
+    return _default_cache
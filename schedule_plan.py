@@ -0,0 +1,106 @@
+import json
+from dataclasses import dataclass, field
+
+import numpy as np
+
+# ----- Schedule Interchange Format -----
+# A plan is the optimizer's schedule as columns, one row per transfer:
+#
+#   material     rack index (from 0, = rack id in the simulator)
+#   step         transfer index: step k carries the rack from station k to
+#                k + 1 (0 = entry, num_baths + 1 = exit)
+#   manipulator  manipulator id (from 1, = Manipulator.id in the simulator)
+#   start, end   planned start and end of the transfer [s]
+#
+# plus metadata (num_baths, bath durations, makespan, solver status, ...).
+# Plans are stored as compressed .npz (columns + JSON metadata) or as .csv
+# with the metadata in a leading comment line.
+
+PLAN_COLUMNS = ('material', 'step', 'manipulator', 'start', 'end')
+_DTYPES = {'material': np.int32, 'step': np.int32, 'manipulator': np.int32, 'start': np.float64, 'end': np.float64}
+
+@dataclass
+class Plan:
+    material: np.ndarray
+    step: np.ndarray
+    manipulator: np.ndarray
+    start: np.ndarray
+    end: np.ndarray
+    num_baths: int
+    meta: dict = field(default_factory=dict)
+
+    def __post_init__(self):
+        for name in PLAN_COLUMNS:
+            setattr(self, name, np.asarray(getattr(self, name), dtype=_DTYPES[name]))
+
+    def __len__(self):
+        return len(self.material)
+
+    @classmethod
+    def from_schedule(cls, schedule, num_baths, move_time, **meta):
+        """
+        Plan of an optimizer schedule {(material, step): (start, manipulator
+        from 0)}; move_time is one transfer time or a list per step.
+        """
+        moves = [move_time] * (num_baths + 1) if isinstance(move_time, (int, float)) else list(move_time)
+        rows = sorted((start, material, step, manip) for (material, step), (start, manip) in schedule.items())
+        return cls(material=[r[1] for r in rows], step=[r[2] for r in rows], manipulator=[r[3] + 1 for r in rows],
+                   start=[r[0] for r in rows], end=[r[0] + moves[r[2]] for r in rows],
+                   num_baths=num_baths, meta=meta)
+
+    def to_schedule(self):
+        """The optimizer's {(material, step): (start, manipulator from 0)}."""
+        return {(int(m), int(s)): (float(t), int(h) - 1)
+                for m, s, h, t in zip(self.material, self.step, self.manipulator, self.start)}
+
+    @property
+    def makespan(self):
+        return float(self.end.max()) if len(self) else 0.0
+
+    @property
+    def materials(self):
+        return np.unique(self.material)
+
+    def transfer_times(self):
+        """Planned duration of each step (the first transfer of the step)."""
+        times = [0.0] * (self.num_baths + 1)
+        for step in range(self.num_baths + 1):
+            rows = np.flatnonzero(self.step == step)
+            if len(rows):
+                times[step] = float(self.end[rows[0]] - self.start[rows[0]])
+        return times
+
+    def columns(self):
+        return {name: getattr(self, name) for name in PLAN_COLUMNS}
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.columns())
+
+    def save(self, path):
+        """Write as .npz or, for any other extension, as CSV."""
+        meta = json.dumps({'num_baths': self.num_baths, **self.meta}, default=str)
+        if path.endswith('.npz'):
+            np.savez_compressed(path, meta=np.array(meta), **self.columns())
+            return
+        with open(path, 'w') as f:
+            f.write(f'# {meta}\n')
+            f.write(','.join(PLAN_COLUMNS) + '\n')
+            # Shortest repr that reads back to the same float (':g' keeps only 6 digits)
+            for row in zip(*self.columns().values()):
+                f.write(','.join(repr(float(v)) if isinstance(v, float) else str(v) for v in row) + '\n')
+
+    @classmethod
+    def load(cls, path):
+        if path.endswith('.npz'):
+            with np.load(path) as data:
+                meta = json.loads(str(data['meta']))
+                columns = {name: data[name] for name in PLAN_COLUMNS}
+        else:
+            with open(path) as f:
+                meta = json.loads(f.readline().lstrip('# '))
+            values = np.loadtxt(path, delimiter=',', skiprows=2, ndmin=2)
+            columns = {name: values[:, i] for i, name in enumerate(PLAN_COLUMNS)}
+        num_baths = meta.pop('num_baths')
+        return cls(**columns, num_baths=num_baths, meta=meta)
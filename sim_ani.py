@@ -1,15 +1,25 @@
+import bisect
+import csv
+import random
+import time
+from collections import deque
+
 import simpy
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
 import numpy as np
+from dataclasses import dataclass, field, replace
+
+from kinematics import DEFAULT_EXIT_DISTANCE, DEFAULT_TRAVEL_SPEED, line_move_times
 
 # ----- Simulation Parameters -----
+# Module-level values are the defaults of SimConfig; pass a SimConfig (or a
+# dict of overrides) to simulate() to change them for a single run.
 TRAVEL_TIME_PER_UNIT = 1    # time per distance unit
 DROP_TIME = 2               # time to drop a rack
 BATH5_DWELL_TIME = 10         # change this for Bath5
 BATH10_DWELL_TIME = 8        # change this for Bath10
 BATH15_DWELL_TIME = 4       # change this for Bath15
 DRIP_TIME = 3              # time to wait for dripping after picking up
+MOVE_RAMP_FRACTION = 0      # share of a move spent accelerating (and decelerating), 0 = constant speed
 
 # Positions (units)
 ENTRY = 0
@@ -24,382 +34,1844 @@ HOME_M2 = 3
 HOME_M3 = 7
 
 NUM_RACKS = 6
-finished_racks = []
-
-# ----- Global State for Animation -----
-# For each rack, store its current position (if in transit, we may record None)
-rack_positions = {}
-# For each manipulator, store its current position.
-manip_positions = {}
-# Store which rack is being carried by which manipulator
-carried_racks = {}
-# Store dwell times for each rack in each bath
-dwell_times = {
-    'bath5': {},  # {rack_id: start_time}
-    'bath10': {},
-    'bath15': {}
-}
-# Track which baths are currently occupied
-bath_occupied = {
-    'bath5': False,
-    'bath10': False,
-    'bath15': False
-}
-
-# Stack height at EXIT (y-coordinate for each rack)
-stack_height = {}
-
-# Add after global variables
+
 SAFETY_DISTANCE = 0  # Minimum distance between manipulators
 
-# Add this after the global variables
-simulation_running = True
-
-# Initialize positions.
-for i in range(NUM_RACKS):
-    rack_positions[i] = ENTRY
-manip_positions[1] = HOME_M1
-manip_positions[2] = HOME_M2
-manip_positions[3] = HOME_M3
-carried_racks = {}
-
-# List to store snapshots of the state.
-snapshots = []
-
-def record_state(env):
-    """Record a snapshot of the current simulation state every 0.1 time units."""
-    while len(finished_racks) < NUM_RACKS:
-        snapshot = {
-            'time': env.now,
-            'rack_positions': rack_positions.copy(),
-            'manip_positions': manip_positions.copy(),
-            'carried_racks': carried_racks.copy(),
-            'dwell_times': {
-                'bath5': dwell_times['bath5'].copy(),
-                'bath10': dwell_times['bath10'].copy(),
-                'bath15': dwell_times['bath15'].copy()
-            }
+# Minimum time a rack must have dwelled before the next manipulator sets off to fetch it
+PICKUP_LEAD_TIME = 3
+
+# Time the line keeps running after the last rack is stacked, for final movements
+RUN_OUT_TIME = 10
+
+@dataclass
+class SimConfig:
+    """Parameters of one run of the default 3-bath line."""
+    travel_time_per_unit: float = TRAVEL_TIME_PER_UNIT
+    drop_time: float = DROP_TIME
+    bath5_dwell_time: float = BATH5_DWELL_TIME
+    bath10_dwell_time: float = BATH10_DWELL_TIME
+    bath15_dwell_time: float = BATH15_DWELL_TIME
+    drip_time: float = DRIP_TIME
+    move_ramp_fraction: float = MOVE_RAMP_FRACTION
+    entry: float = ENTRY
+    bath5: float = BATH5
+    bath10: float = BATH10
+    bath15: float = BATH15
+    exit: float = EXIT
+    home_m1: float = HOME_M1
+    home_m2: float = HOME_M2
+    home_m3: float = HOME_M3
+    num_racks: int = NUM_RACKS
+    safety_distance: float = SAFETY_DISTANCE
+    pickup_lead_time: float = PICKUP_LEAD_TIME
+
+    @classmethod
+    def from_value(cls, config):
+        """Accept a SimConfig, a dict of overrides or None (all defaults)."""
+        if config is None:
+            return cls()
+        if isinstance(config, cls):
+            return config
+        return replace(cls(), **config)
+
+    def to_line(self):
+        """The equivalent LineConfig: M1 feeds Bath5, M2 Bath10, M3 Bath15 and the exit."""
+        return LineConfig(
+            stations=[
+                Station('entry', self.entry, label='ENTRY'),
+                Station('bath5', self.bath5, self.bath5_dwell_time, self.drip_time, label='Bath5'),
+                Station('bath10', self.bath10, self.bath10_dwell_time, self.drip_time, label='Bath10'),
+                Station('bath15', self.bath15, self.bath15_dwell_time, self.drip_time, label='Bath15'),
+                Station('exit', self.exit, label='EXIT'),
+            ],
+            manipulators=[
+                Manipulator(1, self.home_m1, (0, 1)),
+                Manipulator(2, self.home_m2, (1, 2)),
+                Manipulator(3, self.home_m3, (2, 4)),
+            ],
+            num_racks=self.num_racks,
+            travel_time_per_unit=self.travel_time_per_unit,
+            drop_time=self.drop_time,
+            move_ramp_fraction=self.move_ramp_fraction,
+            safety_distance=self.safety_distance,
+            pickup_lead_time=self.pickup_lead_time,
+        )
+
+# ----- Data-Driven Line Model -----
+
+@dataclass
+class Station:
+    """A position on the rail: the entry, a bath or the exit."""
+    name: str
+    position: float
+    dwell_time: float = 0
+    drip_time: float = 0
+    capacity: int = 1       # 2 for a double-position bath
+    label: str = None       # name used in trace lines and on the animation
+
+    def __post_init__(self):
+        if self.label is None:
+            self.label = self.name
+
+@dataclass
+class Manipulator:
+    """A hoist parked at `home` that carries racks from station zone[0] to zone[1]."""
+    id: int
+    home: float
+    zone: tuple
+
+@dataclass
+class LineConfig:
+    """
+    Stations in process order (first = entry, last = exit) and manipulators
+    whose zones cover consecutive station ranges; zone[1] of one manipulator
+    is zone[0] of the next.
+    """
+    stations: list
+    manipulators: list
+    num_racks: int = NUM_RACKS
+    travel_time_per_unit: float = TRAVEL_TIME_PER_UNIT
+    drop_time: float = DROP_TIME
+    pick_time: float = 0
+    move_ramp_fraction: float = MOVE_RAMP_FRACTION
+    safety_distance: float = SAFETY_DISTANCE
+    pickup_lead_time: float = PICKUP_LEAD_TIME
+    kinematics: object = None   # kinematics.Kinematics; replaces travel_time_per_unit and move_ramp_fraction
+
+    def validate(self):
+        if len(self.stations) < 2:
+            raise ValueError("A line needs at least an entry and an exit station")
+        boundary = 0
+        for manip in self.manipulators:
+            first, last = manip.zone
+            if first != boundary or last <= first:
+                raise ValueError(f"Zone of M{manip.id} must start at station {boundary} and move forward")
+            boundary = last
+        if boundary != len(self.stations) - 1:
+            raise ValueError("Manipulator zones must reach the exit station")
+        for left, right in zip(self.manipulators, self.manipulators[1:]):
+            if right.home - left.home < self.safety_distance or right.home < left.home:
+                raise ValueError(f"Homes of M{left.id} and M{right.id} must be in zone order and "
+                                 f"at least safety_distance ({self.safety_distance}) apart")
+
+    @classmethod
+    def from_app(cls, operations_data, manipulator_data, num_racks=NUM_RACKS,
+                 travel_speed=DEFAULT_TRAVEL_SPEED, exit_distance=DEFAULT_EXIT_DISTANCE, zones=None,
+                 safety_distance=SAFETY_DISTANCE):
+        """
+        Build a line from the configurator's `operations_data` and
+        `manipulator_data` (app.py). Every operation sits `crossing_distance`
+        mm after the previous one; only operations used in the technology
+        become stations. Dwell is `time_opt`, double-position baths hold two
+        racks. Lowering, lifting and traverse times come from the cached
+        kinematics (kinematics.line_move_times). Without explicit `zones`
+        (station index pairs), transfers are split between the manipulators
+        into contiguous zones of similar workload. Homes are placed by
+        place_homes, clear of the handoffs by `safety_distance`.
+        """
+        stations = [Station('entry', 0, label='ENTRY')]
+        pos = 0
+        for op in sorted(operations_data, key=lambda op: op['operation_index']):
+            pos += op['crossing_distance']
+            if op['used_in_tech']:
+                stations.append(Station(f"op{op['operation_index']}", pos, op['time_opt'], op['drip_time'],
+                                        capacity=2 if op['double_position'] else 1,
+                                        label=f"Operace {op['operation_index']}"))
+        stations.append(Station('exit', pos + exit_distance, label='EXIT'))
+
+        move_times = line_move_times(operations_data, manipulator_data, travel_speed, exit_distance)
+        kinematics = move_times.kinematics
+        drop_time = kinematics.lower_time()
+        pick_time = kinematics.lift_time()
+
+        if zones is None:
+            # Work per transfer: travel, lowering/lifting and, for baths the
+            # manipulator waits above, dwell and drip
+            travel = np.diagonal(move_times.travel, offset=1)
+            work = [t + drop_time + pick_time + b.dwell_time + b.drip_time
+                    for t, b in zip(travel, stations[1:])]
+            zones = balanced_zones(work, manipulator_data['num_manipulators'])
+        manipulators = [Manipulator(m, home, zone)
+                        for m, (home, zone) in enumerate(zip(place_homes(stations, zones, safety_distance), zones),
+                                                         start=1)]
+
+        return cls(stations, manipulators, num_racks=num_racks, travel_time_per_unit=1 / travel_speed,
+                   drop_time=drop_time, pick_time=pick_time, safety_distance=safety_distance,
+                   kinematics=kinematics)
+
+def place_homes(stations, zones, safety_distance=0):
+    """
+    Home of every zone: the entry for the first one, otherwise between the
+    pickup station and the next one, moved downstream to keep
+    `safety_distance` from the upstream handoff and, where the zone is long
+    enough, from the next manipulator's pickup. Homes stay `safety_distance`
+    apart; on zones too short for both the simulator pushes idle manipulators
+    aside.
+    """
+    homes = []
+    for first, last in zones:
+        if first == 0:
+            home = stations[0].position
+        else:
+            pickup = stations[first].position
+            home = max((pickup + stations[first + 1].position) / 2, pickup + safety_distance)
+            if last < len(stations) - 1:
+                home = min(home, max(stations[last].position - safety_distance, pickup + safety_distance / 2))
+        homes.append(max(home, homes[-1] + safety_distance) if homes else home)
+    return homes
+
+def balanced_zones(work, num_manipulators):
+    """Split consecutive transfers into at most num_manipulators zones of similar total work."""
+    num_zones = max(1, min(num_manipulators, len(work)))
+    target = sum(work) / num_zones
+    zones, first, acc = [], 0, 0.0
+    for k, w in enumerate(work):
+        acc += w
+        remaining_transfers = len(work) - (k + 1)
+        remaining_zones = num_zones - len(zones) - 1
+        if remaining_zones and (acc >= target or remaining_transfers == remaining_zones):
+            zones.append((first, k + 1))
+            first, acc = k + 1, 0.0
+    zones.append((first, len(work)))
+    return zones
+
+def as_line_config(config):
+    """Accept a LineConfig, or anything SimConfig.from_value takes."""
+    if isinstance(config, LineConfig):
+        return config
+    return SimConfig.from_value(config).to_line()
+
+# ----- Manipulator Motion -----
+
+class MotionSegment:
+    """
+    One timed move of a manipulator along the rail. Positions are not stepped
+    through the simulation; they are interpolated on demand from the segment.
+    `ramp` is the fraction of the move spent accelerating (and, symmetrically,
+    decelerating) on a trapezoidal velocity profile; 0 means constant speed.
+    """
+    __slots__ = ('start_pos', 'end_pos', 'start_time', 'end_time', 'ramp')
+
+    def __init__(self, start_pos, end_pos, start_time, end_time, ramp=0.0):
+        self.start_pos = start_pos
+        self.end_pos = end_pos
+        self.start_time = start_time
+        self.end_time = end_time
+        self.ramp = min(max(ramp, 0.0), 0.5)
+
+    def progress_at(self, t):
+        """Fraction of the distance covered at time t (0..1)."""
+        duration = self.end_time - self.start_time
+        if duration <= 0 or t >= self.end_time:
+            return 1.0
+        if t <= self.start_time:
+            return 0.0
+        u = (t - self.start_time) / duration
+        r = self.ramp
+        if r == 0:
+            return u
+        v_max = 1 / (1 - r)
+        if u < r:
+            return v_max * u * u / (2 * r)
+        if u <= 1 - r:
+            return v_max * (u - r / 2)
+        return 1 - v_max * (1 - u) ** 2 / (2 * r)
+
+    def position_at(self, t):
+        return self.start_pos + (self.end_pos - self.start_pos) * self.progress_at(t)
+
+    def time_at(self, pos):
+        """Time at which the segment passes `pos` (clamped to the segment)."""
+        span = self.end_pos - self.start_pos
+        if span == 0:
+            return self.start_time
+        s = min(max((pos - self.start_pos) / span, 0.0), 1.0)
+        r = self.ramp
+        if r == 0:
+            u = s
+        else:
+            v_max = 1 / (1 - r)
+            if s < v_max * r / 2:
+                u = (2 * r * s / v_max) ** 0.5
+            elif s <= 1 - v_max * r / 2:
+                u = s / v_max + r / 2
+            else:
+                u = 1 - (2 * r * (1 - s) / v_max) ** 0.5
+        return self.start_time + u * (self.end_time - self.start_time)
+
+    def is_moving(self, t):
+        return self.start_time <= t < self.end_time
+
+# ----- Rail Reservations -----
+
+class TrackReservations:
+    """
+    Interval reservations on the shared rail. Every manipulator always holds
+    one interval: its parking position, or while it moves, the whole stretch
+    it sweeps. Granted intervals are kept at least `safety_distance` apart, so
+    they are disjoint and stay sorted along the rail, and the intervals that
+    conflict with a requested move are found by binary search.
+
+    A manipulator that is blocked sleeps on an event that fires only when one
+    of its blockers changes its reservation (starts moving or parks).
+    """
+
+    def __init__(self, env, safety_distance=0):
+        self.env = env
+        self.safety_distance = safety_distance
+        self.reserved = {}   # manipulator -> (lo, hi, segment)
+        self._starts = []    # sorted (lo, manipulator)
+        self._waiters = {}   # blocker -> events of manipulators waiting on it
+
+    def _remove(self, manip_id):
+        lo, _, _ = self.reserved.pop(manip_id)
+        del self._starts[bisect.bisect_left(self._starts, (lo, manip_id))]
+
+    def _insert(self, manip_id, lo, hi, segment):
+        self.reserved[manip_id] = (lo, hi, segment)
+        bisect.insort(self._starts, (lo, manip_id))
+
+    def occupied(self, manip_id, t):
+        """The part of a reservation still in use at t: a moving manipulator no longer needs the stretch behind it."""
+        lo, hi, segment = self.reserved[manip_id]
+        if segment.is_moving(t):
+            pos = segment.position_at(t)
+            return min(pos, segment.end_pos), max(pos, segment.end_pos)
+        return lo, hi
+
+    def _conflict(self, lo, hi, a, b):
+        if self.safety_distance > 0:
+            return lo - b < self.safety_distance and a - hi < self.safety_distance
+        return lo <= b and a <= hi
+
+    def blockers(self, manip_id, lo, hi):
+        """Manipulators whose occupied stretch is too close to [lo, hi] now."""
+        t = self.env.now
+        reach = self.safety_distance
+        k = bisect.bisect_right(self._starts, (hi + reach, float('inf')))
+        result = []
+        while k > 0:
+            k -= 1
+            _, other = self._starts[k]
+            if self.reserved[other][1] < lo - reach:
+                break  # intervals are disjoint, so everything further left ends earlier
+            if other != manip_id and self._conflict(lo, hi, *self.occupied(other, t)):
+                result.append(other)
+        return result
+
+    def clear_time(self, blocker_id, lo, hi):
+        """
+        Time at which a moving blocker reaches the edge of [lo, hi] (plus
+        safety distance) on its way out for good, or None if it is standing
+        still or will stop inside it. A blocker already at the edge is clear.
+        """
+        _, _, segment = self.reserved[blocker_id]
+        lo -= self.safety_distance
+        hi += self.safety_distance
+        if not segment.is_moving(self.env.now) or lo <= segment.end_pos <= hi:
+            return None
+        return segment.time_at(hi if segment.end_pos > hi else lo)
+
+    def wait(self, blockers):
+        """Event that fires when any of the blockers changes its reservation."""
+        event = self.env.event()
+        for blocker_id in blockers:
+            self._waiters.setdefault(blocker_id, []).append(event)
+        return event
+
+    def _wake(self, manip_id):
+        for event in self._waiters.pop(manip_id, ()):
+            if not event.triggered:
+                event.succeed()
+
+    def reserve(self, manip_id, segment):
+        """Hold the stretch swept by `segment` (and the current position)."""
+        t = self.env.now
+        lo, hi = sorted((segment.start_pos, segment.end_pos))
+        if manip_id in self.reserved:
+            self._remove(manip_id)
+        # Neighbours that were granted clearance while driving away give up
+        # the stretch behind them, keeping the reservations disjoint
+        for other in list(self.reserved):
+            a, b, other_segment = self.reserved[other]
+            if other_segment.is_moving(t) and self._conflict(lo, hi, a, b):
+                trimmed = self.occupied(other, t)
+                self._remove(other)
+                self._insert(other, *trimmed, other_segment)
+        self._insert(manip_id, lo, hi, segment)
+        self._wake(manip_id)
+
+    def park(self, manip_id, segment):
+        """Shrink a reservation to the segment's end position."""
+        if manip_id in self.reserved:
+            self._remove(manip_id)
+        self._insert(manip_id, segment.end_pos, segment.end_pos, segment)
+        self._wake(manip_id)
+
+# ----- Change-Driven State Recorder -----
+
+class StateRecorder:
+    """
+    Log of state transitions (move segments, picks, drops, dwell start/end)
+    kept in preallocated NumPy columns that double in size when full. Nothing
+    is sampled on a clock: a snapshot for any time is rebuilt on demand by
+    binary search over each rack's and manipulator's own events.
+    """
+    MOVE, PICK, DROP, DWELL_START, DWELL_END = range(5)
+
+    def __init__(self, station_names, capacity=256):
+        self.station_names = list(station_names)
+        self.size = 0
+        self.end_time = None
+        self._index = None
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        old = getattr(self, 'columns', None)
+        self.columns = {
+            'time': np.empty(capacity, dtype=np.float64),
+            'kind': np.empty(capacity, dtype=np.int8),
+            'subject': np.empty(capacity, dtype=np.int32),  # manipulator for MOVE, rack otherwise
+            'ref': np.empty(capacity, dtype=np.int32),      # manipulator for PICK, station index for DWELL_*
+            'pos0': np.empty(capacity, dtype=np.float64),   # drop position / segment start
+            'pos1': np.empty(capacity, dtype=np.float64),   # segment end position
+            'time1': np.empty(capacity, dtype=np.float64),  # segment end time
+            'ramp': np.empty(capacity, dtype=np.float32),
         }
-        snapshots.append(snapshot)
-        yield env.timeout(0.1)  # More frequent snapshots
-    # Add final snapshot
-    snapshot = {
-        'time': env.now,
-        'rack_positions': rack_positions.copy(),
-        'manip_positions': manip_positions.copy(),
-        'carried_racks': carried_racks.copy(),
-        'dwell_times': {
-            'bath5': dwell_times['bath5'].copy(),
-            'bath10': dwell_times['bath10'].copy(),
-            'bath15': dwell_times['bath15'].copy()
+        if old is not None:
+            for name, column in old.items():
+                self.columns[name][:self.size] = column[:self.size]
+
+    def _append(self, kind, time, subject, ref=-1, pos0=np.nan, pos1=np.nan, time1=np.nan, ramp=0.0):
+        if self.size == len(self.columns['time']):
+            self._allocate(2 * self.size)
+        i = self.size
+        c = self.columns
+        c['time'][i] = time
+        c['kind'][i] = kind
+        c['subject'][i] = subject
+        c['ref'][i] = ref
+        c['pos0'][i] = pos0
+        c['pos1'][i] = pos1
+        c['time1'][i] = time1
+        c['ramp'][i] = ramp
+        self.size += 1
+        self._index = None
+
+    def move(self, manip_id, segment):
+        self._append(self.MOVE, segment.start_time, manip_id, pos0=segment.start_pos,
+                     pos1=segment.end_pos, time1=segment.end_time, ramp=segment.ramp)
+
+    def pick(self, time, rack, manip_id):
+        self._append(self.PICK, time, rack, ref=manip_id)
+
+    def drop(self, time, rack, pos):
+        self._append(self.DROP, time, rack, pos0=pos)
+
+    def dwell_start(self, time, rack, station_index):
+        self._append(self.DWELL_START, time, rack, ref=station_index)
+
+    def dwell_end(self, time, rack, station_index):
+        self._append(self.DWELL_END, time, rack, ref=station_index)
+
+    def nbytes(self):
+        return sum(column.nbytes for column in self.columns.values())
+
+    def _build_index(self):
+        """Group event rows per (stream, entity); rows stay in time order."""
+        c = {name: column[:self.size] for name, column in self.columns.items()}
+        streams = {
+            'move': c['kind'] == self.MOVE,
+            'location': (c['kind'] == self.PICK) | (c['kind'] == self.DROP),
+            'dwell': (c['kind'] == self.DWELL_START) | (c['kind'] == self.DWELL_END),
         }
-    }
-    snapshots.append(snapshot)
-
-def is_path_clear(start_pos, end_pos, current_manip_id):
-    """Check if the path is clear of other manipulators with safety distance."""
-    for m_id, pos in manip_positions.items():
-        if m_id != current_manip_id:  # Don't check against self
-            # Check if any point along the path would be too close to another manipulator
-            if start_pos <= pos <= end_pos or end_pos <= pos <= start_pos:
-                return False
-            # Check safety distance
-            if abs(pos - start_pos) < SAFETY_DISTANCE or abs(pos - end_pos) < SAFETY_DISTANCE:
-                return False
-    return True
-
-def move_manipulator(env, manip_id, start_pos, end_pos, rack=None):
-    """Helper function to move manipulator (and rack if carried) smoothly"""
-    # Wait until path is clear
-    while not is_path_clear(start_pos, end_pos, manip_id):
-        yield env.timeout(0.1)
-    
-    distance = abs(end_pos - start_pos)
-    steps = distance * 10  # 10 steps per unit distance
-    if steps == 0:
-        return
-        
-    step_size = (end_pos - start_pos) / steps
-    current_pos = start_pos
-    
-    for _ in range(int(steps)):
-        current_pos += step_size
-        manip_positions[manip_id] = current_pos
-        if rack is not None:
-            rack_positions[rack] = current_pos
-        yield env.timeout(0.1)
+        index = {}
+        for stream, mask in streams.items():
+            rows = np.flatnonzero(mask)
+            subjects = c['subject'][rows]
+            # Stable sort keeps the recording order within each entity
+            order = np.argsort(subjects, kind='stable')
+            rows, subjects = rows[order], subjects[order]
+            entities, starts = np.unique(subjects, return_index=True)
+            bounds = np.append(starts, len(rows))
+            index[stream] = {
+                int(entity): (rows[bounds[k]:bounds[k + 1]], c['time'][rows[bounds[k]:bounds[k + 1]]])
+                for k, entity in enumerate(entities)
+            }
+        self._index = index
+
+    def _last_row(self, stream, entity, t):
+        """Row of the entity's last event at or before t, or None."""
+        rows, times = self._index[stream].get(entity, (None, None))
+        if rows is None:
+            return None
+        k = np.searchsorted(times, t, side='right')
+        return rows[k - 1] if k else None
 
-# ----- Helper Functions for Bath Operations -----
+    def manipulator_ids(self):
+        if self._index is None:
+            self._build_index()
+        return sorted(self._index['move'])
 
-def dwell_and_store(env, rack, bath_name, store, dwell_time):
-    """Helper process to handle dwelling and store transfer."""
-    yield env.timeout(dwell_time)
-    print(f"Time {env.now}: Rack {rack} finished dwelling in {bath_name}")
-    # Keep bath occupied until manipulator picks up the rack
-    yield store.put(rack)
+    def rack_ids(self):
+        if self._index is None:
+            self._build_index()
+        return sorted(self._index['location'])
 
-def dwell_and_wait(env, rack, bath_name, dwell_time):
-    """Helper process to handle dwelling for Bath15."""
-    yield env.timeout(dwell_time)
-    print(f"Time {env.now}: Rack {rack} finished dwelling in {bath_name}")
-    # End bath15 dwell timer
-    dwell_times[bath_name].pop(rack, None)
+    def segment_at(self, manip_id, t):
+        """The motion segment a manipulator was on (or last finished) at t."""
+        if self._index is None:
+            self._build_index()
+        row = self._last_row('move', manip_id, t)
+        if row is None:
+            return None
+        c = self.columns
+        return MotionSegment(c['pos0'][row], c['pos1'][row], c['time'][row], c['time1'][row],
+                             float(c['ramp'][row]))
 
-# ----- Processes for Manipulators using Resources for Bath Occupancy -----
+    def snapshot(self, t):
+        """Rebuild the state at time t in the format create_animation uses."""
+        if self._index is None:
+            self._build_index()
+        c = self.columns
+        manip_positions = {}
+        for manip_id in self._index['move']:
+            manip_positions[manip_id] = self.segment_at(manip_id, t).position_at(t)
+
+        rack_positions = {}
+        carried = {}
+        for rack in self._index['location']:
+            row = self._last_row('location', rack, t)
+            if row is None:
+                continue
+            if c['kind'][row] == self.PICK:
+                manip_id = int(c['ref'][row])
+                carried[manip_id] = rack
+                rack_positions[rack] = manip_positions.get(manip_id)
+            else:
+                rack_positions[rack] = float(c['pos0'][row])
 
-def manipulator1(env, entry_store, bath5_store, bath5_resource):
+        dwell = {name: {} for name in self.station_names}
+        for rack in self._index['dwell']:
+            row = self._last_row('dwell', rack, t)
+            if row is not None and c['kind'][row] == self.DWELL_START:
+                dwell[self.station_names[c['ref'][row]]][rack] = float(c['time'][row])
+
+        return {
+            'time': t,
+            'rack_positions': rack_positions,
+            'manip_positions': manip_positions,
+            'carried_racks': carried,
+            'dwell_times': dwell
+        }
+
+class NullRecorder:
     """
-    M1: Picks up a rack from the entry and moves it to Bath5.
+    Recorder that keeps nothing, for streaming runs whose length is not
+    bounded. Results of such runs carry KPIs only and cannot be rendered.
     """
-    while simulation_running:
+    def __init__(self):
+        self.end_time = None
+
+    def move(self, manip_id, segment):
+        pass
+
+    def pick(self, time, rack, manip_id):
+        pass
+
+    def drop(self, time, rack, pos):
+        pass
+
+    def dwell_start(self, time, rack, station_index):
+        pass
+
+    def dwell_end(self, time, rack, station_index):
+        pass
+
+    def nbytes(self):
+        return 0
+
+# ----- Arrival Processes -----
+# Arrival schedules are iterables of non-decreasing release times at the
+# entry. They are consumed lazily, one rack at a time, so they may be
+# generators of any length (or endless, with a horizon on stream()).
+
+def periodic_arrivals(interval, count=None, start=0.0):
+    """Release a rack every `interval` time units; endless if count is None."""
+    k = 0
+    while count is None or k < count:
+        yield start + k * interval
+        k += 1
+
+def poisson_arrivals(rate, count=None, start=0.0, seed=0):
+    """Release racks as a Poisson process with `rate` racks per time unit."""
+    rng = random.Random(seed)
+    t = start
+    k = 0
+    while count is None or k < count:
+        t += rng.expovariate(rate)
+        yield t
+        k += 1
+
+# ----- Instrumentation -----
+# Every manipulator is in exactly one of MANIP_STATES at any time, and every
+# rack on the line in one of RACK_STATES. Processes switch states at their
+# yield points, and only the time between switches is accumulated, so the
+# bookkeeping costs a few dict operations per transition. Rack time spent in
+# a station (dwelling, waiting there for pickup, dripping above it) is also
+# booked to the station.
+MANIP_STATES = ('busy', 'blocked', 'wait_dwell', 'wait_downstream', 'idle')
+RACK_STATES = ('queue', 'transport', 'dwell', 'blocked', 'drip')
+STATION_STATES = ('dwell', 'blocked', 'drip')
+
+def _profiled(stats, generator):
+    """Wrap a process generator, counting its resumptions and the wall time spent in it."""
+    value, error = None, None
+    while True:
+        start = time.perf_counter()
         try:
-            # Wait for Bath5 to be empty before getting next rack
-            while bath_occupied['bath5'] and simulation_running:
-                yield env.timeout(0.1)
-                
-            if not simulation_running:
-                break
-                
-            rack = yield entry_store.get()
-            print(f"Time {env.now}: M1 picked up Rack {rack} from ENTRY")
-            carried_racks[1] = rack
-            
-            # Move to Bath5
-            yield from move_manipulator(env, 1, HOME_M1, BATH5, rack)
-            
-            with bath5_resource.request() as req:
-                yield req
-                # Drop the rack
-                yield env.timeout(DROP_TIME)
-                print(f"Time {env.now}: M1 dropped Rack {rack} into Bath5")
-                rack_positions[rack] = BATH5
-                carried_racks.pop(1, None)
-                
-                # Start dwell timer for Bath5 and mark bath as occupied
-                dwell_times['bath5'][rack] = env.now
-                bath_occupied['bath5'] = True
-                
-                # Start a separate process for dwelling and store transfer
-                env.process(dwell_and_store(env, rack, 'bath5', bath5_store, BATH5_DWELL_TIME))
-                
-            # Return to ENTRY immediately after dropping
-            yield from move_manipulator(env, 1, BATH5, HOME_M1)
-            print(f"Time {env.now}: M1 returned to ENTRY")
-        except simpy.Interrupt:
-            break
+            event = generator.send(value) if error is None else generator.throw(error)
+        except StopIteration as stop:
+            return stop.value
+        finally:
+            stats['resumes'] += 1
+            stats['wall_time'] += time.perf_counter() - start
+        try:
+            value, error = (yield event), None
+        except BaseException as exc:  # interrupts and failed events go to the process
+            value, error = None, exc
+
+def _format_table(headers, rows):
+    widths = [max(len(str(h)), *(len(str(row[i])) for row in rows)) for i, h in enumerate(headers)]
+    lines = ['  '.join(str(h).rjust(w) for h, w in zip(headers, widths))]
+    lines += ['  '.join(str(v).rjust(w) for v, w in zip(row, widths)) for row in rows]
+    return '\n'.join(lines)
+
+# ----- Simulation -----
+
+@dataclass
+class SimResult:
+    """Outcome of one run: KPIs plus the transition log for optional rendering."""
+    config: LineConfig
+    makespan: float                 # time the last rack was stacked at the exit (inf unless completed)
+    cycle_times: dict               # rack -> time from entry pickup to exit stacking
+    manipulator_utilisation: dict   # manipulator -> share of makespan busy (moving, handling or dripping)
+    bath_utilisation: dict          # station -> share of makespan dwelling or dripping, per unit of capacity
+    finished_racks: list = field(default_factory=list)
+    stack_height: dict = field(default_factory=dict)
+    recorder: StateRecorder = None
+    finished_count: int = 0         # racks stacked at the exit (also when per-rack data is not kept)
+    cycle_time_total: float = 0.0   # sum of the cycle times of all finished racks
+    manipulator_states: dict = field(default_factory=dict)  # manipulator -> time per MANIP_STATES
+    station_states: dict = field(default_factory=dict)      # station -> rack time per STATION_STATES, plus idle
+    rack_flow: dict = field(default_factory=dict)           # rack -> time per RACK_STATES (recorded runs)
+    flow_totals: dict = field(default_factory=dict)         # time per RACK_STATES summed over finished racks
+    profile: dict = None            # event count and wall time per process (profiled runs)
+    completed: bool = True          # every released rack was stacked (not a deadlock or a stream() cut short)
+    end_time: float = None          # time the run stopped, the makespan of a completed run
+
+    @property
+    def span(self):
+        """Time the state shares refer to: the makespan, or where an incomplete run stopped."""
+        return (self.end_time if self.end_time is not None else self.makespan) or 1.0
 
-def manipulator2(env, bath5_store, bath10_store, bath10_resource):
+    @property
+    def mean_cycle_time(self):
+        return self.cycle_time_total / self.finished_count if self.finished_count else 0.0
+
+    def kpis(self):
+        """Flat KPI record, e.g. for one row of a results table."""
+        row = {'makespan': self.makespan, 'mean_cycle_time': self.mean_cycle_time,
+               'finished_racks': self.finished_count, 'completed': self.completed}
+        for m_id, value in self.manipulator_utilisation.items():
+            row[f'util_m{m_id}'] = value
+        for bath_name, value in self.bath_utilisation.items():
+            row[f'util_{bath_name}'] = value
+        span = self.span
+        for m_id, states in self.manipulator_states.items():
+            row[f'blocked_m{m_id}'] = states['blocked'] / span
+        return row
+
+    def breakdown(self):
+        """
+        One row per manipulator and station with the time spent in each state
+        and `utilisation`, the share of time doing useful work (manipulator
+        busy; rack dwelling or dripping for a station, per unit of capacity).
+        """
+        rows = []
+        for m_id, states in self.manipulator_states.items():
+            rows.append({'resource': f'M{m_id}', 'kind': 'manipulator', **states,
+                         'utilisation': self.manipulator_utilisation[m_id]})
+        for name, states in self.station_states.items():
+            rows.append({'resource': name, 'kind': 'station', **states,
+                         'utilisation': self.bath_utilisation[name]})
+        return rows
+
+    def bottleneck(self):
+        """Name of the resource with the highest utilisation."""
+        rows = self.breakdown()
+        return max(rows, key=lambda row: row['utilisation'])['resource'] if rows else None
+
+    def mean_flow(self):
+        """Mean time per rack in each RACK_STATES, over finished racks."""
+        n = self.finished_count or 1
+        return {state: total / n for state, total in self.flow_totals.items()}
+
+    def summary(self):
+        """Plain-text tables of the state breakdown, rack flow and profile."""
+        span = self.span
+        rows = self.breakdown()
+        manips = [row for row in rows if row['kind'] == 'manipulator']
+        stations = [row for row in rows if row['kind'] == 'station']
+        share = lambda value: f'{100 * value / span:.1f}%'
+        parts = [f'Makespan {self.makespan:.1f}, {self.finished_count} racks, '
+                 f'mean cycle time {self.mean_cycle_time:.1f}, bottleneck {self.bottleneck()}', '']
+        if not self.completed:
+            parts.insert(1, f'INCOMPLETE: stopped at {self.end_time:.1f} with racks still on the line')
+        if manips:
+            parts.append(_format_table(('manipulator',) + MANIP_STATES + ('utilisation',),
+                                       [(row['resource'], *(share(row[s]) for s in MANIP_STATES),
+                                         f"{100 * row['utilisation']:.1f}%") for row in manips]))
+            parts.append('')
+        if stations:
+            parts.append(_format_table(('station',) + STATION_STATES + ('idle', 'utilisation'),
+                                       [(row['resource'], *(share(row[s]) for s in STATION_STATES + ('idle',)),
+                                         f"{100 * row['utilisation']:.1f}%") for row in stations]))
+            parts.append('')
+        flow = self.mean_flow()
+        if flow:
+            parts.append(_format_table(('mean flow',) + RACK_STATES,
+                                       [('rack', *(f'{flow[s]:.1f}' for s in RACK_STATES))]))
+            parts.append('')
+        if self.profile:
+            parts.append(f"{self.profile['events']} events in {self.profile['wall_time']:.3f} s "
+                         f"({self.profile['events_per_sec']:.0f} events/s)")
+            parts.append(_format_table(('process', 'resumes', 'wall_time'),
+                                       [(name, stats['resumes'], f"{stats['wall_time']:.4f}")
+                                        for name, stats in self.profile['processes'].items()]))
+        return '\n'.join(parts).rstrip()
+
+class LineSimulation:
     """
-    M2: Picks up a rack from Bath5 store and moves it to Bath10.
+    All state of one run of a line described by a LineConfig. Nothing is
+    shared between instances, so runs can be repeated or executed side by side.
+
+    Every manipulator runs the same process: fetch a rack from the first
+    station of its zone (the entry, or a bath the upstream manipulator filled),
+    carry it through the baths of its zone and leave it in the zone's last
+    station for the downstream manipulator (or stack it at the exit).
+
+    By default all `num_racks` racks wait at the entry at time 0 and every
+    transition is recorded for rendering. For long horizons pass `arrivals`
+    (an iterable of release times, see periodic_arrivals) and record=False:
+    state of finished racks is then dropped, so memory stays bounded by the
+    racks on the line rather than growing with the number processed.
+
+    Time per state of every manipulator, station and rack is always kept (see
+    MANIP_STATES); profile=True also counts events and wall time per process.
     """
-    while simulation_running:
+
+    def __init__(self, config=None, verbose=False, arrivals=None, record=True, profile=False):
+        self.config = as_line_config(config)
+        self.config.validate()
+        self.verbose = verbose
+        self.env = simpy.Environment()
+        self.running = True
+        self.started = False
+        self.record = record
+        self.arrivals = iter(arrivals) if arrivals is not None else None
+
+        cfg = self.config
+        self.stations = cfg.stations
+        self.exit_index = len(self.stations) - 1
+        self.homes = {manip.id: manip.home for manip in cfg.manipulators}
+        # Which manipulator delivers into each station
+        self.feeders = {k: manip.id for manip in cfg.manipulators for k in range(manip.zone[0] + 1, manip.zone[1] + 1)}
+        # For each rack, store its current position
+        initial_racks = cfg.num_racks if arrivals is None else 0
+        self.rack_positions = {i: self.stations[0].position for i in range(initial_racks)}
+        # For each manipulator, store its current (or last) motion segment
+        self.manip_segments = {m_id: MotionSegment(home, home, 0, 0) for m_id, home in self.homes.items()}
+        # Reservations of rail stretches for anti-collision
+        self.track = TrackReservations(self.env, cfg.safety_distance)
+        for m_id, segment in self.manip_segments.items():
+            self.track.park(m_id, segment)
+        # Make-way moves in progress of idle manipulators pushed aside by a neighbour
+        self.yielding = {}
+        # Store which rack is being carried by which manipulator
+        self.carried_racks = {}
+        # Station each manipulator is currently serving with a rack (None when returning or idle)
+        self.working_at = {m_id: None for m_id in self.homes}
+        # Store dwell start times for each rack in each station
+        self.dwell_times = [{} for _ in self.stations]
+        # Number of racks in (or dripping above) each station
+        self.occupancy = [0] * len(self.stations)
+        # Stack height at EXIT (y-coordinate for each rack)
+        self.stack_height = {}
+        self.finished_racks = []
+        # Racks released into the entry so far, and whether the release schedule is exhausted
+        self.arrived_count = initial_racks
+        self.arrivals_done = arrivals is None
+        # Records of finished racks not yet handed out by stream()
+        self.completed = deque()
+        self.collect_completed = False
+
+        # KPI accumulators
+        self.entry_times = {}
+        self.exit_times = {}
+        self.finished_count = 0
+        self.cycle_time_total = 0.0
+
+        # State accounting: current (state, since) per manipulator, (state, station, since) per rack
+        self.manip_state = {m_id: ('idle', 0.0) for m_id in self.homes}
+        self.manip_state_time = {m_id: dict.fromkeys(MANIP_STATES, 0.0) for m_id in self.homes}
+        self.rack_state = {}
+        self.rack_state_time = {}
+        self.station_state_time = [dict.fromkeys(STATION_STATES, 0.0) for _ in self.stations]
+        self.rack_flow = {}
+        self.flow_totals = dict.fromkeys(RACK_STATES, 0.0)
+        self.final_states = None
+        # Per-process resumptions and wall time, filled when profiling
+        self.profile = {} if profile else None
+        self.event_count = 0
+        self.wall_time = 0.0
+        self.travel_times = self.travel_table()
+        self.occupied_since = [0.0] * len(self.stations)
+        self.occupied_time = [0.0] * len(self.stations)
+
+        # Pending SimPy events, one per kind of state change. Processes yield
+        # them to sleep until the state they wait on actually changes.
+        self.state_events = {'positions_changed': self.env.event(), 'all_finished': self.env.event()}
+        for station in self.stations:
+            self.state_events[f'{station.name}_released'] = self.env.event()
+            self.state_events[f'{station.name}_filled'] = self.env.event()
+
+        # Racks waiting at the entry, and racks whose dwell is complete per station
+        self.entry_store = simpy.Store(self.env)
+        self.station_stores = [simpy.Store(self.env) for _ in self.stations]
+
+        # Transition log, starting from the initial state
+        self.recorder = StateRecorder([station.name for station in self.stations]) if record else NullRecorder()
+        for m_id, segment in self.manip_segments.items():
+            self.recorder.move(m_id, segment)
+        for rack, pos in self.rack_positions.items():
+            self.recorder.drop(0, rack, pos)
+            self.enter_rack(rack)
+
+    def process(self, name, generator):
+        """Start a SimPy process, under the profiler when profiling."""
+        if self.profile is not None:
+            stats = self.profile.setdefault(name, {'resumes': 0, 'wall_time': 0.0})
+            generator = _profiled(stats, generator)
+        return self.env.process(generator)
+
+    def log(self, message, *args):
+        """Print a trace line in verbose mode; formatting is skipped otherwise."""
+        if self.verbose:
+            print(f"Time {self.env.now}: " + message.format(*args))
+
+    # ----- State Changes -----
+
+    def notify(self, name):
+        """Wake every process waiting on `name` and re-arm the event."""
+        event = self.state_events[name]
+        # Only trigger when someone is waiting, so idle notifications cost no events
+        if event.callbacks:
+            self.state_events[name] = self.env.event()
+            event.succeed()
+
+    def has_room(self, k):
+        return self.occupancy[k] < self.stations[k].capacity
+
+    def occupy(self, k):
+        """A rack enters station k; wake the processes waiting for it."""
+        if self.occupancy[k] == 0:
+            self.occupied_since[k] = self.env.now
+        self.occupancy[k] += 1
+        self.notify(f'{self.stations[k].name}_filled')
+
+    def release(self, k):
+        """A rack leaves station k; wake the processes waiting for room."""
+        self.occupancy[k] -= 1
+        if self.occupancy[k] == 0:
+            self.occupied_time[k] += self.env.now - self.occupied_since[k]
+        self.notify(f'{self.stations[k].name}_released')
+
+    def pick_rack(self, manip_id, rack, k=None):
+        """Hand a rack to a manipulator; from station k it drips above the station first."""
+        self.carried_racks[manip_id] = rack
+        self.recorder.pick(self.env.now, rack, manip_id)
+        if k is None:
+            self.set_rack_state(rack, 'transport')
+        else:
+            self.set_rack_state(rack, 'drip', k)
+
+    def drop_rack(self, manip_id, rack, pos):
+        """Set a carried rack down at `pos`."""
+        self.rack_positions[rack] = pos
+        self.carried_racks.pop(manip_id, None)
+        self.recorder.drop(self.env.now, rack, pos)
+
+    def start_dwell(self, k, rack):
+        self.dwell_times[k][rack] = self.env.now
+        self.set_rack_state(rack, 'dwell', k)
+        self.recorder.dwell_start(self.env.now, rack, k)
+
+    def end_dwell(self, k, rack):
+        if self.dwell_times[k].pop(rack, None) is not None:
+            self.recorder.dwell_end(self.env.now, rack, k)
+
+    # ----- State Accounting -----
+
+    def set_manip_state(self, m_id, state):
+        old, since = self.manip_state[m_id]
+        if old != state:
+            now = self.env.now
+            self.manip_state_time[m_id][old] += now - since
+            self.manip_state[m_id] = (state, now)
+
+    def enter_rack(self, rack):
+        self.rack_state[rack] = ('queue', None, self.env.now)
+        self.rack_state_time[rack] = dict.fromkeys(RACK_STATES, 0.0)
+
+    def set_rack_state(self, rack, state, k=None):
+        old, old_k, since = self.rack_state[rack]
+        now = self.env.now
+        self.rack_state_time[rack][old] += now - since
+        if old_k is not None:
+            self.station_state_time[old_k][old] += now - since
+        self.rack_state[rack] = (state, k, now)
+
+    def exit_rack(self, rack):
+        """Close the rack's state accounting and return its time per state."""
+        self.set_rack_state(rack, 'transport')
+        del self.rack_state[rack]
+        flow = self.rack_state_time.pop(rack)
+        for state, value in flow.items():
+            self.flow_totals[state] += value
+        return flow
+
+    def state_breakdown(self):
+        """Time per state so far, including the states entities are still in."""
+        now = self.env.now
+        manips = {}
+        for m_id, totals in self.manip_state_time.items():
+            state, since = self.manip_state[m_id]
+            manips[m_id] = dict(totals)
+            manips[m_id][state] += now - since
+        stations = [dict(totals) for totals in self.station_state_time]
+        for state, k, since in self.rack_state.values():
+            if k is not None:
+                stations[k][state] += now - since
+        for k, totals in enumerate(stations):
+            occupied = self.occupied_time[k] + (now - self.occupied_since[k] if self.occupancy[k] else 0.0)
+            totals['idle'] = max(now - occupied, 0.0)
+        return {
+            'manipulators': manips,
+            'stations': {station.name: stations[k] for k, station in enumerate(self.stations)
+                         if 0 < k < self.exit_index},
+        }
+
+    def finish_rack(self, rack):
+        """Account for a rack stacked at the exit and forget its per-rack state when streaming."""
+        now = self.env.now
+        flow = self.exit_rack(rack)
+        if self.record:
+            entry_time = self.entry_times[rack]
+            self.finished_racks.append(rack)
+            self.exit_times[rack] = now
+            self.rack_flow[rack] = flow
+        else:
+            entry_time = self.entry_times.pop(rack)
+            self.rack_positions.pop(rack, None)
+        self.finished_count += 1
+        self.cycle_time_total += now - entry_time
+        if self.collect_completed:
+            self.completed.append({'rack': rack, 'entry_time': entry_time, 'exit_time': now,
+                                   'cycle_time': now - entry_time, **flow})
+        self.check_done()
+
+    def all_done(self):
+        return self.arrivals_done and self.finished_count >= self.arrived_count
+
+    def check_done(self):
+        if self.all_done():
+            self.notify('all_finished')
+
+    def work(self, manip_id, duration):
+        """A timed manipulator task (drop, drip) that counts as busy time."""
+        self.set_manip_state(manip_id, 'busy')
+        return self.env.timeout(duration)
+
+    # ----- Manipulator Motion -----
+
+    def manip_position(self, manip_id, t):
+        """Interpolated position of a manipulator at time t."""
+        return self.manip_segments[manip_id].position_at(t)
+
+    def travel_table(self):
+        """
+        {distance: (duration, ramp)} for every move between stations and home
+        positions, computed at once from the line kinematics (empty without).
+        """
+        kinematics = self.config.kinematics
+        if kinematics is None:
+            return {}
+        points = np.array([station.position for station in self.stations] + list(self.homes.values()), dtype=float)
+        distances = np.unique(np.abs(points[None, :] - points[:, None]))
+        durations = kinematics.travel_time(distances)
+        ramps = kinematics.ramp_fraction(distances)
+        return {float(d): (float(t), float(r)) for d, t, r in zip(distances, durations, ramps)}
+
+    def travel(self, distance):
+        """(duration, ramp fraction) of a traverse over `distance`."""
+        cached = self.travel_times.get(distance)
+        if cached is not None:
+            return cached
+        kinematics = self.config.kinematics
+        if kinematics is None:
+            return distance * self.config.travel_time_per_unit, self.config.move_ramp_fraction
+        # A move from an intermediate position (e.g. after waiting on the rail)
+        cached = float(kinematics.travel_time(distance)), float(kinematics.ramp_fraction(distance))
+        self.travel_times[distance] = cached
+        return cached
+
+    def move_manipulator(self, manip_id, start_pos, end_pos, rack=None):
+        """Helper function to move manipulator (and rack if carried) as one timed segment"""
+        # A manipulator pushed aside first finishes making way, then sets off from where it stopped
+        while manip_id in self.yielding:
+            yield self.yielding[manip_id]
+        start_pos = self.manip_segments[manip_id].end_pos
+        yield from self.drive(manip_id, start_pos, end_pos, rack)
+
+    def can_make_way(self, manip_id):
+        """An idle manipulator parked on the rail, which a blocked neighbour may push aside."""
+        return (self.config.safety_distance > 0 and self.working_at[manip_id] is None
+                and manip_id not in self.carried_racks and manip_id not in self.yielding
+                and not self.manip_segments[manip_id].is_moving(self.env.now))
+
+    def make_way(self, manip_id, lo, hi):
+        """Push an idle manipulator just clear of [lo, hi], away from the stretch."""
+        pos = self.manip_segments[manip_id].end_pos
+        d = self.config.safety_distance
+        target = hi + d if pos > hi else lo - d
+        self.yielding[manip_id] = self.process('make_way', self._make_way(manip_id, pos, target))
+
+    def _make_way(self, manip_id, pos, target):
+        state = self.manip_state[manip_id][0]
+        self.log("M{} makes way to {}", manip_id, target)
         try:
-            # Wait for Bath10 to be empty before getting next rack
-            while bath_occupied['bath10'] and simulation_running:
-                yield env.timeout(0.1)
-                
-            if not simulation_running:
+            yield from self.drive(manip_id, pos, target)
+        finally:
+            del self.yielding[manip_id]
+        self.set_manip_state(manip_id, state)
+
+    def drive(self, manip_id, start_pos, end_pos, rack=None):
+        env = self.env
+        # Wait until the stretch to sweep is clear of other reservations. Idle
+        # manipulators in the way are pushed aside, a blocker that is already
+        # driving away is waited out analytically; otherwise sleep until one
+        # of the blockers moves or parks.
+        lo, hi = min(start_pos, end_pos), max(start_pos, end_pos)
+        while True:
+            clear_times = {m_id: self.track.clear_time(m_id, lo, hi)
+                           for m_id in self.track.blockers(manip_id, lo, hi)}
+            blockers = [m_id for m_id, t in clear_times.items() if t is None or t > env.now]
+            if not blockers:
                 break
-                
-            # Wait for a rack to be dwelling in Bath5 AND M1 to be back at home
-            while simulation_running:
-                if bath_occupied['bath5']:
-                    # Check if M1 is at home position
-                    if abs(manip_positions[1] - HOME_M1) < 0.1:
-                        # Check if rack has been dwelling for 3 seconds
-                        for rack, start_time in dwell_times['bath5'].items():
-                            if env.now - start_time >= 3:
-                                break
-                        else:
-                            yield env.timeout(0.1)
-                            continue
+            self.set_manip_state(manip_id, 'blocked')
+            for m_id in blockers:
+                if self.can_make_way(m_id):
+                    self.make_way(m_id, lo, hi)
+            clear_times = [clear_times[m_id] for m_id in blockers]
+            if None in clear_times:
+                yield self.track.wait(blockers)
+            else:
+                yield env.timeout(max(max(clear_times) - env.now, 0))
+
+        distance = abs(end_pos - start_pos)
+        if distance == 0:
+            return
+
+        duration, ramp = self.travel(distance)
+        segment = MotionSegment(start_pos, end_pos, env.now, env.now + duration, ramp)
+        self.manip_segments[manip_id] = segment
+        self.track.reserve(manip_id, segment)
+        self.recorder.move(manip_id, segment)
+        self.set_manip_state(manip_id, 'busy')
+        self.notify('positions_changed')
+        yield env.timeout(duration)
+        if rack is not None:
+            self.rack_positions[rack] = end_pos
+        self.track.park(manip_id, segment)
+        self.notify('positions_changed')
+
+    # ----- Helper Functions for Bath Operations -----
+
+    def dwell_and_store(self, rack, k):
+        """Helper process to handle dwelling and store transfer."""
+        station = self.stations[k]
+        yield self.env.timeout(station.dwell_time)
+        self.log("Rack {} finished dwelling in {}", rack, station.name)
+        self.set_rack_state(rack, 'blocked', k)
+        # Keep the bath occupied until a manipulator picks up the rack
+        yield self.station_stores[k].put(rack)
+
+    def dwell_and_wait(self, rack, k):
+        """Helper process to handle dwelling while the manipulator waits above the bath."""
+        station = self.stations[k]
+        yield self.env.timeout(station.dwell_time)
+        self.log("Rack {} finished dwelling in {}", rack, station.name)
+        self.end_dwell(k, rack)
+
+    def upstream_clear(self, k, upstream_id):
+        """
+        True if the manipulator feeding station k is out of the way: parked
+        idle (back home, or wherever it was pushed aside to), or busy with a
+        rack at a station before k. An idle one still in the way is pushed
+        aside by the move to station k.
+        """
+        working = self.working_at[upstream_id]
+        if working is not None:
+            return working < k
+        return upstream_id not in self.yielding and not self.manip_segments[upstream_id].is_moving(self.env.now)
+
+    def set_working_at(self, m_id, k):
+        self.working_at[m_id] = k
+        self.notify('positions_changed')
+
+    def wait_for_pickup(self, m_id, k, upstream_id):
+        """
+        Sleep until a rack has dwelled the pickup lead time in station k and
+        the upstream manipulator is out of the way.
+        """
+        env = self.env
+        name = self.stations[k].name
+        while True:
+            if not self.occupancy[k]:
+                self.set_manip_state(m_id, 'idle')
+                yield self.state_events[f'{name}_filled']
+            elif not self.upstream_clear(k, upstream_id):
+                self.set_manip_state(m_id, 'blocked')
+                yield self.state_events['positions_changed']
+            elif not self.dwell_times[k]:
+                self.set_manip_state(m_id, 'blocked')
+                yield self.state_events[f'{name}_released']
+            else:
+                ready_at = min(self.dwell_times[k].values()) + self.config.pickup_lead_time
+                if env.now >= ready_at:
+                    return
+                self.set_manip_state(m_id, 'wait_dwell')
+                yield env.timeout(ready_at - env.now)
+
+    def wait_for_room(self, k):
+        while not self.has_room(k) and self.running:
+            yield self.state_events[f'{self.stations[k].name}_released']
+
+    # ----- Manipulator Process -----
+
+    def manipulator(self, manip):
+        """
+        Carry racks through the manipulator's zone: pick up at station
+        zone[0], visit every station up to zone[1], drop there and return home.
+        """
+        env, cfg = self.env, self.config
+        m_id = manip.id
+        first, last = manip.zone
+        pickup = self.stations[first]
+        while self.running:
+            try:
+                # Wait for the first bath of the zone to have room before getting next rack
+                self.set_manip_state(m_id, 'wait_downstream')
+                yield from self.wait_for_room(first + 1)
+
+                if not self.running:
+                    break
+
+                if first == 0:
+                    self.set_working_at(m_id, first)
+                    yield from self.move_manipulator(m_id, manip.home, pickup.position)
+                    self.set_manip_state(m_id, 'idle')
+                    rack = yield self.entry_store.get()
+                    self.log("M{} picked up Rack {} from {}", m_id, rack, pickup.label)
+                    self.pick_rack(m_id, rack)
+                    self.entry_times[rack] = env.now
+                    if cfg.pick_time:
+                        yield self.work(m_id, cfg.pick_time)
+                else:
+                    # Wait for a rack to be dwelling in the pickup bath AND its feeder to be out of the way
+                    yield from self.wait_for_pickup(m_id, first, self.feeders[first])
+
+                    if not self.running:
                         break
-                yield env.timeout(0.1)
-                
-            if not simulation_running:
+
+                    # Move to the pickup bath
+                    self.set_working_at(m_id, first)
+                    yield from self.move_manipulator(m_id, manip.home, pickup.position)
+
+                    self.set_manip_state(m_id, 'wait_dwell')
+                    rack = yield self.station_stores[first].get()
+                    self.log("M{} picked up Rack {} from {}", m_id, rack, pickup.label)
+                    self.pick_rack(m_id, rack, first)
+                    self.end_dwell(first, rack)
+
+                    # Lift and wait for dripping
+                    self.log("Waiting for Rack {} to drip at {}", rack, pickup.label)
+                    yield self.work(m_id, cfg.pick_time + pickup.drip_time)
+                    self.release(first)
+                    self.set_rack_state(rack, 'transport')
+
+                pos = pickup.position
+                for k in range(first + 1, last + 1):
+                    station = self.stations[k]
+                    self.set_manip_state(m_id, 'wait_downstream')
+                    yield from self.wait_for_room(k)
+
+                    # Move to the next station
+                    self.set_working_at(m_id, k)
+                    yield from self.move_manipulator(m_id, pos, station.position, rack)
+                    pos = station.position
+
+                    if k == self.exit_index:
+                        if self.record:
+                            self.stack_height[rack] = 1.0 + (self.finished_count * 0.3)
+
+                        yield self.work(m_id, cfg.drop_time)
+                        self.log("M{} stacked Rack {} at {}", m_id, rack, station.label)
+                        self.drop_rack(m_id, rack, station.position)
+                        self.finish_rack(rack)
+                        break
+
+                    yield self.work(m_id, cfg.drop_time)
+                    self.log("M{} dropped Rack {} into {}", m_id, rack, station.label)
+                    self.drop_rack(m_id, rack, station.position)
+
+                    # Start dwell timer and mark the bath as occupied
+                    self.start_dwell(k, rack)
+                    self.occupy(k)
+
+                    if k == last:
+                        # Hand over to the downstream manipulator
+                        self.process('dwell', self.dwell_and_store(rack, k))
+                        break
+
+                    # Wait above the bath for dwelling to complete, then pick up again
+                    self.set_manip_state(m_id, 'wait_dwell')
+                    yield self.process('dwell', self.dwell_and_wait(rack, k))
+                    self.log("M{} picked up Rack {} from {}", m_id, rack, station.label)
+                    self.pick_rack(m_id, rack, k)
+
+                    self.log("Waiting for Rack {} to drip at {}", rack, station.label)
+                    yield self.work(m_id, cfg.pick_time + station.drip_time)
+                    self.release(k)
+                    self.set_rack_state(rack, 'transport')
+
+                # Return to home position after completing the cycle
+                self.set_working_at(m_id, None)
+                if self.running:
+                    yield from self.move_manipulator(m_id, pos, manip.home)
+                    self.log("M{} returned to home", m_id)
+                self.set_manip_state(m_id, 'idle')
+            except simpy.Interrupt:
                 break
-                
-            # Move to Bath5 to pick up rack
-            yield from move_manipulator(env, 2, HOME_M2, BATH5)
-            
-            rack = yield bath5_store.get()
-            print(f"Time {env.now}: M2 picked up Rack {rack} from Bath5")
-            carried_racks[2] = rack
-            dwell_times['bath5'].pop(rack, None)
-            
-            # Wait for dripping
-            print(f"Time {env.now}: Waiting for Rack {rack} to drip at Bath5")
-            yield env.timeout(DRIP_TIME)
-            bath_occupied['bath5'] = False
-            
-            # Move to Bath10
-            yield from move_manipulator(env, 2, BATH5, BATH10, rack)
-            
-            with bath10_resource.request() as req:
-                yield req
-                yield env.timeout(DROP_TIME)
-                print(f"Time {env.now}: M2 dropped Rack {rack} into Bath10")
-                rack_positions[rack] = BATH10
-                carried_racks.pop(2, None)
-                
-                dwell_times['bath10'][rack] = env.now
-                bath_occupied['bath10'] = True
-                
-                env.process(dwell_and_store(env, rack, 'bath10', bath10_store, BATH10_DWELL_TIME))
-                
-            yield from move_manipulator(env, 2, BATH10, HOME_M2)
-            print(f"Time {env.now}: M2 returned to home")
-        except simpy.Interrupt:
-            break
 
-def manipulator3(env, bath10_store):
+    # ----- Main Simulation Setup -----
+
+    def release_racks(self):
+        """Put racks into the entry at the times given by the arrival schedule."""
+        env = self.env
+        entry = self.stations[0]
+        for t in self.arrivals:
+            if t > env.now:
+                yield env.timeout(t - env.now)
+            rack = self.arrived_count
+            self.arrived_count += 1
+            self.rack_positions[rack] = entry.position
+            self.recorder.drop(env.now, rack, entry.position)
+            self.enter_rack(rack)
+            self.entry_store.put(rack)
+            self.log("Rack {} arrived at {}", rack, entry.label)
+        self.arrivals_done = True
+        self.check_done()
+
+    def monitor(self):
+        """End the simulation once all racks are finished."""
+        if not self.all_done():
+            yield self.state_events['all_finished']
+        if self.verbose:
+            print("\nAll racks are finished!")
+        self.recorder.end_time = self.env.now
+        self.final_states = self.state_breakdown()
+        # Give some time for final movements to complete
+        yield self.env.timeout(RUN_OUT_TIME)
+        self.running = False
+
+    def start(self):
+        """Put the initial racks into the entry and start all processes (once)."""
+        if self.started:
+            return
+        self.started = True
+        env = self.env
+        if self.arrivals is None:
+            for i in range(self.config.num_racks):
+                self.entry_store.put(i)
+                self.log("Rack {} is at {}", i, self.stations[0].label)
+        else:
+            self.process('arrivals', self.release_racks())
+
+        # Start manipulator processes.
+        for manip in self.config.manipulators:
+            self.process(f'M{manip.id}', self.manipulator(manip))
+        self.process('monitor', self.monitor())
+
+    def run(self):
+        """Run the line until all processes are done and return the result."""
+        # Run until all processes are done
+        if self.profile is None:
+            self.start()
+            self.env.run()
+        else:
+            for _ in self.stream():
+                pass
+        return self.result()
+
+    def stream(self, until=None):
+        """
+        Run the line step by step and yield a record (rack, entry_time,
+        exit_time, cycle_time) for every rack as it is stacked at the exit.
+        Stops when all released racks are done or simulated time would pass
+        `until`; call result() afterwards for the KPIs of the run.
+        """
+        env = self.env
+        self.collect_completed = True
+        self.start()
+        started = time.perf_counter()
+        while True:
+            next_time = env.peek()
+            if next_time == simpy.core.Infinity or (until is not None and next_time > until):
+                break
+            env.step()
+            self.event_count += 1
+            while self.completed:
+                yield self.completed.popleft()
+        self.wall_time += time.perf_counter() - started
+        if until is not None and env.now < until and not self.all_done():
+            env.run(until=until)
+
+    def result(self):
+        """
+        KPIs of the run. A run that stopped with released racks still on the
+        line (a deadlock, or stream() cut short by `until`) is not completed
+        and gets an infinite makespan, so it never ranks as a good result.
+        """
+        end = self.recorder.end_time if self.recorder.end_time is not None else self.env.now
+        span = end or 1.0
+        completed = self.all_done()
+        states = self.final_states or self.state_breakdown()
+        return SimResult(
+            config=self.config,
+            makespan=end if completed else float('inf'),
+            cycle_times={rack: self.exit_times[rack] - self.entry_times[rack] for rack in self.exit_times},
+            manipulator_utilisation={m_id: manip['busy'] / span for m_id, manip in states['manipulators'].items()},
+            bath_utilisation={station.name: (states['stations'][station.name]['dwell']
+                                             + states['stations'][station.name]['drip']) / (span * station.capacity)
+                              for station in self.stations[1:self.exit_index]},
+            finished_racks=list(self.finished_racks),
+            stack_height=dict(self.stack_height),
+            recorder=self.recorder,
+            finished_count=self.finished_count,
+            cycle_time_total=self.cycle_time_total,
+            manipulator_states=states['manipulators'],
+            station_states=states['stations'],
+            rack_flow=dict(self.rack_flow),
+            flow_totals=dict(self.flow_totals),
+            profile=self.profile_summary(),
+            completed=completed,
+            end_time=end,
+        )
+
+    def profile_summary(self):
+        if self.profile is None:
+            return None
+        return {
+            'events': self.event_count,
+            'wall_time': self.wall_time,
+            'events_per_sec': self.event_count / self.wall_time if self.wall_time else 0.0,
+            'processes': {name: dict(stats) for name, stats in self.profile.items()},
+        }
+
+def simulate(config=None, verbose=False):
     """
-    M3: Picks up a rack from Bath10 store, moves it to Bath15, then to EXIT.
+    Run one headless simulation and return its SimResult. `config` is a
+    LineConfig, a SimConfig or dict of SimConfig overrides for the default
+    3-bath line, or None for the defaults. Nothing is plotted, and nothing is
+    printed unless `verbose` is set.
     """
-    while simulation_running:
-        try:
-            # Wait for Bath15 to be empty before getting next rack
-            while bath_occupied['bath15'] and simulation_running:
-                yield env.timeout(0.1)
-                
-            if not simulation_running:
-                break
-                
-            # Wait for a rack to be dwelling in Bath10 AND M2 to be back at home
-            while simulation_running:
-                if bath_occupied['bath10']:
-                    # Check if M2 is at home position
-                    if abs(manip_positions[2] - HOME_M2) < 0.1:
-                        # Check if rack has been dwelling for 3 seconds
-                        for rack, start_time in dwell_times['bath10'].items():
-                            if env.now - start_time >= 3:
-                                break
-                        else:
-                            yield env.timeout(0.1)
-                            continue
-                        break
-                yield env.timeout(0.1)
-                
-            if not simulation_running:
-                break
-                
-            # Move to Bath10
-            yield from move_manipulator(env, 3, HOME_M3, BATH10)
-            
-            rack = yield bath10_store.get()
-            print(f"Time {env.now}: M3 picked up Rack {rack} from Bath10")
-            carried_racks[3] = rack
-            dwell_times['bath10'].pop(rack, None)
-            
-            # Wait for dripping
-            print(f"Time {env.now}: Waiting for Rack {rack} to drip at Bath10")
-            yield env.timeout(DRIP_TIME)
-            bath_occupied['bath10'] = False
-            
-            # Move to Bath15
-            yield from move_manipulator(env, 3, BATH10, BATH15, rack)
-            
-            yield env.timeout(DROP_TIME)
-            print(f"Time {env.now}: M3 dropped Rack {rack} into Bath15")
-            rack_positions[rack] = BATH15
-            carried_racks.pop(3, None)
-            
-            dwell_times['bath15'][rack] = env.now
-            bath_occupied['bath15'] = True
-            
-            # Wait for dwelling to complete
-            yield env.process(dwell_and_wait(env, rack, 'bath15', BATH15_DWELL_TIME))
-            
-            # Pick up from Bath15 directly (no return to home)
-            print(f"Time {env.now}: M3 picked up Rack {rack} from Bath15")
-            carried_racks[3] = rack
-            
-            # Wait for dripping
-            print(f"Time {env.now}: Waiting for Rack {rack} to drip at Bath15")
-            yield env.timeout(DRIP_TIME)
-            bath_occupied['bath15'] = False
-            
-            # Move directly to EXIT
-            yield from move_manipulator(env, 3, BATH15, EXIT, rack)
-            
-            stack_pos = 1.0 + (len(finished_racks) * 0.3)
-            stack_height[rack] = stack_pos
-            
-            yield env.timeout(DROP_TIME)
-            print(f"Time {env.now}: M3 stacked Rack {rack} at EXIT")
-            rack_positions[rack] = EXIT
-            carried_racks.pop(3, None)
-            finished_racks.append(rack)
-            
-            # Return to home position after completing the cycle
-            if simulation_running:
-                yield from move_manipulator(env, 3, EXIT, HOME_M3)
-                print(f"Time {env.now}: M3 returned to home")
-        except simpy.Interrupt:
+    return LineSimulation(config, verbose=verbose).run()
+
+STREAM_COLUMNS = ('rack', 'entry_time', 'exit_time', 'cycle_time')
+
+def write_stream(config, arrivals, path, chunk_size=10000, until=None):
+    """
+    Simulate a long run in streaming mode and write one CSV row per finished
+    rack to `path`, flushed every `chunk_size` racks. Returns the SimResult
+    (KPIs only; nothing per rack is kept in memory).
+    """
+    sim = LineSimulation(config, arrivals=arrivals, record=False)
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=STREAM_COLUMNS)
+        writer.writeheader()
+        chunk = []
+        for record in sim.stream(until=until):
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                writer.writerows(chunk)
+                f.flush()
+                chunk.clear()
+        writer.writerows(chunk)
+    return sim.result()
+
+# ----- Plan Replay -----
+# Executes an optimizer plan (schedule_plan.Plan) on the modelled line instead
+# of the reactive manipulator logic. Every manipulator works through its own
+# transfers in planned order: it travels to the pickup station so as to be
+# there at the planned start, and starts the transfer then, or later when the
+# rack has not arrived or not finished its dwell. Travel, pick, drip and drop
+# take their modelled durations, so the replay shows where the plan's timing
+# does not hold (deviations), where manipulators on the shared rail would meet
+# (collisions) and where a rack is set into a full bath (bath conflicts).
+# As in the CP-SAT model, a rack stays in a station from the end of the
+# transfer that brings it to the start of the one that takes it away. The
+# model only keeps the racks' dwells in a bath apart, and a dwell may sit
+# anywhere in the stay, so a plan itself may have racks waiting in a full
+# bath. Such overlaps, already in the planned stays, are reported separately
+# as planned overlaps and do not fail the replay; bath conflicts are the
+# overlaps the replay adds to the plan.
+# Transfers that never start, e.g. because a manipulator waits for a rack it
+# is itself to deliver later, are reported as unexecuted. The rail is
+# interlocked as on a real line: a manipulator sets off for a pickup only once
+# the neighbours' transfers planned before it on the same stretch of rail are
+# done, moves only up to the stretch a busy neighbour (on its way to a pickup
+# or carrying) may use and waits there until the neighbour is done, idle
+# neighbours in the way are pushed aside keeping the safety distance, and a
+# manipulator that finishes a transfer in a neighbour's way steps aside.
+# Plans that need a manipulator to pass a busy one thus show as delays; a
+# replay that stalls leaves transfers unexecuted (deadlock).
+
+REPLAY_TOLERANCE = 1e-6
+
+@dataclass
+class ReplayReport:
+    """Outcome of replaying one plan."""
+    transfers: list        # executed: material, step, manipulator, planned_start, start, planned_end, end
+    collisions: list       # (time, left manipulator, right manipulator, left position, right position)
+    bath_conflicts: list   # (time, station, material, racks already in the station)
+    unexecuted: list       # (material, step) of transfers that never started
+    planned_makespan: float
+    makespan: float
+    planned_overlaps: list = field(default_factory=list)  # as bath_conflicts, but already in the plan
+
+    def deviations(self, tolerance=REPLAY_TOLERANCE):
+        """Transfers that started or ended off plan by more than `tolerance`."""
+        return [t for t in self.transfers
+                if abs(t['start'] - t['planned_start']) > tolerance or abs(t['end'] - t['planned_end']) > tolerance]
+
+    @property
+    def ok(self):
+        return not (self.deviations() or self.collisions or self.bath_conflicts or self.unexecuted)
+
+    def kpis(self):
+        delays = [t['end'] - t['planned_end'] for t in self.transfers]
+        return {
+            'ok': self.ok,
+            'transfers': len(self.transfers),
+            'deviations': len(self.deviations()),
+            'max_delay': max(delays, default=0.0),
+            'mean_delay': sum(delays) / len(delays) if delays else 0.0,
+            'collisions': len(self.collisions),
+            'bath_conflicts': len(self.bath_conflicts),
+            'planned_overlaps': len(self.planned_overlaps),
+            'unexecuted': len(self.unexecuted),
+            'planned_makespan': self.planned_makespan,
+            'makespan': self.makespan,
+        }
+
+    def summary(self, limit=10):
+        kpis = self.kpis()
+        parts = [_format_table(['kpi', 'value'], [[k, f'{v:.1f}' if isinstance(v, float) else v]
+                                                  for k, v in kpis.items()])]
+        deviations = sorted(self.deviations(), key=lambda t: t['end'] - t['planned_end'], reverse=True)
+        if deviations:
+            rows = [[t['material'], t['step'], f"M{t['manipulator']}", f"{t['planned_start']:.1f}",
+                     f"{t['start']:.1f}", f"{t['end'] - t['planned_end']:+.1f}"] for t in deviations[:limit]]
+            parts.append('Largest deviations\n' + _format_table(
+                ['rack', 'step', 'manip', 'planned', 'start', 'delay'], rows))
+        if self.collisions:
+            rows = [[f'{t:.1f}', f'M{a}', f'M{b}', f'{pa:.0f}', f'{pb:.0f}'] for t, a, b, pa, pb in self.collisions[:limit]]
+            parts.append('Collisions\n' + _format_table(['time', 'left', 'right', 'left pos', 'right pos'], rows))
+        if self.bath_conflicts:
+            rows = [[f'{t:.1f}', s, r, ' '.join(map(str, present))] for t, s, r, present in self.bath_conflicts[:limit]]
+            parts.append('Bath conflicts\n' + _format_table(['time', 'station', 'rack', 'present'], rows))
+        if self.planned_overlaps:
+            rows = [[f'{t:.1f}', s, r, ' '.join(map(str, present))] for t, s, r, present in self.planned_overlaps[:limit]]
+            parts.append('Planned overlaps\n' + _format_table(['time', 'station', 'rack', 'present'], rows))
+        return '\n\n'.join(parts)
+
+def line_for_plan(plan, bath_capacity=1):
+    """
+    A line on which the plan's transfer times hold exactly: stations are
+    spaced by the planned transfer time (travel 1 s per unit, no pick, drip
+    or drop time), dwell times come from the plan metadata and every
+    manipulator parks at the start of its own stretch of the line, or at the
+    plan's `homes`. Empty moves between transfers cost their distance, which
+    the optimizer ignores unless it planned for the rail (Rail).
+    """
+    moves = plan.transfer_times()
+    durations = plan.meta.get('bath_durations') or [0] * plan.num_baths
+    if isinstance(durations, dict):
+        durations = [durations.get(b, durations.get(str(b), 0)) for b in range(1, plan.num_baths + 1)]
+    positions = [0.0] + np.cumsum(moves).tolist()
+    stations = [Station('entry', 0.0, label='ENTRY')]
+    stations += [Station(f'bath{b}', positions[b], durations[b - 1], capacity=bath_capacity, label=f'Bath{b}')
+                 for b in range(1, plan.num_baths + 1)]
+    stations.append(Station('exit', positions[-1], label='EXIT'))
+    num_manipulators = int(plan.meta.get('num_manipulators') or plan.manipulator.max(initial=1))
+    zones = balanced_zones(list(moves), num_manipulators)
+    homes = plan.meta.get('homes') or [stations[first].position for first, _ in zones]
+    manipulators = [Manipulator(m, float(home), (first, last))
+                    for m, (home, (first, last)) in enumerate(zip(homes, zones), start=1)]
+    return LineConfig(stations, manipulators, num_racks=len(plan.materials), travel_time_per_unit=1,
+                      drop_time=0, pick_time=0, safety_distance=plan.meta.get('safety_distance') or 0)
+
+def find_collisions(segments, homes, safety_distance=0.0):
+    """
+    Times at which neighbouring manipulators on the rail come closer than
+    safety_distance (cross each other when it is 0). `segments` holds the
+    MotionSegments of each manipulator in time order; positions are exact at
+    segment ends and interpolated linearly in between.
+    """
+    order = sorted(homes, key=homes.get)
+    tracks = {}
+    for m_id in order:
+        times, positions = [0.0], [homes[m_id]]
+        for seg in segments[m_id]:
+            times += [seg.start_time, seg.end_time]
+            positions += [seg.start_pos, seg.end_pos]
+        tracks[m_id] = (np.array(times), np.array(positions))
+
+    collisions = []
+    for left, right in zip(order, order[1:]):
+        t = np.union1d(tracks[left][0], tracks[right][0])
+        t = np.union1d(t, (t[:-1] + t[1:]) / 2)
+        pos_left = np.interp(t, *tracks[left])
+        pos_right = np.interp(t, *tracks[right])
+        bad = pos_right - pos_left < max(safety_distance, 0.0) - REPLAY_TOLERANCE
+        # One record per contiguous stretch of violation
+        starts = np.flatnonzero(bad & ~np.concatenate([[False], bad[:-1]]))
+        collisions += [(float(t[i]), left, right, float(pos_left[i]), float(pos_right[i])) for i in starts]
+    return sorted(collisions)
+
+class PlanReplay:
+    """One plan-following run of a line; see the section comment."""
+
+    # Same traverse model as the reactive simulation
+    travel_table = LineSimulation.travel_table
+    travel = LineSimulation.travel
+
+    def __init__(self, plan, config=None):
+        self.plan = plan
+        self.config = line_for_plan(plan) if config is None else as_line_config(config)
+        self.config.validate()
+        cfg = self.config
+        if len(cfg.stations) != plan.num_baths + 2:
+            raise ValueError(f"Plan has {plan.num_baths} baths, the line {len(cfg.stations) - 2}")
+        self.stations = cfg.stations
+        self.homes = {manip.id: manip.home for manip in cfg.manipulators}
+        unknown = set(np.unique(plan.manipulator).tolist()) - set(self.homes)
+        if unknown:
+            raise ValueError(f"Plan uses manipulators {sorted(unknown)} the line does not have")
+        self.travel_times = self.travel_table()
+
+        self.env = simpy.Environment()
+        self.position = dict(self.homes)
+        self.segments = {m_id: [] for m_id in self.homes}
+        self.order = sorted(self.homes, key=self.homes.get)  # left to right on the rail
+        self.busy = dict.fromkeys(self.homes, False)      # carrying or on the way to a pickup
+        self.span = {m_id: (home, home) for m_id, home in self.homes.items()}  # rail a busy manipulator may use
+        self.carry = {m_id: () for m_id in self.homes}  # pickup and drop position once at the pickup
+        self.released = {m_id: self.env.event() for m_id in self.homes}
+        self.pushed_until = dict.fromkeys(self.homes, 0.0)
+        materials = plan.materials.tolist()
+        self.rack_station = dict.fromkeys(materials, 0)   # None while carried
+        self.rack_ready = dict.fromkeys(materials, 0.0)   # end of dwell in the current station
+        self.rack_moved = {r: self.env.event() for r in materials}
+        self.visits = {(r, 0): [0.0, float('inf')] for r in materials}  # (rack, station) -> [drop, pickup]
+        self.transfers = []
+        self.bath_conflicts = []
+        self.planned_overlaps = []
+        self.rank = {}       # row -> place in planned start order
+        self.row_done = {}   # row -> event fired when the transfer has been executed
+
+    def move(self, m_id, position):
+        """Travel to `position`, stopping short of a busy neighbour's span until it is released."""
+        while self.position[m_id] != position:
+            if self.pushed_until[m_id] > self.env.now:
+                yield self.env.timeout(self.pushed_until[m_id] - self.env.now)
+            target, blocker, wake = self.reach(m_id, position)
+            distance = abs(target - self.position[m_id])
+            if distance > 0:
+                duration, ramp = self.travel(distance)
+                now = self.env.now
+                self.make_way(m_id, target)
+                self.claim(m_id, self.position[m_id], target)
+                self.segments[m_id].append(MotionSegment(self.position[m_id], target, now, now + duration, ramp))
+                self.position[m_id] = target
+                yield self.env.timeout(duration)
+                self.claim(m_id, target)
+                continue  # the way may have cleared meanwhile
+            if blocker is None:
+                return
+            if wake is not None:
+                yield self.released[blocker] | self.env.timeout(wake - self.env.now)
+            else:
+                yield self.released[blocker]
+
+    def claim(self, m_id, *positions):
+        """Rail used by a busy manipulator: where it is or moves, plus its carry once at the pickup."""
+        positions += self.carry[m_id]
+        self.span[m_id] = (min(positions), max(positions))
+
+    def reach(self, m_id, position):
+        """
+        (furthest point towards `position` open now, busy manipulator in the
+        way or None, time its current move ends when it is moving away).
+        """
+        now = self.env.now
+        i = self.order.index(m_id)
+        direction = 1 if position > self.position[m_id] else -1
+        ahead = self.order[i + 1:] if direction > 0 else self.order[:i][::-1]
+        for k, other in enumerate(ahead, start=1):
+            if not self.busy[other]:
+                continue
+            lo, hi = self.span[other]
+            edge, wake = (lo if direction > 0 else hi), None
+            seg = self.segments[other][-1] if self.segments[other] else None
+            if seg is None or seg.end_time <= now:
+                # Standing: only where it is and its carry, the claim of a finished move may not be updated yet
+                near = (self.position[other],) + self.carry[other]
+                edge = min(near) if direction > 0 else max(near)
+            elif (seg.end_pos - seg.start_pos) * direction > 0:
+                # Moving away: follow it from where it is now
+                current = seg.start_pos + (seg.end_pos - seg.start_pos) * (now - seg.start_time) / (seg.end_time - seg.start_time)
+                near = (current,) + self.carry[other]
+                edge, wake = (min(near) if direction > 0 else max(near)), seg.end_time
+            # Idle manipulators in between are pushed, each keeping the safety distance
+            limit = edge - direction * k * self.config.safety_distance
+            if (position - limit) * direction > 0:
+                return (limit if (limit - self.position[m_id]) * direction > 0 else self.position[m_id]), other, wake
             break
+        return position, None, None
 
-# ----- Main Simulation Setup -----
+    def make_way(self, m_id, position):
+        """
+        Push idle neighbours ahead of a move to `position` aside. They set off
+        now and, being no closer to their target than the mover, stay ahead.
+        """
+        now, gap = self.env.now, self.config.safety_distance
+        i = self.order.index(m_id)
+        direction = 1 if position > self.position[m_id] else -1
+        ahead = self.order[i + 1:] if direction > 0 else self.order[:i][::-1]
+        boundary = position
+        for other in ahead:
+            boundary += direction * gap
+            if self.busy[other] or self.pushed_until[other] > now or (self.position[other] - boundary) * direction >= 0:
+                break
+            duration, ramp = self.travel(abs(boundary - self.position[other]))
+            self.segments[other].append(MotionSegment(self.position[other], boundary, now, now + duration, ramp))
+            self.position[other] = boundary
+            self.pushed_until[other] = now + duration
 
-def run_simulation():
-    # Clear previous snapshots
-    global snapshots, simulation_running
-    snapshots = []
-    simulation_running = True
-    
-    env = simpy.Environment()
-    # Create stores.
-    entry_store = simpy.Store(env)
-    bath5_store = simpy.Store(env)
-    bath10_store = simpy.Store(env)
-    # Create resources to enforce one rack per bath.
-    bath5_resource = simpy.Resource(env, capacity=1)
-    bath10_resource = simpy.Resource(env, capacity=1)
-    
-    # Put initial racks into entry
-    for i in range(NUM_RACKS):
-        entry_store.put(i)
-        print(f"Time {env.now}: Rack {i} is at ENTRY")
-    
-    # Start the state recorder.
-    env.process(record_state(env))
-    # Start manipulator processes.
-    env.process(manipulator1(env, entry_store, bath5_store, bath5_resource))
-    env.process(manipulator2(env, bath5_store, bath10_store, bath10_resource))
-    env.process(manipulator3(env, bath10_store))
-    
-    # Monitor process: end simulation when all racks are finished.
-    def monitor():
-        global simulation_running
-        while len(finished_racks) < NUM_RACKS:
-            yield env.timeout(1)
-        print("\nAll racks are finished!")
-        # Give some time for final movements to complete
-        yield env.timeout(10)
-        simulation_running = False
-    env.process(monitor())
-    
-    # Run until all processes are done
-    env.run()
+    def step_aside(self, m_id):
+        """Move a manipulator that has become idle out of the way of its neighbours' current moves."""
+        i = self.order.index(m_id)
+        now, gap = self.env.now, self.config.safety_distance
+        for j, direction in ((i + 1, -1), (i - 1, 1)):
+            if not 0 <= j < len(self.order):
+                continue
+            limit = self.position[self.order[j]] + direction * gap
+            if (limit - self.position[m_id]) * direction > 0:
+                duration, ramp = self.travel(abs(limit - self.position[m_id]))
+                self.make_way(m_id, limit)
+                self.segments[m_id].append(MotionSegment(self.position[m_id], limit, now, now + duration, ramp))
+                self.position[m_id] = limit
+                self.pushed_until[m_id] = now + duration
+
+    def conflicting(self, m_id, row, pickup, dropoff):
+        """
+        Rows planned before `row` for other manipulators, not executed yet,
+        whose transfer comes closer than the safety distance (per manipulator
+        in between) to the rail from here over the pickup to the drop.
+        """
+        plan, gap = self.plan, self.config.safety_distance
+        lo, hi = min(self.position[m_id], pickup, dropoff), max(self.position[m_id], pickup, dropoff)
+        index = self.order.index(m_id)
+        pending = []
+        for other_row, rank in self.rank.items():
+            if rank >= self.rank[row] or self.row_done[other_row].triggered:
+                continue
+            other = int(plan.manipulator[other_row])
+            if other == m_id:
+                continue
+            step = int(plan.step[other_row])
+            a, b = sorted((self.stations[step].position, self.stations[step + 1].position))
+            k = self.order.index(other) - index
+            if (a - hi if k > 0 else lo - b) < abs(k) * gap:
+                pending.append(other_row)
+        return pending
+
+    def manipulator(self, m_id, rows):
+        env, plan, cfg = self.env, self.plan, self.config
+        for i in rows:
+            rack, step = int(plan.material[i]), int(plan.step[i])
+            planned = float(plan.start[i])
+            pickup, dropoff = self.stations[step], self.stations[step + 1]
+
+            # Earlier planned transfers of the neighbours go first where they
+            # share the stretch of rail this one needs
+            while True:
+                pending = self.conflicting(m_id, i, pickup.position, dropoff.position)
+                if not pending:
+                    break
+                yield env.all_of([self.row_done[row] for row in pending])
+
+            # Set off early enough to be above the pickup station at the planned start
+            lead = self.travel(abs(pickup.position - self.position[m_id]))[0]
+            if env.now < planned - lead:
+                yield env.timeout(planned - lead - env.now)
+            self.busy[m_id] = True
+            self.claim(m_id, self.position[m_id])
+            yield from self.move(m_id, pickup.position)
+            if env.now < planned:
+                yield env.timeout(planned - env.now)
+            self.carry[m_id] = (pickup.position, dropoff.position)
+            self.claim(m_id, self.position[m_id])
+            # The rack must be in the station and done with its dwell
+            while self.rack_station[rack] != step or self.rack_ready[rack] > env.now:
+                if self.rack_station[rack] == step:
+                    yield env.timeout(self.rack_ready[rack] - env.now)
+                else:
+                    yield self.rack_moved[rack]
+
+            start = env.now
+            self.rack_station[rack] = None
+            self.visits[rack, step][1] = start
+            yield env.timeout(cfg.pick_time + pickup.drip_time)
+            yield from self.move(m_id, dropoff.position)
+            yield env.timeout(cfg.drop_time)
+            self.visits[rack, step + 1] = [env.now, float('inf')]
+            self.busy[m_id] = False
+            self.carry[m_id] = ()
+            self.step_aside(m_id)
+            event, self.released[m_id] = self.released[m_id], env.event()
+            event.succeed()
+
+            self.rack_station[rack] = step + 1
+            self.rack_ready[rack] = env.now + dropoff.dwell_time
+            event, self.rack_moved[rack] = self.rack_moved[rack], env.event()
+            event.succeed()
+            self.transfers.append({'material': rack, 'step': step, 'manipulator': m_id,
+                                   'planned_start': planned, 'start': start,
+                                   'planned_end': float(plan.end[i]), 'end': env.now})
+            self.row_done[i].succeed()
+
+    def check_baths(self):
+        """
+        Sort every rack set into a full bath into bath_conflicts or, when
+        the planned stays overlap the same way, planned_overlaps.
+        """
+        plan = self.plan
+        rows = {(int(m), int(s)): i for i, (m, s) in enumerate(zip(plan.material, plan.step))}
+        planned = {(m, s + 1): (float(plan.end[i]), float(plan.start[rows[m, s + 1]]) if (m, s + 1) in rows
+                                else float('inf')) for (m, s), i in rows.items()}
+        for station in range(1, len(self.stations) - 1):
+            capacity = self.stations[station].capacity
+            visits = sorted((arrive, rack, leave) for (rack, s), (arrive, leave) in self.visits.items() if s == station)
+            for k, (arrive, rack, leave) in enumerate(visits):
+                present = sorted(r for _, r, gone in visits[:k] if gone > arrive)
+                if len(present) < capacity:
+                    continue
+                start, end = planned[rack, station]
+                overlapping = [r for r in present if planned[r, station][0] < end and start < planned[r, station][1]]
+                conflicts = self.bath_conflicts if len(overlapping) < capacity else self.planned_overlaps
+                conflicts.append((arrive, self.stations[station].name, rack, present))
+
+    def run(self):
+        """Replay the whole plan and return its ReplayReport."""
+        plan = self.plan
+        order = np.lexsort((plan.step, plan.material, plan.start))
+        self.rank = {int(row): k for k, row in enumerate(order)}
+        self.row_done = {row: self.env.event() for row in self.rank}
+        for m_id in self.homes:
+            rows = [i for i in order if plan.manipulator[i] == m_id]
+            if rows:
+                self.env.process(self.manipulator(m_id, rows))
+        self.env.run()
+
+        self.check_baths()
+        done = {(t['material'], t['step']) for t in self.transfers}
+        unexecuted = sorted((int(m), int(s)) for m, s in zip(plan.material, plan.step) if (int(m), int(s)) not in done)
+        return ReplayReport(
+            transfers=sorted(self.transfers, key=lambda t: (t['start'], t['material'])),
+            collisions=find_collisions(self.segments, self.homes, self.config.safety_distance),
+            bath_conflicts=self.bath_conflicts,
+            unexecuted=unexecuted,
+            planned_makespan=plan.makespan,
+            makespan=max((t['end'] for t in self.transfers), default=0.0),
+            planned_overlaps=self.planned_overlaps,
+        )
+
+def replay(plan, config=None):
+    """
+    Replay a plan (schedule_plan.Plan or a path to one) on `config` (a
+    LineConfig; by default line_for_plan) and return the ReplayReport.
+    """
+    if isinstance(plan, str):
+        from schedule_plan import Plan
+
+        plan = Plan.load(plan)
+    return PlanReplay(plan, config).run()
+
+# ----- Rendering -----
+
+def setup_line_figure(fig, result):
+    """
+    Draw the static line onto `fig` and return (init, draw): init() clears the
+    moving artists, draw(t) shows the state at time t, rebuilt from the
+    result's transition log. Both return the artists they changed.
+    """
+    cfg = result.config
+    recorder = result.recorder
+    stack_height = result.stack_height
+    homes = {manip.id: manip.home for manip in cfg.manipulators}
+    entry, exit_pos = cfg.stations[0].position, cfg.stations[-1].position
+    margin = max(1, (exit_pos - entry) * 0.05)
 
-def create_animation():
-    fig, ax = plt.subplots(figsize=(14, 6))
-    ax.set_xlim(-1, 19)
+    ax = fig.add_subplot()
+    ax.set_xlim(entry - margin, exit_pos + 2 * margin)
     ax.set_ylim(0, 5)
     ax.set_xlabel("Position")
     ax.set_ylabel("Lane")
     
-    # Set x-axis ticks to round numbers with increments of 1
-    ax.set_xticks(range(0, 19))  # Creates ticks from 0 to 18
+    # Set x-axis ticks to round numbers with increments of 1 on short lines
+    if exit_pos - entry <= 40:
+        ax.set_xticks(range(int(entry), int(exit_pos) + 2))
     ax.grid(True)
 
-    # Add bath positions markers
-    ax.scatter([ENTRY, BATH5, BATH10, BATH15, EXIT], [1, 1, 1, 1, 1], 
+    # Add station positions markers
+    ax.scatter([station.position for station in cfg.stations], [1] * len(cfg.stations),
                marker='s', s=100, c='lightgray', alpha=0.3)
-    ax.text(ENTRY, 0.5, 'ENTRY')
-    ax.text(BATH5, 0.5, 'BATH5')
-    ax.text(BATH10, 0.5, 'BATH10')
-    ax.text(BATH15, 0.5, 'BATH15')
-    ax.text(EXIT, 0.5, 'EXIT')
+    for station in cfg.stations:
+        ax.text(station.position, 0.5, station.name.upper())
 
     # We'll draw racks as blue circles on lane y=1 and manipulators as red squares on lane y=3
     rack_scatter = ax.scatter([], [], s=200, c='blue', label='Racks')
@@ -412,9 +1884,12 @@ def create_animation():
     completion_text = ax.text(0.02, 0.90, '', transform=ax.transAxes,
                             bbox=dict(facecolor='white', alpha=0.8, edgecolor='none'))
 
+    # Racks as recorded: arrival runs release more (or fewer) than cfg.num_racks
+    num_racks = max(recorder.rack_ids(), default=-1) + 1
+
     # Create rack timer texts
     rack_timer_texts = []
-    for _ in range(NUM_RACKS):
+    for _ in range(num_racks):
         text = ax.text(0, 0, '', ha='center', va='top')
         rack_timer_texts.append(text)
 
@@ -427,18 +1902,18 @@ def create_animation():
             text.set_text('')
         return [rack_scatter, manip_scatter, status_text, completion_text] + rack_timer_texts
 
-    def update(frame):
-        snap = snapshots[frame]
+    def draw(t):
+        snap = recorder.snapshot(t)
         current_time = snap['time']
         
         # Prepare rack positions
         rack_xy = []
-        for i in range(NUM_RACKS):
-            pos = snap['rack_positions'].get(i, ENTRY)
+        for i in range(num_racks):
+            pos = snap['rack_positions'].get(i)  # None before the rack arrives
             if pos is None:
-                pos = -1
+                pos = entry - margin
             # If rack is at EXIT, use its stack height
-            if pos == EXIT:
+            if pos == exit_pos:
                 y_pos = stack_height.get(i, 1)
             elif i in snap['carried_racks'].values():
                 y_pos = 2  # Height while being carried
@@ -447,18 +1922,14 @@ def create_animation():
             rack_xy.append([pos, y_pos])
             
             # Update timer text position and content
-            if pos != -1:  # Only show timer if rack is visible
+            if pos != entry - margin:  # Only show timer if rack is visible
                 timer_text = ""
                 # Check if rack is in any bath (not being carried)
-                if i in snap['dwell_times']['bath5']:
-                    dwell_time = current_time - snap['dwell_times']['bath5'][i]
-                    timer_text = f'{dwell_time:.1f}s'
-                elif i in snap['dwell_times']['bath10']:
-                    dwell_time = current_time - snap['dwell_times']['bath10'][i]
-                    timer_text = f'{dwell_time:.1f}s'
-                elif i in snap['dwell_times']['bath15']:
-                    dwell_time = current_time - snap['dwell_times']['bath15'][i]
-                    timer_text = f'{dwell_time:.1f}s'
+                for started in snap['dwell_times'].values():
+                    if i in started:
+                        dwell_time = current_time - started[i]
+                        timer_text = f'{dwell_time:.1f}s'
+                        break
                 
                 if timer_text:  # Only show timer if rack is in a bath
                     rack_timer_texts[i].set_position((pos, y_pos + 0.3))  # Position above the rack
@@ -470,8 +1941,8 @@ def create_animation():
         
         # Prepare manipulator positions
         manip_xy = []
-        for m in [1, 2, 3]:
-            pos = snap['manip_positions'].get(m, HOME_M1 if m==1 else HOME_M2 if m==2 else HOME_M3)
+        for m in homes:
+            pos = snap['manip_positions'].get(m, homes[m])
             manip_xy.append([pos, 3])
             
             # If manipulator is carrying a rack, update rack position
@@ -484,45 +1955,99 @@ def create_animation():
         
         # Update status texts
         status_text.set_text(f'Time: {current_time:.1f} units')
-        finished_count = sum(1 for pos in snap['rack_positions'].values() if pos == EXIT)
-        completion_text.set_text(f'Completed: {finished_count}/{NUM_RACKS} racks' + 
-                               (' (FINISHED!)' if finished_count == NUM_RACKS else ''))
+        finished_count = sum(1 for pos in snap['rack_positions'].values() if pos == exit_pos)
+        completion_text.set_text(f'Completed: {finished_count}/{num_racks} racks' + 
+                               (' (FINISHED!)' if finished_count == num_racks else ''))
         
-        ax.set_title("Manufacturing Line Simulation")
         return [rack_scatter, manip_scatter, status_text, completion_text] + rack_timer_texts
 
+    ax.set_title("Manufacturing Line Simulation")
+    return init, draw
+
+def frame_times(result, time_step=0.1, start=None, end=None):
+    """Frame times every `time_step` over [start, end], by default the whole run."""
+    start = 0 if start is None else start
+    last = result.end_time if result.end_time is not None else result.makespan
+    end = last if end is None else min(end, last)
+    return np.append(np.arange(start, end, time_step), end)
+
+def create_animation(result):
+    """Animate a finished run from its transition log (needs a display)."""
+    import matplotlib.pyplot as plt
+    from matplotlib.animation import FuncAnimation
+
+    fig = plt.figure(figsize=(14, 6))
+    init, draw = setup_line_figure(fig, result)
+    # One frame per 0.1 time units up to the last finished rack; each frame's
+    # state is rebuilt from the transition log when it is drawn
+    times = frame_times(result)
+
     # Create the animation with 100ms interval
-    anim = FuncAnimation(fig, update, frames=len(snapshots), init_func=init,
+    anim = FuncAnimation(fig, lambda frame: draw(times[frame]), frames=len(times), init_func=init,
                         interval=100, blit=True, repeat=False)
     plt.show()
 
+def export_animation(result, path, fps=10, speed=1.0, start=None, end=None, dpi=100):
+    """
+    Render a run offline with the Agg backend, without a display. `path`
+    ending in .mp4 (needs ffmpeg) or .gif writes a video; any other path is
+    taken as a directory for a PNG sequence. The video shows `speed`
+    simulated time units per second at `fps` frames per second, so each
+    frame advances speed / fps time units; `start`/`end` select a time
+    window. Frames are drawn one at a time from the transition log, so
+    memory does not grow with the length of the run. Returns the number of
+    frames written.
+    """
+    import os
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.animation import FFMpegWriter, PillowWriter
+
+    fig = Figure(figsize=(14, 6))
+    FigureCanvasAgg(fig)
+    init, draw = setup_line_figure(fig, result)
+    init()
+    times = frame_times(result, speed / fps, start, end)
+
+    if path.endswith('.mp4') or path.endswith('.gif'):
+        writer = FFMpegWriter(fps=fps) if path.endswith('.mp4') else PillowWriter(fps=fps)
+        with writer.saving(fig, path, dpi):
+            for t in times:
+                draw(t)
+                writer.grab_frame()
+    else:
+        os.makedirs(path, exist_ok=True)
+        for k, t in enumerate(times):
+            draw(t)
+            fig.savefig(os.path.join(path, f'frame_{k:06d}.png'), dpi=dpi)
+    return len(times)
+
 def main():
-    # Clear any previous state
-    finished_racks.clear()
-    rack_positions.clear()
-    manip_positions.clear()
-    carried_racks.clear()
-    # Clear dwell times for each bath
-    for bath in dwell_times.values():
-        bath.clear()
-    # Reset bath occupied status
-    for bath in bath_occupied:
-        bath_occupied[bath] = False
-    # Initialize positions
-    for i in range(NUM_RACKS):
-        rack_positions[i] = ENTRY
-    manip_positions[1] = HOME_M1
-    manip_positions[2] = HOME_M2
-    manip_positions[3] = HOME_M3
-    
+    import argparse
+    parser = argparse.ArgumentParser(description="Simulate the default line and animate it.")
+    parser.add_argument('--export', metavar='PATH', help="render offline to .mp4, .gif or a PNG directory")
+    parser.add_argument('--fps', type=int, default=10)
+    parser.add_argument('--speed', type=float, default=1.0, help="simulated time units per video second")
+    parser.add_argument('--start', type=float, default=None)
+    parser.add_argument('--end', type=float, default=None)
+    parser.add_argument('--replay', metavar='PLAN', help="replay an optimizer plan (.npz or .csv) and report")
+    args = parser.parse_args()
+
+    if args.replay:
+        print(replay(args.replay).summary())
+        return
+
     # Run simulation and create animation
     print("Starting simulation...")
-    run_simulation()
-    print("\nCreating animation...")
-    create_animation()
-
-# Run the main function directly
-main()
+    result = simulate(verbose=True)
+    print("\n" + result.summary())
+    if args.export:
+        print(f"\nExporting animation to {args.export}...")
+        frames = export_animation(result, args.export, args.fps, args.speed, args.start, args.end)
+        print(f"Wrote {frames} frames")
+    else:
+        print("\nCreating animation...")
+        create_animation(result)
 
 if __name__ == "__main__":
-    pass  # Keep this block for future use
+    main()
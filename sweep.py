@@ -0,0 +1,267 @@
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, fields
+
+import pandas as pd
+
+from sim_ani import SimConfig, replay, simulate
+from throughput import estimate_lines
+
+# ----- Parameter Sweeps over the Line Simulator -----
+# A design is a list of points; each point is a dict of SimConfig overrides
+# (e.g. {'bath5_dwell_time': 12, 'drip_time': 4}). Points are simulated in a
+# process pool in chunks, and every finished chunk is appended to a JSON-lines
+# checkpoint so an interrupted sweep resumes where it stopped. With a target
+# cycle time or makespan, points whose analytic lower bound (throughput.py)
+# already misses it are reported as pruned instead of simulated.
+
+SWEEP_PARAMETERS = ('bath5_dwell_time', 'bath10_dwell_time', 'bath15_dwell_time', 'drip_time',
+                    'drop_time', 'num_racks', 'home_m1', 'home_m2', 'home_m3')
+
+def _field_types():
+    return {f.name: f.type for f in fields(SimConfig)}
+
+def _check_parameters(names):
+    known = _field_types()
+    unknown = [name for name in names if name not in known]
+    if unknown:
+        raise ValueError(f"Unknown SimConfig parameter(s): {', '.join(unknown)}")
+
+def grid_design(**axes):
+    """Full factorial design: grid_design(drip_time=[2, 3], num_racks=[6, 12])."""
+    _check_parameters(axes)
+    names = list(axes)
+    return [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+
+def random_design(n, seed=0, **ranges):
+    """
+    Random design of n points. Each range is either a (low, high) tuple, drawn
+    uniformly (as an integer for int parameters), or a list of choices.
+    """
+    _check_parameters(ranges)
+    types = _field_types()
+    rng = random.Random(seed)
+    points = []
+    for _ in range(n):
+        point = {}
+        for name, spec in ranges.items():
+            if isinstance(spec, tuple):
+                low, high = spec
+                is_int = types[name] in (int, 'int')
+                point[name] = rng.randint(low, high) if is_int else rng.uniform(low, high)
+            else:
+                point[name] = rng.choice(spec)
+        points.append(point)
+    return points
+
+def point_id(point):
+    """Stable identifier of a design point, used to skip finished points on resume."""
+    key = json.dumps(point, sort_keys=True, default=str)
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+def _run_chunk(base_config, points):
+    """Worker: simulate a chunk of points and return one KPI row per point."""
+    rows = []
+    for point in points:
+        row = {'point_id': point_id(point), **point}
+        try:
+            row.update(simulate({**base_config, **point}).kpis())
+            row['error'] = None
+        except Exception as exc:  # keep the sweep going, report the point
+            row['error'] = repr(exc)
+        rows.append(row)
+    return rows
+
+def estimate_design(points, base_config=None):
+    """Analytic bounds of every point (throughput.Estimate) without simulating."""
+    if isinstance(base_config, SimConfig):
+        base_config = asdict(base_config)
+    base_config = dict(base_config or {})
+    return estimate_lines(SimConfig.from_value({**base_config, **point}).to_line() for point in points)
+
+def _pruned_rows(points, estimate, mask):
+    frame = estimate.to_frame()
+    return [{'point_id': point_id(point), **point, 'pruned': True, 'cycle_lb': frame['cycle_lb'][k],
+             'makespan_lb': frame['makespan_lb'][k], 'bottleneck': frame['bottleneck'][k], 'error': None}
+            for k, point in enumerate(points) if mask[k]]
+
+def load_checkpoint(path):
+    """Rows already finished by a previous (possibly interrupted) sweep."""
+    if not path or not os.path.exists(path):
+        return []
+    rows = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    break  # a partially written last line from an interrupted run
+    return rows
+
+def run_sweep(points, base_config=None, workers=None, checkpoint=None, chunk_size=None, progress=None,
+              max_cycle=None, max_makespan=None):
+    """
+    Simulate every point and return a DataFrame with one KPI row per point.
+
+    base_config: SimConfig or dict of overrides shared by all points.
+    workers: process count (default: all cores); 1 runs in-process.
+    checkpoint: JSON-lines file; finished points found there are not re-run.
+    progress: optional callback(done, total) called after every chunk.
+    max_cycle, max_makespan: targets; points that cannot reach them by the
+    analytic bounds are not simulated and come back with `pruned` set.
+    """
+    if isinstance(base_config, SimConfig):
+        base_config = asdict(base_config)
+    base_config = dict(base_config or {})
+    workers = workers or os.cpu_count() or 1
+
+    done_rows = load_checkpoint(checkpoint)
+    done_ids = {row['point_id'] for row in done_rows}
+    pending = [point for point in points if point_id(point) not in done_ids]
+    pruned = []
+    if pending and (max_cycle is not None or max_makespan is not None):
+        estimate = estimate_design(pending, base_config)
+        mask = estimate.hopeless(max_cycle, max_makespan)
+        pruned = _pruned_rows(pending, estimate, mask)
+        pending = [point for point, hopeless in zip(pending, mask) if not hopeless]
+    # Several points per task so IPC stays small next to simulation time
+    chunk_size = chunk_size or max(1, min(64, len(pending) // (workers * 4) or 1))
+    chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+
+    rows = list(done_rows)
+    total = len(done_rows) + len(pruned) + len(pending)
+    sink = open(checkpoint, 'a') if checkpoint else None
+    try:
+        def collect(chunk_rows):
+            rows.extend(chunk_rows)
+            if sink:
+                for row in chunk_rows:
+                    sink.write(json.dumps(row, default=str) + '\n')
+                sink.flush()
+            if progress:
+                progress(len(rows), total)
+
+        if pruned:
+            collect(pruned)
+        if workers == 1:
+            for chunk in chunks:
+                collect(_run_chunk(base_config, chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(_run_chunk, base_config, chunk) for chunk in chunks]
+                for future in as_completed(futures):
+                    collect(future.result())
+    finally:
+        if sink:
+            sink.close()
+
+    # Keep the design order regardless of completion order
+    order = {point_id(point): k for k, point in enumerate(points)}
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df = df[df['point_id'].isin(order)]
+        df = df.sort_values('point_id', key=lambda ids: ids.map(order)).reset_index(drop=True)
+        if 'pruned' in df:
+            df['pruned'] = df['pruned'].fillna(False).astype(bool)
+    return df
+
+# ----- Batch Plan Replay -----
+# Candidate plans (schedule_plan.Plan objects or paths to saved plans) are
+# replayed in the simulator in the same chunked process pool, one KPI row of
+# the ReplayReport per plan.
+
+def _replay_chunk(config, indexed_plans):
+    rows = []
+    for index, plan in indexed_plans:
+        row = {'plan': index, 'path': plan if isinstance(plan, str) else None}
+        try:
+            row.update(replay(plan, config).kpis())
+            row['error'] = None
+        except Exception as exc:  # keep validating the other plans
+            row['error'] = repr(exc)
+        rows.append(row)
+    return rows
+
+def replay_plans(plans, config=None, workers=None, chunk_size=None, progress=None):
+    """
+    Replay every plan on `config` (a LineConfig shared by all plans; by
+    default each plan's own line_for_plan) and return a DataFrame with one
+    row of replay KPIs per plan (`plan` = position in `plans`).
+    """
+    plans = list(plans)
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, min(64, len(plans) // (workers * 4) or 1))
+    indexed = list(enumerate(plans))
+    chunks = [indexed[i:i + chunk_size] for i in range(0, len(indexed), chunk_size)]
+
+    rows = []
+    if workers == 1:
+        for chunk in chunks:
+            rows.extend(_replay_chunk(config, chunk))
+            if progress:
+                progress(len(rows), len(plans))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_replay_chunk, config, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                rows.extend(future.result())
+                if progress:
+                    progress(len(rows), len(plans))
+
+    return pd.DataFrame(rows).sort_values('plan').reset_index(drop=True)
+
+def save_results(df, path):
+    """Write results as Parquet (needs pyarrow or fastparquet) or CSV, by extension."""
+    if path.endswith('.parquet'):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_csv(path, index=False)
+
+def _parse_axis(text, random_mode):
+    """'name=1,2,3' -> choices; 'name=low:high' -> range (random designs only)."""
+    name, _, values = text.partition('=')
+    types = _field_types()
+    cast = int if types.get(name) in (int, 'int') else float
+    if random_mode and ':' in values:
+        low, high = values.split(':')
+        return name, (cast(low), cast(high))
+    return name, [cast(v) for v in values.split(',')]
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter sweep over the line simulator.")
+    parser.add_argument('axes', nargs='+', help="name=v1,v2,... (grid) or name=low:high (random)")
+    parser.add_argument('--random', type=int, metavar='N', help="draw N random points instead of a full grid")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--checkpoint', default=None, help="JSON-lines file to resume from / append to")
+    parser.add_argument('--out', default='sweep_results.csv', help=".csv or .parquet")
+    parser.add_argument('--max-cycle', type=float, default=None,
+                        help="skip points whose cycle time lower bound exceeds this")
+    parser.add_argument('--max-makespan', type=float, default=None,
+                        help="skip points whose makespan lower bound exceeds this")
+    args = parser.parse_args()
+
+    axes = dict(_parse_axis(text, args.random is not None) for text in args.axes)
+    if args.random is not None:
+        points = random_design(args.random, seed=args.seed, **axes)
+    else:
+        points = grid_design(**axes)
+
+    def progress(done, total):
+        print(f"\r{done}/{total} points", end='', flush=True)
+
+    df = run_sweep(points, workers=args.workers, checkpoint=args.checkpoint, progress=progress,
+                   max_cycle=args.max_cycle, max_makespan=args.max_makespan)
+    print()
+    save_results(df, args.out)
+    print(f"Saved {len(df)} rows to {args.out}")
+
+if __name__ == "__main__":
+    main()
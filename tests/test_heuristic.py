@@ -0,0 +1,37 @@
+import pytest
+
+import optimalni_pohyby_manipulatoru as hoist
+
+SYNTHETIC_LINE = dict(num_baths=8, num_manipulators=3, move_time=[6, 9, 7, 8, 10, 6, 9, 7, 8],
+                      bath_durations={1: 40, 2: 25, 3: 60, 4: 15, 5: 35, 6: 50, 7: 20, 8: 30})
+
+def problems(schedule, num_baths=hoist.num_baths, move_time=hoist.move_time, bath_durations=None, **_):
+    return hoist.validate_schedule(schedule, num_baths, move_time, bath_durations)
+
+@pytest.mark.parametrize('line', [{}, SYNTHETIC_LINE], ids=['default', 'synthetic'])
+@pytest.mark.parametrize('num_materials', [1, 6, 12])
+def test_heuristic_schedules_are_valid(line, num_materials):
+    schedule, makespan = hoist.heuristic_schedule(num_materials, **line)
+    assert len(schedule) == num_materials * (line.get('num_baths', hoist.num_baths) + 1)
+    assert problems(schedule, **line) == []
+    moves = hoist.transfer_times(line.get('move_time', hoist.move_time), line.get('num_baths', hoist.num_baths))
+    assert makespan == max(start + moves[step] for (_, step), (start, _) in schedule.items())
+
+    greedy_makespans = []
+    for rule in hoist.DISPATCH_RULES:
+        greedy, greedy_makespan, sequence = hoist.greedy_schedule(num_materials, **line, rule=rule)
+        assert problems(greedy, **line) == []
+        # Local search keeps a swap only when the makespan does not get worse
+        improved, improved_makespan, _ = hoist.improve_schedule(sequence, **line)
+        assert problems(improved, **line) == []
+        assert improved_makespan <= greedy_makespan
+        greedy_makespans.append(greedy_makespan)
+    assert makespan <= min(greedy_makespans)
+
+def test_heuristic_not_better_than_optimum():
+    # CP-SAT proves 380 s optimal for the default batch (test_scheduler)
+    assert hoist.heuristic_schedule(hoist.num_materials)[1] >= 380
+
+def test_heuristic_skips_out_of_service_manipulators():
+    schedule, _ = hoist.heuristic_schedule(6, **SYNTHETIC_LINE, out_of_service=(2,))
+    assert {manip for _, manip in schedule.values()} == {0, 2}
@@ -0,0 +1,47 @@
+import copy
+
+import numpy as np
+import pytest
+
+from kinematics import Kinematics, clear_cache, line_move_times
+
+OPERATIONS = [{'operation_index': i, 'used_in_tech': i != 3, 'drip_time': 5 * i, 'crossing_distance': 400 + 100 * i}
+              for i in range(1, 6)]
+MANIPULATORS = {'num_manipulators': 2, 'draha_ponor_zdvih': 1000, 'ponor_rychlost': 200, 'zdvih_rychlost': 250,
+                'preejezd_rampa': 100}
+
+def test_trapezoidal_and_triangular_traverse():
+    kinematics = Kinematics(stroke=1000, lift_speed=250, lower_speed=200, travel_speed=500, travel_ramp=100)
+    # Long moves cruise at 500 mm/s and lose 2r / v to the ramps, short ones never reach it
+    assert kinematics.travel_time(1000) == pytest.approx(1000 / 500 + 200 / 500)
+    assert kinematics.travel_time(50) == pytest.approx(2 * np.sqrt(2 * 100 * 50) / 500)
+    assert kinematics.travel_time(-50) == kinematics.travel_time(50)
+    # Both profiles meet where the ramps touch
+    assert kinematics.travel_time(200 - 1e-9) == pytest.approx(kinematics.travel_time(200))
+    assert kinematics.ramp_fraction(1000) == pytest.approx(0.4 / 2.4)
+    assert kinematics.ramp_fraction(50) == pytest.approx(0.5)  # accelerates, then brakes at once
+    # Without ramps the traverse runs at full speed throughout
+    assert Kinematics(1000, 250, 200).travel_time(1000) == pytest.approx(2.0)
+    assert kinematics.lift_time() == 4.0 and kinematics.lower_time() == 5.0
+
+def test_move_time_matrix():
+    clear_cache()
+    move_times = line_move_times(OPERATIONS, MANIPULATORS)
+    assert move_times.names == ['entry', 'op1', 'op2', 'op4', 'op5', 'exit']
+    travel = move_times.travel
+    assert np.array_equal(travel, travel.T)
+    assert not np.diagonal(travel).any()
+    # A transfer is lift with the drip at its source, the traverse and lowering
+    kinematics = move_times.kinematics
+    handling = kinematics.lift_time() + kinematics.lower_time()
+    assert np.allclose(move_times.matrix - move_times.drip_times[:, None], travel + handling)
+    assert move_times.transfer_times() == [int(np.ceil(t)) for t in np.diagonal(move_times.matrix, offset=1)]
+
+def test_cache_returns_same_object_for_equal_line():
+    clear_cache()
+    move_times = line_move_times(OPERATIONS, MANIPULATORS)
+    assert line_move_times(copy.deepcopy(OPERATIONS), dict(MANIPULATORS)) is move_times
+    assert line_move_times(OPERATIONS, {**MANIPULATORS, 'zdvih_rychlost': 500}) is not move_times
+    # Callers share the arrays, so they cannot change them
+    with pytest.raises(ValueError):
+        move_times.matrix[0, 0] = 0
@@ -0,0 +1,28 @@
+import math
+from pathlib import Path
+
+import pytest
+
+from line_jobs import normalise_recipe, recipe_from_key
+
+OPERATION = {'operation_index': 1, 'used_in_tech': True, 'double_position': False, 'time_min': 100,
+             'time_opt': 150, 'time_max': 200, 'drip_time': 30, 'crossing_distance': 100, 'priority': 1}
+MANIPULATORS = {'num_manipulators': 1, 'draha_ponor_zdvih': 1000, 'ponor_rychlost': 100, 'zdvih_rychlost': 100}
+
+def test_recipe_round_trips():
+    operations, manipulators, num_racks = recipe_from_key(normalise_recipe([OPERATION], MANIPULATORS, 4))
+    assert operations == [{name: value for name, value in OPERATION.items() if name != 'priority'}]
+    assert manipulators == MANIPULATORS and num_racks == 4
+
+@pytest.mark.parametrize('cleared', [None, math.nan])
+def test_cleared_cells_are_reported(cleared):
+    with pytest.raises(ValueError, match='operation 1: time_opt'):
+        normalise_recipe([{**OPERATION, 'time_opt': cleared}], MANIPULATORS, 4)
+
+def test_app_smoke():
+    testing = pytest.importorskip('streamlit.testing.v1')
+    app = testing.AppTest.from_file(str(Path(__file__).parents[1] / 'app.py'), default_timeout=60).run()
+    assert not app.exception
+    app.button[0].click().run()  # save the recipe
+    assert not app.exception
+    assert [metric.label for metric in app.metric] == ['Takt nejméně [s]', 'Propustnost nejvýš [rámů/h]', 'Úzké místo']
@@ -0,0 +1,79 @@
+import json
+
+import optimalni_pohyby_manipulatoru as hoist
+from schedule_cache import CacheEntry, ScheduleCache, cached_schedule, config_key
+
+def entry(makespan, num_materials=1):
+    return CacheEntry({(m, 0): (10 * m, 0) for m in range(num_materials)}, makespan, 'OPTIMAL')
+
+def test_hit_miss_and_persistence(tmp_path):
+    path = str(tmp_path / 'cache.sqlite')
+    config = hoist.SchedulerConfig(num_materials=2)
+    cache = ScheduleCache(path)
+    solved = cached_schedule(config, cache, max_time=10)
+    assert solved.optimal and solved.schedule
+    assert cached_schedule(config, cache, max_time=10) is solved
+    assert cache.hits == {'memory': 1, 'disk': 0, 'miss': 1}
+    cache.close()
+
+    # A new process finds the schedule in the file
+    reopened = ScheduleCache(path)
+    assert reopened.get(config_key(config)) == solved
+    assert reopened.hits == {'memory': 0, 'disk': 1, 'miss': 0}
+    assert reopened.get('unknown') is None
+    assert reopened.disk_usage()[0] == 1
+
+def test_memory_tier_evicts_least_recently_used():
+    cache = ScheduleCache(None, memory_size=2)
+    cache.put('a', entry(1))
+    cache.put('b', entry(2))
+    assert cache.get('a').makespan == 1
+    cache.put('c', entry(3))
+    assert cache.get('b') is None
+    assert [cache.get(key).makespan for key in 'ac'] == [1, 3]
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    payload = len(json.dumps([[0, 0, 0, 0]]))  # a one-transfer schedule as stored
+    cache = ScheduleCache(str(tmp_path / 'cache.sqlite'), memory_size=0, max_bytes=2 * payload)
+    cache.put('a', entry(1))
+    cache.put('b', entry(2))
+    assert cache.get('a').makespan == 1
+    cache.put('c', entry(3))
+    assert cache.disk_usage() == (2, 2 * payload)
+    assert cache.get('b') is None
+    assert [cache.get(key).makespan for key in 'ac'] == [1, 3]
+    # The newest schedule stays even when it alone is too large
+    cache.put('d', entry(4, num_materials=3))
+    assert cache.disk_usage()[0] == 1 and cache.get('d').makespan == 4
+
+def test_equal_recipes_share_a_key():
+    base = hoist.SchedulerConfig()
+    same = [
+        hoist.SchedulerConfig(move_time=[hoist.move_time] * (hoist.num_baths + 1)),
+        hoist.SchedulerConfig(bath_durations=hoist.default_bath_durations(hoist.num_baths)),
+        hoist.SchedulerConfig(bath_capacity={1: 1}),
+        hoist.SchedulerConfig(dwell_penalty=hoist.DWELL_PENALTY + 1),  # only counts with dwell windows
+    ]
+    assert {config_key(config) for config in same} == {config_key(base)}
+    assert config_key(hoist.SchedulerConfig(strengthen=('order', 'bounds'))) == \
+        config_key(hoist.SchedulerConfig(strengthen=('bounds', 'order')))
+    different = [
+        hoist.SchedulerConfig(num_materials=hoist.num_materials + 1),
+        hoist.SchedulerConfig(bath_durations={1: hoist.default_bath_durations(hoist.num_baths)[1] + 5}),
+        hoist.SchedulerConfig(out_of_service=(1,)),
+        hoist.SchedulerConfig(bath_capacity={2: 2}),
+    ]
+    assert len({config_key(config) for config in [base] + different}) == len(different) + 1
+
+def test_rail_without_schedule_has_no_heuristic_fallback(tmp_path):
+    # No manipulator fits its stretch of rail this far from its neighbour
+    rail = hoist.Rail.from_moves(hoist.move_time, hoist.num_baths, 2, safety_distance=1000)
+    config = hoist.SchedulerConfig(num_manipulators=2, rail=rail)
+    scheduler = hoist.LineScheduler(config, max_time=5)
+    scheduler.solve()
+    assert not scheduler.feasible
+    assert scheduler.solution is None and scheduler.makespan is None and scheduler.table() is None
+
+    cache = ScheduleCache(str(tmp_path / 'cache.sqlite'))
+    assert cached_schedule(config, cache, max_time=5) is None
+    assert cache.get(config_key(config)) is None
@@ -0,0 +1,17 @@
+import numpy as np
+import pytest
+
+from schedule_plan import PLAN_COLUMNS, Plan
+
+@pytest.mark.parametrize('suffix', ['.npz', '.csv'])
+def test_plan_round_trips(tmp_path, suffix):
+    plan = Plan(material=[0, 0, 1], step=[0, 1, 0], manipulator=[1, 2, 1],
+                start=[0.0, 123456.789012345, 1 / 3], end=[10.1, 123466.789012345, 1 / 3 + 10],
+                num_baths=1, meta={'makespan': 123466.789012345, 'status': 'OPTIMAL'})
+    path = str(tmp_path / f'plan{suffix}')
+    plan.save(path)
+    loaded = Plan.load(path)
+    assert loaded.num_baths == plan.num_baths
+    assert loaded.meta == plan.meta
+    for name in PLAN_COLUMNS:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(plan, name))
@@ -0,0 +1,114 @@
+import dataclasses
+
+import pytest
+
+import optimalni_pohyby_manipulatoru as hoist
+
+def solve(max_time=20, **line):
+    model, _, makespan = hoist.build_model(**line)
+    solver = hoist.make_solver(max_time, 8, 0, deterministic=True)
+    status = solver.Solve(model)
+    assert status == hoist.cp_model.OPTIMAL
+    return solver.ObjectiveValue(), solver.Value(makespan)
+
+def test_default_line():
+    assert solve() == (380, 380)
+
+def test_heavy_dwell_penalty_optimum_within_horizon():
+    # The weighted optimum keeps the dwells at time_opt and is longer than a
+    # serial schedule at the shortest dwells
+    objective, makespan = solve(num_baths=2, num_materials=2, num_manipulators=1, move_time=10,
+                                bath_durations={1: 50, 2: 30}, dwell_windows={1: (10, 60), 2: (5, 40)},
+                                dwell_penalty=1000)
+    assert (objective, makespan) == (16000, 160)
+
+SMALL_LINES = [
+    dict(num_baths=2, num_materials=2, num_manipulators=1, move_time=10, bath_durations={1: 5, 2: 5}),
+    dict(num_baths=3, num_materials=3, num_manipulators=1),
+    dict(num_baths=4, num_materials=4, num_manipulators=2, move_time=10, bath_durations={b: 5 for b in range(1, 5)}),
+    dict(num_baths=3, num_materials=3, num_manipulators=2, move_time=[5, 8, 6, 9],
+         bath_durations={1: 20, 2: 35, 3: 15}, bath_capacity={2: 2}),
+]
+
+def test_strengthening_keeps_the_optimum():
+    for line in SMALL_LINES:
+        reference = solve(**line)
+        for parts in [True] + [(part,) for part in hoist.STRENGTHENING_PARTS] + [hoist.STRENGTHENING_PARTS]:
+            assert solve(strengthen=parts, **line) == reference, (line, parts)
+
+def test_strengthening_keeps_the_windowed_optimum():
+    windows = {1: (30, 80), 2: (10, 60), 3: (5, 30)}
+    line = dict(num_baths=3, num_materials=3, num_manipulators=1, move_time=10,
+                bath_durations={1: 50, 2: 30, 3: 10}, dwell_windows=windows)
+    reference = solve(**line)
+    assert solve(strengthen=True, **line) == reference
+
+def test_windows_never_worse_than_fixed_dwells():
+    line = dict(num_baths=3, num_materials=3, num_manipulators=2, move_time=10, bath_durations={1: 50, 2: 30, 3: 10})
+    fixed, fixed_makespan = solve(**line)
+    windowed, _ = solve(dwell_windows={1: (50, 50), 2: (30, 30), 3: (10, 10)}, **line)
+    assert windowed == hoist.DWELL_MAKESPAN_WEIGHT * fixed_makespan or windowed == fixed_makespan
+    flexible, flexible_makespan = solve(dwell_windows={1: (40, 60), 2: (20, 40), 3: (5, 15)}, **line)
+    assert flexible_makespan <= fixed_makespan
+
+def test_mixed_rail_horizon_covers_empty_moves():
+    # The only manipulator starts at the exit and must first drive back to the
+    # entry, which a serial schedule without empty moves does not allow for
+    rail = hoist.Rail.from_moves(hoist.move_time, hoist.num_baths, 1)
+    rail = dataclasses.replace(rail, homes=(rail.positions[-1],))
+    model, _, makespan = hoist.build_mixed_model(["B"], hoist.MIXED_RECIPES, num_manipulators=1, rail=rail)
+    solver = hoist.make_solver(20, 8, 0, deterministic=True)
+    assert solver.Solve(model) == hoist.cp_model.OPTIMAL
+    assert solver.Value(makespan) == 135
+
+@pytest.mark.parametrize('degree, expected', [(1, 60), (2, 120)])
+def test_cyclic_period(degree, expected):
+    model, task_vars, period = hoist.build_cyclic_model(degree=degree)
+    solver = hoist.make_solver(60, 8, 0)
+    assert solver.Solve(model) == hoist.cp_model.OPTIMAL
+    assert solver.Value(period) == expected
+    # Eight racks of the repeated pattern keep the transfers and baths apart
+    table = hoist.unroll_cyclic(solver, task_vars, period, 8)
+    schedule = {}
+    for rack, rows in table.groupby("Materiál"):
+        for step, (_, row) in enumerate(rows.sort_values("Začátek (s)").iterrows()):
+            schedule[(rack - 1, step)] = (row["Začátek (s)"], row["Manipulátor"] - 1)
+    assert len(schedule) == 8 * (hoist.num_baths + 1)
+    assert hoist.validate_schedule(schedule) == []
+
+def fits_model(schedule, num_materials):
+    """Whether the monolithic model accepts the schedule with every start and manipulator fixed."""
+    model, task_vars, _ = hoist.build_model(num_materials=num_materials)
+    for key, (start, manip) in schedule.items():
+        model.Add(task_vars[key]["transport_start"] == start)
+        model.Add(task_vars[key]["assigned_transport"][manip][0] == 1)
+    return hoist.make_solver(20, 8, 0).Solve(model) in (hoist.cp_model.OPTIMAL, hoist.cp_model.FEASIBLE)
+
+def test_rolling_horizon_keeps_frozen_prefix(monkeypatch):
+    windows = []
+    build_model = hoist.build_model
+
+    def recording_build_model(*args, **kwargs):
+        windows.append(kwargs)
+        return build_model(*args, **kwargs)
+
+    monkeypatch.setattr(hoist, 'build_model', recording_build_model)
+    schedule, makespan = hoist.rolling_horizon(7, window=4, freeze=2, max_time=10, num_workers=8, seed=0)
+    monkeypatch.undo()
+    model, task_vars, mono_makespan = hoist.build_model(num_materials=7)
+    solver = hoist.make_solver(20, 8, 0)
+    assert solver.Solve(model) == hoist.cp_model.OPTIMAL
+    assert fits_model(schedule, 7)
+    assert fits_model(hoist.solution_schedule(solver, task_vars), 7)
+    assert makespan >= solver.Value(mono_makespan)
+
+    # Each window starts after the racks frozen before it, and the intervals it
+    # had to keep clear are transfers of the final schedule
+    moves = hoist.transfer_times(hoist.move_time, hoist.num_baths)
+    transfers = {(manip, start, start + moves[step]) for (_, step), (start, manip) in schedule.items()}
+    assert [window['first_material'] for window in windows] == [0, 2, 4]
+    for window in windows:
+        assert schedule[(window['first_material'], 0)][0] >= window['release']
+        for (kind, manip), intervals in window['fixed_intervals'].items():
+            if kind == 'manipulator':
+                assert {(manip, start, end) for start, end in intervals} <= transfers
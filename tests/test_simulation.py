@@ -0,0 +1,82 @@
+import dataclasses
+import math
+
+import pytest
+
+from benchmark import synthetic_line
+from sim_ani import LineSimulation, periodic_arrivals, simulate
+
+def test_default_line_completes():
+    result = simulate()
+    assert result.completed
+    assert result.finished_count == 6
+    assert result.kpis()['makespan'] == result.makespan < math.inf
+
+@pytest.mark.parametrize('safety_distance', [300, 500, 800])
+@pytest.mark.parametrize('num_stations, num_manipulators', [(3, 3), (6, 3), (12, 4)])
+def test_shared_rail_lines_complete(num_stations, num_manipulators, safety_distance):
+    # Homes placed for no safety distance sit closer to the handoffs than it,
+    # so idle manipulators have to make way for their neighbours
+    line = dataclasses.replace(synthetic_line(num_stations, 6, num_manipulators), safety_distance=safety_distance)
+    result = simulate(line)
+    assert result.completed
+    assert result.finished_count == 6
+
+def test_run_cut_short_is_not_completed():
+    sim = LineSimulation(arrivals=periodic_arrivals(60, 100), record=False)
+    for _ in sim.stream(until=300):
+        pass
+    result = sim.result()
+    assert not result.completed
+    assert result.makespan == math.inf
+    assert result.end_time <= 300
+
+def test_kpis_and_breakdown_share_one_utilisation():
+    result = simulate()
+    kpis = result.kpis()
+    for row in result.breakdown():
+        name = row['resource'].lower() if row['kind'] == 'manipulator' else row['resource']
+        assert kpis[f'util_{name}'] == row['utilisation']
+    # Waits on the rail end exactly when the blocker is clear, not a hair later
+    assert kpis['blocked_m1'] == 0.0
+
+def test_arrival_run_exports_frames(tmp_path):
+    pytest.importorskip('matplotlib')
+    from sim_ani import export_animation
+
+    # Ten racks released one by one, more than the line's default batch of six
+    result = LineSimulation(None, arrivals=periodic_arrivals(45, count=10)).run()
+    assert result.finished_count == 10
+    frames = export_animation(result, str(tmp_path / 'frames'), fps=1, speed=100, start=400, end=600)
+    assert frames == len(list((tmp_path / 'frames').iterdir())) > 0
+
+def test_streaming_run_stays_bounded_with_recorded_kpis():
+    # A rack every 40 s keeps up with the line, so few racks are on it at once
+    sim = LineSimulation(arrivals=periodic_arrivals(40, 300), record=False)
+    peak = 0
+    for _ in sim.stream():
+        peak = max(peak, len(sim.entry_times), len(sim.rack_positions), len(sim.rack_state))
+    streamed = sim.result()
+    recorded = LineSimulation(arrivals=periodic_arrivals(40, 300)).run()
+    assert streamed.completed and streamed.finished_count == 300
+    assert peak <= len(sim.stations)
+    assert streamed.recorder.nbytes() == 0 < recorded.recorder.nbytes()
+    assert streamed.finished_racks == [] and streamed.cycle_times == {}
+    assert streamed.kpis() == recorded.kpis()
+    assert streamed.breakdown() == recorded.breakdown()
+
+@pytest.mark.parametrize('t', [0, 37.5, 100, 153.2, 246])
+def test_snapshot_reproduces_positions(t):
+    recorder = simulate().recorder
+    # A second run stopped at t has the positions the snapshot rebuilds
+    sim = LineSimulation()
+    for _ in sim.stream(until=t):
+        pass
+    snapshot = recorder.snapshot(t)
+    manip_positions = {m_id: sim.manip_position(m_id, t) for m_id in sim.homes}
+    assert snapshot['manip_positions'] == pytest.approx(manip_positions)
+    assert snapshot['carried_racks'] == sim.carried_racks
+    # The run moves a carried rack only at the end of a move; the snapshot follows its manipulator
+    rack_positions = dict(sim.rack_positions)
+    rack_positions.update({rack: manip_positions[m_id] for m_id, rack in sim.carried_racks.items()})
+    assert snapshot['rack_positions'] == pytest.approx(rack_positions)
@@ -0,0 +1,191 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# ----- Analytic Throughput and Bottleneck Bounds -----
+# Quick bounds on what a line can reach, for many configurations at once,
+# before anything is simulated or solved. A configuration has the station and
+# transfer structure of the CP-SAT model (optimalni_pohyby_manipulatoru.py):
+# baths 1..B, and transfer k carries a rack from station k to k + 1
+# (0 = entry, B + 1 = exit). Every input is an array with one row per
+# configuration:
+#
+#   dwell          (N, B)      shortest dwell in each bath [s]
+#   moves          (N, B + 1)  manipulator time of each transfer (lift, traverse, lower) [s]
+#   drip           (N, B + 1)  drip stop after picking up at the transfer's station, added to moves
+#   capacity       (N, B)      racks a bath holds at once (2 = double position)
+#   zones          (N, B + 1)  manipulator (from 0) dedicated to each transfer, -1 = any
+#   hold           (N, B)      the manipulator waits above the bath during the dwell (sim_ani zones)
+#   bath_overhead  (N, B)      time a bath is blocked per rack besides the dwell [s]
+#   return_time    (N, M)      empty moves of a dedicated manipulator per rack [s]
+#
+# Each resource gives a lower bound on the steady-state cycle (takt per rack):
+# a bath (dwell + overhead) / capacity, a dedicated manipulator its transfers
+# plus empty moves, and all manipulators together the total work divided
+# between them. The largest is the bottleneck; 3600 / cycle caps the
+# throughput in racks per hour. For a batch of racks the same resources bound
+# the makespan from below, and sending racks one at a time bounds it from
+# above (serial_makespan). One pass is a handful of NumPy reductions, so 10^5
+# configurations take well under a second.
+#
+#   est = estimate(dwell, moves, capacity=capacity, num_manipulators=3, num_racks=6)
+#   est.cycle, est.bottleneck_names(), est.throughput, est.makespan_lb
+
+SECONDS_PER_HOUR = 3600
+
+@dataclass
+class Estimate:
+    """Bounds of N configurations; resource_cycle has one column per entry of `resources`."""
+    cycle: np.ndarray            # lower bound on the cycle time [s]
+    bottleneck: np.ndarray       # column of resource_cycle that sets `cycle`
+    resource_cycle: np.ndarray   # (N, R) cycle bound of every resource
+    flow_time: np.ndarray        # one rack through an empty line
+    makespan_lb: np.ndarray      # lower bound on the makespan of num_racks racks
+    serial_makespan: np.ndarray  # racks one after another at these dwells (feasible for the CP-SAT model)
+    resources: list
+
+    @property
+    def throughput(self):
+        """Upper bound on racks per hour."""
+        return np.divide(SECONDS_PER_HOUR, self.cycle, out=np.full(self.cycle.shape, np.inf), where=self.cycle > 0)
+
+    def bottleneck_names(self):
+        return np.asarray(self.resources, dtype=object)[self.bottleneck]
+
+    def hopeless(self, max_cycle=None, max_makespan=None):
+        """Configurations that cannot meet the target cycle time or makespan, whatever the schedule."""
+        mask = np.zeros(len(self.cycle), dtype=bool)
+        if max_cycle is not None:
+            mask |= self.cycle > max_cycle
+        if max_makespan is not None:
+            mask |= self.makespan_lb > max_makespan
+        return mask
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame({'cycle_lb': self.cycle, 'throughput_ub': self.throughput,
+                             'bottleneck': self.bottleneck_names(), 'flow_time': self.flow_time,
+                             'makespan_lb': self.makespan_lb, 'serial_makespan': self.serial_makespan})
+
+def _rows(values, shape, default, dtype=float):
+    """`values` (scalar, one row or one row per configuration) as an array of `shape`."""
+    if values is None:
+        return np.full(shape, default, dtype=dtype)
+    return np.broadcast_to(np.asarray(values, dtype=dtype), shape)
+
+def estimate(dwell, moves, drip=None, capacity=None, zones=None, num_manipulators=1, hold=None,
+             bath_overhead=None, return_time=None, num_racks=1):
+    """
+    Bounds of every configuration (see the section comment for the inputs).
+    A single configuration may be passed as 1-D rows; num_manipulators and
+    num_racks are scalars or one value per configuration.
+    """
+    dwell = np.atleast_2d(np.asarray(dwell, dtype=float))
+    n, num_baths = dwell.shape
+    moves = np.atleast_2d(np.asarray(moves, dtype=float))
+    n = max(n, len(moves))
+    dwell = np.broadcast_to(dwell, (n, num_baths))
+    work = _rows(moves, (n, num_baths + 1), 0) + _rows(drip, (n, num_baths + 1), 0)
+    capacity = _rows(capacity, (n, num_baths), 1)
+    zones = _rows(zones, (n, num_baths + 1), -1, dtype=int)
+    hold = _rows(hold, (n, num_baths), False, dtype=bool)
+    occupancy = dwell + _rows(bath_overhead, (n, num_baths), 0)
+    num_manipulators = _rows(num_manipulators, (n,), 1, dtype=int)
+    num_racks = _rows(num_racks, (n,), 1, dtype=int)
+    width = int(max(num_manipulators.max(), zones.max() + 1))
+    returns = _rows(return_time, (n, width), 0)
+
+    # A manipulator waiting above a bath works for the whole dwell after the transfer in
+    held = np.pad(np.where(hold, dwell, 0), ((0, 0), (0, 1)))
+    load = work + held
+    flow = work.sum(axis=1) + dwell.sum(axis=1)
+    step = work + np.pad(dwell, ((0, 0), (0, 1)))  # transfer k and the dwell after it
+    head = np.cumsum(step, axis=1) - step          # earliest start of each transfer
+    tail = flow[:, None] - head - load             # after the manipulator is done with it
+
+    # Baths: batches of `capacity` racks pass one after another
+    bath_cycle = occupancy / capacity
+    batches = np.ceil(num_racks[:, None] / capacity)
+    bath_makespan = flow[:, None] + (batches - 1) * occupancy
+
+    # Dedicated manipulators: their transfers and empty moves for every rack
+    dedicated = zones[:, None, :] == np.arange(width)[:, None]  # (N, M, transfers)
+    assigned = dedicated.any(axis=2)
+    returns = np.where(assigned, returns, 0)
+    manip_cycle = np.einsum('nt,nmt->nm', load, dedicated) + returns
+    first_start = np.where(dedicated, head[:, None, :], np.inf).min(axis=2)
+    last_tail = np.where(dedicated, tail[:, None, :], np.inf).min(axis=2)
+    manip_makespan = np.where(assigned, first_start + num_racks[:, None] * manip_cycle - returns + last_tail, 0)
+
+    # All manipulators together share the total work
+    pool = (load.sum(axis=1) + returns.sum(axis=1)) / num_manipulators
+    pool_makespan = (num_racks * load.sum(axis=1) + (num_racks - 1) * returns.sum(axis=1)) / num_manipulators
+
+    resource_cycle = np.column_stack([bath_cycle, manip_cycle, pool])
+    bottleneck = resource_cycle.argmax(axis=1)
+    makespan_lb = np.maximum.reduce([flow, bath_makespan.max(axis=1, initial=0),
+                                     manip_makespan.max(axis=1, initial=0), pool_makespan])
+    resources = ([f'bath {b}' for b in range(1, num_baths + 1)]
+                 + [f'manipulator {m}' for m in range(1, width + 1)] + ['manipulators'])
+    return Estimate(cycle=resource_cycle[np.arange(n), bottleneck], bottleneck=bottleneck,
+                    resource_cycle=resource_cycle, flow_time=flow, makespan_lb=makespan_lb,
+                    serial_makespan=num_racks * (flow + returns.sum(axis=1)), resources=resources)
+
+# ----- Simulator Lines -----
+# sim_ani.LineConfig lines as estimator inputs. A simulator manipulator picks
+# a rack up at the first station of its zone, carries it through the zone
+# while waiting above every bath but the last, and returns home; a bath is
+# blocked from the drop until the rack has been lifted and has dripped, and
+# the next rack still has to be brought in and lowered.
+
+def _travel(lines, distances):
+    """Traverse times of `distances` (one row per line), grouped by kinematics."""
+    times = np.empty_like(distances)
+    groups = {}
+    for row, line in enumerate(lines):
+        groups.setdefault(line.kinematics if line.kinematics is not None else line.travel_time_per_unit,
+                          []).append(row)
+    for key, rows in groups.items():
+        times[rows] = key.travel_time(distances[rows]) if hasattr(key, 'travel_time') else distances[rows] * key
+    return times
+
+def line_inputs(lines):
+    """estimate() keyword arguments of LineConfigs that all have the same number of stations."""
+    lines = list(lines)
+    sizes = {len(line.stations) for line in lines}
+    if len(sizes) != 1:
+        raise ValueError(f"Lines have different numbers of stations: {sorted(sizes)}")
+    num_baths = sizes.pop() - 2
+    width = max(len(line.manipulators) for line in lines)
+    positions = np.array([[station.position for station in line.stations] for line in lines], dtype=float)
+    drip = np.array([[station.drip_time for station in line.stations[:-1]] for line in lines], dtype=float)
+    handling = np.array([[line.pick_time + line.drop_time] for line in lines], dtype=float)
+    zones = np.full((len(lines), num_baths + 1), -1)
+    hold = np.zeros((len(lines), num_baths), dtype=bool)
+    legs = np.zeros((len(lines), width, 2))  # last station to home, home to first station
+    for row, line in enumerate(lines):
+        for m, manip in enumerate(line.manipulators):
+            first, last = manip.zone
+            zones[row, first:last] = m
+            hold[row, first:last - 1] = True  # baths first + 1 .. last - 1
+            legs[row, m] = (abs(positions[row, last] - manip.home), abs(manip.home - positions[row, first]))
+
+    traverse = _travel(lines, np.abs(np.diff(positions, axis=1)))
+    moves = traverse + handling
+    return {
+        'dwell': np.array([[station.dwell_time for station in line.stations[1:-1]] for line in lines], dtype=float),
+        'moves': moves,
+        'drip': drip,
+        'capacity': np.array([[station.capacity for station in line.stations[1:-1]] for line in lines]),
+        'zones': zones,
+        'hold': hold,
+        'bath_overhead': drip[:, 1:] + moves[:, :-1],
+        'return_time': _travel(lines, legs.reshape(len(lines), -1)).reshape(legs.shape).sum(axis=2),
+        'num_manipulators': [len(line.manipulators) for line in lines],
+        'num_racks': [line.num_racks for line in lines],
+    }
+
+def estimate_lines(lines):
+    """Estimate of sim_ani.LineConfig lines."""
+    return estimate(**line_inputs(lines))